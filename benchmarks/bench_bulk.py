@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+#
+# - bench_bulk -
+#
+# Compare serial loops against the bulk operations of the client.
+#
+# Copyright (c) 2020 Prodex
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import argparse
+import time
+
+from prodex_api import Prodex
+
+from .stub_server import StubServer
+
+
+def run(count=200, latency=0.005, concurrency=8):
+    """Run the benchmark against a local stub server.
+
+    :param count: The number of objects, defaults to 200
+    :type count: int, optional
+    :param latency: The latency added by the server, defaults to 0.005
+    :type latency: float, optional
+    :param concurrency: The concurrency of the bulk operations, defaults to 8
+    :type concurrency: int, optional
+    :return: The duration in seconds of each operation, serial and bulk
+    :rtype: dict
+    """
+    results = {}
+    with StubServer(latency=latency) as server:
+        server.populate("planning-items", count=count)
+        ids = list(range(1, count + 1))
+        with Prodex(
+            url=server.url,
+            login="root",
+            password="root",
+            pool_maxsize=concurrency,
+        ) as prodex:
+            operations = [
+                (
+                    "update",
+                    lambda: [
+                        prodex.update("PlanningItem", i, {"name": "serial"})
+                        for i in ids
+                    ],
+                    lambda: prodex.update_many(
+                        "PlanningItem",
+                        [(i, {"name": "bulk"}) for i in ids],
+                        concurrency=concurrency,
+                    ),
+                ),
+                (
+                    "delete",
+                    lambda: [prodex.delete("PlanningItem", i) for i in ids],
+                    lambda: prodex.delete_many(
+                        "PlanningItem", ids, concurrency=concurrency
+                    ),
+                ),
+                (
+                    "restore",
+                    lambda: [prodex.restore("PlanningItem", i) for i in ids],
+                    lambda: prodex.restore_many(
+                        "PlanningItem", ids, concurrency=concurrency
+                    ),
+                ),
+            ]
+            for name, serial, bulk in operations:
+                start = time.perf_counter()
+                serial()
+                serial_duration = time.perf_counter() - start
+
+                start = time.perf_counter()
+                bulk_results = bulk()
+                bulk_duration = time.perf_counter() - start
+
+                results[name] = {
+                    "serial_s": serial_duration,
+                    "bulk_s": bulk_duration,
+                    "errors": len([r for r in bulk_results if not r.success]),
+                }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    results = run(
+        count=args.count, latency=args.latency, concurrency=args.concurrency
+    )
+    for name, result in results.items():
+        print(
+            "{name:<8} serial {serial:7.3f} s  bulk {bulk:7.3f} s  "
+            "x{speedup:.1f}  {errors} errors".format(
+                name=name,
+                serial=result["serial_s"],
+                bulk=result["bulk_s"],
+                speedup=result["serial_s"] / result["bulk_s"],
+                errors=result["errors"],
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
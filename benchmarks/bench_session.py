@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+#
+# - bench_session -
+#
+# Compare per-call requests against the pooled session of the caller.
+#
+# Copyright (c) 2020 Prodex
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import argparse
+import time
+
+import requests
+
+from prodex_api import Prodex
+
+from .stub_server import StubServer, TOKEN
+
+
+def measure(func, iterations):
+    """Call the function and return the mean latency in milliseconds"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) * 1000.0 / iterations
+
+
+def run(iterations=500, latency=0.0):
+    """Run the benchmark against a local stub server.
+
+    :param iterations: The number of requests for each client, defaults to 500
+    :type iterations: int, optional
+    :param latency: The latency added by the server, defaults to 0.0
+    :type latency: float, optional
+    :return: The results for each client
+    :rtype: dict
+    """
+    results = {}
+    with StubServer(latency=latency) as server:
+        server.populate("projects", count=10)
+        url = "{url}api/projects/".format(url=server.url)
+        headers = {"Authorization": "Token {token}".format(token=TOKEN)}
+
+        server.reset_stats()
+        per_call = measure(
+            lambda: requests.get(url, headers=headers, params={"id": 1}),
+            iterations,
+        )
+        results["per_call"] = {
+            "mean_ms": per_call,
+            "connections": server.stats["connections"],
+        }
+
+        with Prodex(url=server.url, login="root", password="root") as prodex:
+            server.reset_stats()
+            pooled = measure(
+                lambda: prodex.find("Project", filters=[["id", "is", 1]]),
+                iterations,
+            )
+            results["pooled"] = {
+                "mean_ms": pooled,
+                "connections": server.stats["connections"],
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    results = run(iterations=args.iterations, latency=args.latency)
+    for name, result in results.items():
+        print(
+            "{name:<10} {mean:8.3f} ms/call {connections:6d} connections".format(
+                name=name,
+                mean=result["mean_ms"],
+                connections=result["connections"],
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+#
+# - bench_transport -
+#
+# Compare the per-call client overhead of the transports of the caller.
+#
+# Copyright (c) 2020 Prodex
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Compare the per-call client overhead of the HTTP transports of the
+caller against a local stub of the Prodex API."""
+
+import argparse
+import time
+
+from prodex_api import Prodex
+from prodex_api.libs.transports import TRANSPORTS
+
+from .stub_server import StubServer
+
+
+def measure(func, iterations):
+    """Call the function and return the mean latency and the mean CPU time
+    of the calling thread, in microseconds. The stub server runs in other
+    threads, so the CPU time is only the cost of the client."""
+    func()
+    start, cpu_start = time.perf_counter(), time.thread_time()
+    for _ in range(iterations):
+        func()
+    cpu = time.thread_time() - cpu_start
+    wall = time.perf_counter() - start
+    return wall * 1e6 / iterations, cpu * 1e6 / iterations
+
+
+def run(iterations=2000, latency=0.0):
+    """Run the benchmark against a local stub server.
+
+    :param iterations: The number of calls of each operation for each
+    transport, defaults to 2000
+    :type iterations: int, optional
+    :param latency: The latency added by the server, defaults to 0.0
+    :type latency: float, optional
+    :return: The results of each operation for each transport
+    :rtype: dict
+    """
+    results = {}
+    with StubServer(latency=latency) as server:
+        server.populate("projects", count=10)
+        for name in TRANSPORTS:
+            with Prodex(
+                url=server.url, login="root", password="root", transport=name
+            ) as prodex:
+                operations = [
+                    (
+                        "retrieve",
+                        lambda: prodex.caller.retrieve(
+                            "projects", payload={"id": 1}
+                        ),
+                    ),
+                    (
+                        "find",
+                        lambda: prodex.find(
+                            "Project", filters=[["id", "in", [1, 2]]]
+                        ),
+                    ),
+                    (
+                        "update",
+                        lambda: prodex.update("Project", 1, {"name": "x"}),
+                    ),
+                ]
+                results[name] = {}
+                for operation, func in operations:
+                    wall, cpu = measure(func, iterations)
+                    results[name][operation] = {
+                        "wall_us": wall,
+                        "client_cpu_us": cpu,
+                    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    results = run(iterations=args.iterations, latency=args.latency)
+    for name, operations in results.items():
+        for operation, result in operations.items():
+            print(
+                "{name:<10} {operation:<10} {wall:8.1f} us/call "
+                "{cpu:8.1f} us client CPU/call".format(
+                    name=name,
+                    operation=operation,
+                    wall=result["wall_us"],
+                    cpu=result["client_cpu_us"],
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
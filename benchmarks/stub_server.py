@@ -0,0 +1,509 @@
+# -*- coding: utf-8 -*-
+#
+# - stub_server -
+#
+# Local in-process stub of the Prodex REST API used by the benchmarks.
+#
+# Copyright (c) 2020 Prodex
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import hashlib
+import json
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+TOKEN = "0123456789abcdef0123456789abcdef01234567"
+USER = {"id": 1, "username": "root", "model": "User"}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Handles the requests sent to the stub server. The data is stored on
+    the server instance (see :class:`StubServer`)."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        with self.server.stub.lock:
+            self.server.stub.stats["connections"] += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            BaseHTTPRequestHandler.handle(self)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client gave up, after a timeout for example
+
+    # Helpers
+
+    def _send_json(self, status, data=None):
+        body = b"" if data is None else json.dumps(data).encode("utf-8")
+        etag = None
+        if self.command == "GET" and status == 200:
+            etag = '"{digest}"'.format(digest=hashlib.sha1(body).hexdigest())
+            if self.headers.get("If-None-Match") == etag:
+                status, body = 304, b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        content_type = self.headers.get("Content-Type") or ""
+        if content_type.startswith("application/json"):
+            return json.loads(raw.decode("utf-8") or "null")
+        if content_type.startswith("multipart/form-data"):
+            return {"thumbnail": "processing.jpg"}
+        data = {}
+        for key, values in parse_qs(raw.decode("utf-8")).items():
+            values = [int(v) if v.isdigit() else v for v in values]
+            data[key] = values if len(values) > 1 else values[0]
+        return data
+
+    def _route(self):
+        """Split the path of the request in (endpoint, model_id, action)"""
+        path = urlparse(self.path).path
+        parts = [part for part in path.split("/") if part]
+        if parts and parts[0] == "api":
+            parts = parts[1:]
+        endpoint = parts[0] if parts else ""
+        model_id = None
+        action = None
+        for part in parts[1:]:
+            if part.isdigit() and model_id is None:
+                model_id = int(part)
+            else:
+                action = part
+        return endpoint, model_id, action
+
+    def _before(self):
+        """Counts the request and answers the injected failures, returns
+        False if the request was answered"""
+        stub = self.server.stub
+        with stub.lock:
+            stub.stats["requests"] += 1
+            failure = stub.failures.pop(0) if stub.failures else None
+        if stub.latency:
+            time.sleep(stub.latency)
+        if failure is None:
+            return True
+        status, retry_after = failure
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        body = json.dumps({"detail": "Injected failure."}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if retry_after is not None:
+            self.send_header("Retry-After", str(retry_after))
+        self.end_headers()
+        self.wfile.write(body)
+        return False
+
+    def _authorized(self):
+        if self.headers.get("Authorization") == "Token {token}".format(
+            token=TOKEN
+        ):
+            return True
+        self._send_json(401, {"detail": "Invalid token."})
+        return False
+
+    # Verbs
+
+    def do_GET(self):
+        if not self._before():
+            return
+        if not self._authorized():
+            return
+        endpoint, model_id, action = self._route()
+        params = dict(
+            (key, values[-1])
+            for key, values in parse_qs(urlparse(self.path).query).items()
+        )
+        if action == "fields":
+            self._send_json(200, self.server.stub.fields(endpoint))
+            return
+        if action == "projects":
+            self._send_json(200, self.server.stub.query("projects", {}))
+            return
+        if model_id is not None:
+            record = self.server.stub.get(endpoint, model_id)
+            if record is None:
+                self._send_json(404, {"detail": "Not found."})
+            else:
+                self._send_json(200, record)
+            return
+        records = self.server.stub.query(endpoint, params)
+        self._send_json(
+            200, self.server.stub.paginate(records, params, self.path)
+        )
+
+    def do_OPTIONS(self):
+        if not self._before():
+            return
+        if not self._authorized():
+            return
+        endpoint, _, _ = self._route()
+        self._send_json(200, self.server.stub.schema(endpoint))
+
+    def do_POST(self):
+        if not self._before():
+            return
+        endpoint, _, _ = self._route()
+        data = self._read_body()
+        if endpoint == "token-auth":
+            self._send_json(200, {"token": TOKEN, "user": USER})
+            return
+        if not self._authorized():
+            return
+        if isinstance(data, list):
+            if not self.server.stub.bulk:
+                self._send_json(
+                    400,
+                    {
+                        "non_field_errors": [
+                            "Invalid data. Expected a dictionary, but got list."
+                        ]
+                    },
+                )
+                return
+            created = [
+                self.server.stub.create(endpoint, item) for item in data
+            ]
+            self._send_json(201, created)
+            return
+        self._send_json(201, self.server.stub.create(endpoint, data))
+
+    def do_PATCH(self):
+        if not self._before():
+            return
+        if not self._authorized():
+            return
+        endpoint, model_id, action = self._route()
+        data = self._read_body() or {}
+        if action == "restore":
+            data = {"trashed_at": None}
+        record = self.server.stub.update(endpoint, model_id, data)
+        if record is None:
+            self._send_json(404, {"detail": "Not found."})
+        else:
+            self._send_json(200, record)
+
+    def do_DELETE(self):
+        if not self._before():
+            return
+        if not self._authorized():
+            return
+        endpoint, model_id, _ = self._route()
+        record = self.server.stub.update(
+            endpoint, model_id, {"trashed_at": "2020-01-01T00:00:00Z"}
+        )
+        if record is None:
+            self._send_json(404, {"detail": "Not found."})
+        else:
+            self._send_json(204)
+
+
+class StubServer(object):
+    def __init__(
+        self,
+        latency=0.0,
+        pagination=None,
+        bulk=False,
+        host="127.0.0.1",
+        port=0,
+    ):
+        """A threaded HTTP server which mimics the Prodex REST API.
+
+            >>> with StubServer(latency=0.005) as server:
+            ...     server.populate("projects", count=100)
+            ...     prodex = Prodex(url=server.url, login="root", password="x")
+
+        :param latency: Time in seconds added to each request, defaults to 0.0
+        :type latency: float, optional
+        :param pagination: How list responses are paginated. ``"page"``
+        returns pages like the django rest framework (``count``, ``next``,
+        ``results``), ``"limit"`` truncates the plain list to the ``limit``
+        parameter. All rows are returned by default.
+        :type pagination: str, optional
+        :param bulk: Accept lists of objects on the list endpoints,
+        defaults to False
+        :type bulk: bool, optional
+        :param host: The host to bind, defaults to "127.0.0.1"
+        :type host: str, optional
+        :param port: The port to bind, a free port is used by default
+        :type port: int, optional
+        """
+        self.latency = latency
+        self.pagination = pagination
+        self.bulk = bulk
+        self.lock = threading.Lock()
+        self.stats = {"connections": 0, "requests": 0}
+        self.failures = []
+        self.data = {}
+
+        self._httpd = ThreadingHTTPServer((host, port), StubHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.stub = self
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return "http://{host}:{port}/".format(host=host, port=port)
+
+    def start(self):
+        """Start to serve in a background thread"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the server and close the socket"""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {"connections": 0, "requests": 0}
+
+    def fail(self, count=1, status=503, retry_after=None):
+        """Answer the next requests with an error
+
+        :param count: The number of requests, defaults to 1
+        :type count: int, optional
+        :param status: The status code, defaults to 503
+        :type status: int, optional
+        :param retry_after: The value of the Retry-After header,
+        defaults to None
+        :type retry_after: str, optional
+        """
+        with self.lock:
+            self.failures.extend([(status, retry_after)] * count)
+
+    def populate(self, endpoint, count, factory=None, payload=0):
+        """Fill the given endpoint with generated records.
+
+        :param endpoint: The endpoint to fill
+        :type endpoint: str
+        :param count: The number of records
+        :type count: int
+        :param factory: Callable receiving the id and returning the record,
+        defaults to None
+        :type factory: callable, optional
+        :param payload: The number of characters of a ``notes`` field added
+        to each record, to tune the size of the responses, defaults to 0
+        :type payload: int, optional
+        """
+        factory = factory or default_record
+        records = self.data.setdefault(endpoint, {})
+        start = max(records) + 1 if records else 1
+        for model_id in range(start, start + count):
+            record = factory(model_id)
+            record["id"] = model_id
+            if payload:
+                record["notes"] = "x" * payload
+            records[model_id] = record
+
+    # Storage
+
+    def fields(self, endpoint):
+        records = self.data.get(endpoint) or {}
+        for record in records.values():
+            return list(record.keys())
+        return ["id"]
+
+    def schema(self, endpoint):
+        records = self.data.get(endpoint) or {}
+        sample = next(iter(records.values()), {})
+        actions = {}
+        for field in self.fields(endpoint):
+            actions[field] = {
+                "label": field.replace("_", " ").capitalize(),
+                "read_only": field == "id",
+                "required": False,
+                "type": "field",
+            }
+            value = sample.get(field)
+            if isinstance(value, list) and value:
+                value = value[0]
+                target = actions[field]["child"] = {"type": "field"}
+            else:
+                target = actions[field]
+            if isinstance(value, dict) and "model" in value:
+                target["related_model"] = value["model"]
+        return {"name": endpoint, "actions": {"POST": actions}}
+
+    def get(self, endpoint, model_id):
+        with self.lock:
+            return self.data.get(endpoint, {}).get(model_id)
+
+    def query(self, endpoint, params):
+        params = dict(params)
+        for key in ("page", "page_size", "limit"):
+            params.pop(key, None)
+        fields = params.pop("fields", None)
+        omit = params.pop("omit", None)
+        ordering = params.pop("ordering", None)
+        with self.lock:
+            records = list(self.data.get(endpoint, {}).values())
+        for key, value in params.items():
+            records = [r for r in records if match(r, key, value)]
+        if ordering:
+            field = ordering.lstrip("-")
+            records.sort(
+                key=lambda r: (r.get(field) is None, r.get(field)),
+                reverse=ordering.startswith("-"),
+            )
+        if fields:
+            fields = fields.split(",")
+            records = [
+                dict((k, v) for k, v in r.items() if k in fields)
+                for r in records
+            ]
+        if omit:
+            omit = omit.split(",")
+            records = [
+                dict((k, v) for k, v in r.items() if k not in omit)
+                for r in records
+            ]
+        return records
+
+    def paginate(self, records, params, path):
+        if self.pagination == "limit" and params.get("limit"):
+            return records[: int(params["limit"])]
+        if self.pagination != "page":
+            return records
+        page = int(params.get("page") or 1)
+        page_size = int(params.get("page_size") or 100)
+        start = (page - 1) * page_size
+        next_url = None
+        if start + page_size < len(records):
+            query = dict(params, page=page + 1)
+            next_url = "{url}api{path}?{query}".format(
+                url=self.url,
+                path=urlparse(path).path[4:],
+                query=urlencode(query),
+            )
+        return {
+            "count": len(records),
+            "next": next_url,
+            "previous": None,
+            "results": records[start : start + page_size],
+        }
+
+    def create(self, endpoint, data):
+        with self.lock:
+            records = self.data.setdefault(endpoint, {})
+            model_id = max(records) + 1 if records else 1
+            record = conform(dict(data), records.values())
+            record["id"] = model_id
+            records[model_id] = record
+            return record
+
+    def update(self, endpoint, model_id, data):
+        with self.lock:
+            record = self.data.get(endpoint, {}).get(model_id)
+            if record is None:
+                return None
+            record.update(conform(data, [record]))
+            return record
+
+
+def default_record(model_id):
+    """Build a generic record similar to a Prodex project"""
+    return {
+        "id": model_id,
+        "name": "Record {model_id}".format(model_id=model_id),
+        "description": "Generated by the stub server.",
+        "estimated_time": model_id % 50,
+        "created_at": "2020-01-01T10:00:00Z",
+        "updated_at": "2020-01-01T10:00:00Z",
+        "trashed_at": None,
+        "users_assign": [
+            {"id": 1, "model": "User", "username": "root"},
+        ],
+    }
+
+
+def match(record, key, value):
+    """Simple implementation of the Django lookups used by the API"""
+    field, _, lookup = key.partition("__")
+    current = record.get(field)
+    if isinstance(current, dict):
+        current = current.get("id")
+    if isinstance(current, list):
+        current = [
+            item.get("id") if isinstance(item, dict) else item
+            for item in current
+        ]
+    if lookup == "isnull":
+        return (current is None) == (value == "True")
+    if lookup == "in":
+        values = value.split(",")
+        if isinstance(current, list):
+            return any(str(item) in values for item in current)
+        return str(current) in values
+    if lookup in ("gt", "gte", "lt", "lte"):
+        try:
+            current, value = float(current), float(value)
+        except (TypeError, ValueError):
+            return False
+        return {
+            "gt": current > value,
+            "gte": current >= value,
+            "lt": current < value,
+            "lte": current <= value,
+        }[lookup]
+    if isinstance(current, list):
+        return value in [str(item) for item in current]
+    return str(current) == value
+
+
+def conform(data, records):
+    """Keep the many to many fields as lists, even when a single value
+    has been sent in a form"""
+    for record in records:
+        for key, value in record.items():
+            if isinstance(value, list) and not isinstance(
+                data.get(key, []), list
+            ):
+                data[key] = [data[key]]
+        break
+    return data
@@ -0,0 +1,425 @@
+# -*- coding: utf-8 -*-
+#
+# - suite -
+#
+# Run all the benchmarks and write the results as JSON.
+#
+# Copyright (c) 2020 Prodex
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Run the benchmarks of the client against a local stub of the Prodex API
+and write the results as JSON, to compare runs across commits."""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from prodex_api import Prodex
+
+from .stub_server import StubServer
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+
+def timed(func, repeat):
+    """Call the function ``repeat`` times and return the durations in
+    seconds"""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def summarize(durations, server, items, errors=0):
+    """Build the result of a variant of a scenario.
+
+    :param durations: The duration of each run in seconds
+    :type durations: list
+    :param server: The stub server, its statistics are reset before the runs
+    :type server: benchmarks.stub_server.StubServer
+    :param items: The number of items processed by a run
+    :type items: int
+    :param errors: The number of failed items of the last run, defaults to 0
+    :type errors: int, optional
+    :return: The result
+    :rtype: dict
+    """
+    best = min(durations)
+    return {
+        "items": items,
+        "runs": len(durations),
+        "min_s": best,
+        "median_s": statistics.median(durations),
+        "items_per_s": items / best if best else None,
+        "requests": server.stats["requests"] // len(durations),
+        "errors": errors,
+    }
+
+
+def bench_find(server, prodex, options):
+    """Find all the projects, with all their fields or only two"""
+    server.pagination = None
+    results = {}
+    for name, fields in (("all_fields", None), ("two_fields", ["id", "name"])):
+        server.reset_stats()
+        durations = timed(
+            lambda: prodex.find("Project", fields=fields), options["repeat"]
+        )
+        results[name] = summarize(durations, server, options["count"])
+    return results
+
+
+def bench_pagination(server, prodex, options):
+    """Iterate over all the projects page by page, waiting for each page or
+    fetching the next pages ahead"""
+    server.pagination = "page"
+    results = {}
+    for name, parallel_pages in (
+        ("serial", 0),
+        ("prefetch", options["concurrency"]),
+    ):
+        server.reset_stats()
+        durations = timed(
+            lambda: list(
+                prodex.iter_find(
+                    "Project",
+                    page_size=options["page_size"],
+                    parallel_pages=parallel_pages,
+                )
+            ),
+            options["repeat"],
+        )
+        results[name] = summarize(durations, server, options["count"])
+    server.pagination = None
+    return results
+
+
+def bench_bulk_create(server, prodex, options):
+    """Create timelogs one per request, then by chunks"""
+    items = [
+        {"project": (index % options["count"]) + 1, "duration": 3600}
+        for index in range(options["count"])
+    ]
+    results = {}
+    for name, bulk in (("items", False), ("chunks", True)):
+        server.bulk = bulk
+        server.reset_stats()
+        runs = []
+        durations = timed(
+            lambda: runs.append(
+                prodex.create_many(
+                    "Timelog",
+                    items,
+                    concurrency=options["concurrency"],
+                    bulk=bulk,
+                )
+            ),
+            options["repeat"],
+        )
+        errors = len([r for r in runs[-1] if not r.success])
+        results[name] = summarize(durations, server, len(items), errors)
+    server.bulk = False
+    return results
+
+
+def bench_m2m_update(server, prodex, options):
+    """Add a user to the ``users_assign`` of all the projects, one project
+    after the other, then with a single request of the current values"""
+    ids = list(range(1, options["count"] + 1))
+    modes = {"users_assign": "add"}
+    results = {}
+
+    server.reset_stats()
+    durations = timed(
+        lambda: [
+            prodex.update("Project", i, {"users_assign": [2]}, modes)
+            for i in ids
+        ],
+        options["repeat"],
+    )
+    results["serial"] = summarize(durations, server, len(ids))
+
+    server.reset_stats()
+    runs = []
+    durations = timed(
+        lambda: runs.append(
+            prodex.update_m2m_many(
+                "Project",
+                ids,
+                {"users_assign": [3]},
+                modes,
+                concurrency=options["concurrency"],
+            )
+        ),
+        options["repeat"],
+    )
+    errors = len([r for r in runs[-1] if not r.success])
+    results["bulk"] = summarize(durations, server, len(ids), errors)
+    return results
+
+
+def bench_thumbnails(server, prodex, options):
+    """Upload a thumbnail for each project, one after the other, then in
+    parallel"""
+    directory = tempfile.mkdtemp(prefix="prodex-bench-")
+    try:
+        items = []
+        for model_id in range(1, options["count"] + 1):
+            path = os.path.join(
+                directory, "{model_id}.png".format(model_id=model_id)
+            )
+            with open(path, "wb") as thumbnail:
+                thumbnail.write(PNG_HEADER)
+                thumbnail.write(os.urandom(options["thumbnail_size"]))
+            items.append((model_id, path))
+
+        results = {}
+        server.reset_stats()
+        durations = timed(
+            lambda: [
+                prodex.upload_thumbnail("Project", model_id, path)
+                for model_id, path in items
+            ],
+            options["repeat"],
+        )
+        results["serial"] = summarize(durations, server, len(items))
+
+        server.reset_stats()
+        runs = []
+        durations = timed(
+            lambda: runs.append(
+                prodex.upload_thumbnails(
+                    "Project", items, concurrency=options["concurrency"]
+                )
+            ),
+            options["repeat"],
+        )
+        errors = len([r for r in runs[-1] if not r.success])
+        results["parallel"] = summarize(durations, server, len(items), errors)
+        return results
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+
+SCENARIOS = {
+    "find": bench_find,
+    "pagination": bench_pagination,
+    "bulk_create": bench_bulk_create,
+    "m2m_update": bench_m2m_update,
+    "thumbnails": bench_thumbnails,
+}
+
+
+def git_commit():
+    """Return the current commit of the repository, if any"""
+    try:
+        output = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode("ascii").strip()
+
+
+def run(
+    scenarios=None,
+    count=500,
+    payload=200,
+    latency=0.002,
+    concurrency=8,
+    page_size=100,
+    thumbnail_size=50000,
+    repeat=3,
+):
+    """Run the benchmarks against a local stub server.
+
+    :param scenarios: The names of the scenarios to run, all by default
+    :type scenarios: list, optional
+    :param count: The number of objects of each scenario, defaults to 500
+    :type count: int, optional
+    :param payload: The size in characters of a text field added to the
+    projects, defaults to 200
+    :type payload: int, optional
+    :param latency: The latency added by the server, defaults to 0.002
+    :type latency: float, optional
+    :param concurrency: The concurrency of the parallel operations,
+    defaults to 8
+    :type concurrency: int, optional
+    :param page_size: The size of the pages, defaults to 100
+    :type page_size: int, optional
+    :param thumbnail_size: The size in bytes of the thumbnails,
+    defaults to 50000
+    :type thumbnail_size: int, optional
+    :param repeat: The number of runs of each variant, defaults to 3
+    :type repeat: int, optional
+    :return: The parameters, the environment and the results of each
+    variant of each scenario
+    :rtype: dict
+    """
+    options = {
+        "count": count,
+        "payload": payload,
+        "latency": latency,
+        "concurrency": concurrency,
+        "page_size": page_size,
+        "thumbnail_size": thumbnail_size,
+        "repeat": repeat,
+    }
+    results = {}
+    with StubServer(latency=latency) as server:
+        server.populate("projects", count=count, payload=payload)
+        with Prodex(
+            url=server.url,
+            login="root",
+            password="root",
+            pool_maxsize=concurrency,
+        ) as prodex:
+            for name in scenarios or list(SCENARIOS):
+                results[name] = SCENARIOS[name](server, prodex, options)
+    return {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": options,
+        "results": results,
+    }
+
+
+def compare(previous, current, threshold=0.1):
+    """Compare the best durations of two runs of the suite.
+
+    :param previous: The results of the reference run
+    :type previous: dict
+    :param current: The results of the new run
+    :type current: dict
+    :param threshold: The relative slowdown reported as a regression,
+    defaults to 0.1
+    :type threshold: float, optional
+    :return: The (scenario, variant, previous, current, ratio, regression)
+    of the variants of both runs
+    :rtype: list
+    """
+    rows = []
+    for scenario, variants in current["results"].items():
+        for variant, result in variants.items():
+            reference = previous["results"].get(scenario, {}).get(variant)
+            if not reference:
+                continue
+            ratio = result["min_s"] / reference["min_s"]
+            rows.append(
+                (
+                    scenario,
+                    variant,
+                    reference["min_s"],
+                    result["min_s"],
+                    ratio,
+                    ratio > 1 + threshold,
+                )
+            )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "scenarios",
+        nargs="*",
+        help="The scenarios to run, all by default: {names}".format(
+            names=", ".join(SCENARIOS)
+        ),
+    )
+    parser.add_argument("--count", type=int, default=500)
+    parser.add_argument("--payload", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.002)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--thumbnail-size", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Write the results to this file")
+    parser.add_argument(
+        "--compare", help="Compare with the results of a previous run"
+    )
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error("unknown scenarios: {0}".format(", ".join(unknown)))
+
+    report = run(
+        scenarios=args.scenarios,
+        count=args.count,
+        payload=args.payload,
+        latency=args.latency,
+        concurrency=args.concurrency,
+        page_size=args.page_size,
+        thumbnail_size=args.thumbnail_size,
+        repeat=args.repeat,
+    )
+    for scenario, variants in report["results"].items():
+        for variant, result in variants.items():
+            print(
+                "{name:<24} {min:8.3f} s {rate:10.1f} items/s "
+                "{requests:6d} requests {errors} errors".format(
+                    name="{0}.{1}".format(scenario, variant),
+                    min=result["min_s"],
+                    rate=result["items_per_s"] or 0.0,
+                    requests=result["requests"],
+                    errors=result["errors"],
+                )
+            )
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as reference:
+            previous = json.load(reference)
+        rows = compare(previous, report, threshold=args.threshold)
+        print()
+        for scenario, variant, before, after, ratio, regression in rows:
+            print(
+                "{name:<24} {before:8.3f} s -> {after:8.3f} s  x{ratio:.2f}"
+                "{flag}".format(
+                    name="{0}.{1}".format(scenario, variant),
+                    before=before,
+                    after=after,
+                    ratio=ratio,
+                    flag="  REGRESSION" if regression else "",
+                )
+            )
+        if any(row[-1] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
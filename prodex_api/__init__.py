@@ -23,3 +23,12 @@
 # SOFTWARE.
 
 from .prodex import Prodex
+from .async_prodex import AsyncProdex
+from .libs.cache import ResultCache
+from .libs.concurrency import AdaptiveLimiter
+from .libs.deadline import deadline
+from .libs.metrics import MetricsRegistry
+from .libs.query import Param, Query
+from .libs.retry import RateLimiter, RetryPolicy
+from .libs.schema_cache import SchemaCache
+from .libs.transports import RecordingTransport, ReplayTransport
@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+#
+# - async_prodex -
+#
+# The asynchronous client of the API for prodex.
+#
+# Copyright (c) 2020 Prodex
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import asyncio
+
+from .utils import constants, utils
+from .utils.decorators import model_check
+from .libs.async_models import AsyncModel
+from .libs.models import DEFAULT_CONNECT_TIMEOUT, DEFAULT_TIMEOUT
+
+
+class AsyncProdex(object):
+    def __init__(
+        self,
+        url,
+        login,
+        password,
+        datetime_convert=False,
+        pool_maxsize=100,
+        pool_maxsize_per_host=10,
+        keep_alive=True,
+        timeout=DEFAULT_TIMEOUT,
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+    ):
+        """Initializes a new instance of the asynchronous Prodex client.
+        It exposes the same methods as :class:`~prodex_api.Prodex` as
+        coroutines.
+
+        The connection is done on the first request, or explicitly with
+        :meth:`~prodex_api.AsyncProdex.connect`. The client should be closed
+        when it is no longer needed, the easiest way is to use it as an
+        asynchronous context manager.
+
+            >>> async with AsyncProdex(url, login, password) as prodex:
+            ...     projects = await prodex.find("Project")
+
+        .. note::
+            This client requires ``aiohttp``.
+
+        :param url: The URL for the the api of prodex
+        :type url: str
+        :param login: The login to initialize the connection
+        :type login: str
+        :param password: The password to initialize the connection
+        :type password: str
+        :param pool_maxsize: The maximum number of simultaneous connections,
+        defaults to 100
+        :type pool_maxsize: int, optional
+        :param pool_maxsize_per_host: The maximum number of simultaneous
+        connections per host, defaults to 10
+        :type pool_maxsize_per_host: int, optional
+        :param keep_alive: Reuse connections between requests, defaults to True
+        :type keep_alive: bool, optional
+        :param timeout: The maximum time in milliseconds to wait for the
+        server to send data, None to wait forever, defaults to 120000
+        :type timeout: int, optional
+        :param connect_timeout: The maximum time in milliseconds to connect
+        to the server, None to wait forever, defaults to 10000
+        :type connect_timeout: int, optional
+        """
+        self.token = None
+        self.authenticated_user = None
+        self.headers = None
+
+        self._datetime_convert = datetime_convert
+        self._login = login
+        self._password = password
+        self._connect_lock = None
+
+        self.url = utils.build_url_base(url=url)
+        self.caller = AsyncModel(
+            url=self.url,
+            pool_maxsize=pool_maxsize,
+            pool_maxsize_per_host=pool_maxsize_per_host,
+            keep_alive=keep_alive,
+            timeout=timeout,
+            connect_timeout=connect_timeout,
+        )
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def connect(self):
+        """Connect to prodex with the credentials given to the client.
+        Nothing is done if the client is already connected.
+
+        :raises ValueError: Raise ValueError is token doesn't exists
+        """
+        if self.token:
+            return
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self.token:
+                return
+            self.token, self.authenticated_user = await self.caller.connection(
+                login=self._login, password=self._password
+            )
+            if not self.token:
+                raise ValueError("Token doesn't exists !")
+
+    async def close(self):
+        """Close all the connections opened by the client."""
+        await self.caller.close()
+
+    def set_timeout(self, timeout):
+        """Sets the timeout for all request: the maximum time to wait for the
+        server to send data. By default the timeout is set to 120000.
+
+        :param timeout: The timeout in milliseconds, None to wait forever
+        :type timeout: int
+        """
+        self.caller.timeout = timeout
+
+    def get_session_token(self):
+        """Gets the session token associated with the current session.
+
+        :returns: String containing a session token.
+        :rtype: str
+        """
+        return self.token
+
+    def get_authenticated_user(self):
+        """Gets the current athenticated user.
+
+        :returns: Current user as a dictionnary.
+        :rtype: dict
+        """
+        return self.authenticated_user
+
+    @model_check
+    async def find(
+        self, model, filters=None, fields=None, omit=None, order=None
+    ):
+        """Find models objects matching to the given filters.
+        See :meth:`~prodex_api.Prodex.find`.
+
+            >>> projects = await prodex.find("Project", fields=["id", "name"])
+
+        :param model: The model type looking for
+        :type model: str
+        :param filters: Filters for the request. Should be a list of list,
+        defaults to None
+        :type filters: list, optional
+        :param fields: List of fields to include in each model object returned,
+        by default all fields are returned, defaults to None
+        :type fields: list, optional
+        :param omit: List of fields to omit, defaults to None
+        :type omit: list, optional
+        :param order: Order for the result, defaults to None
+        :type order: dict, optional
+        :return: The result of the request
+        :rtype: list
+        """
+        await self.connect()
+        payload = utils.create_find_payload(
+            filters=filters, fields=fields, omit=omit, order=order
+        )
+        response = await self.caller.retrieve(
+            endpoint=constants.TRANSLATION.get(model), payload=payload
+        )
+        return response
+
+    async def gather_find(self, queries, concurrency=10):
+        """Run many find requests at the same time, with at most
+        ``concurrency`` requests in flight. The results are returned in the
+        same order as the queries.
+
+            >>> queries = [
+            ...     {"model": "Project", "filters": [["id", "is", 1]]},
+            ...     {"model": "User", "fields": ["id", "username"]},
+            ... ]
+            >>> projects, users = await prodex.gather_find(queries)
+
+        :param queries: List of dictionnaries of arguments for
+        :meth:`~prodex_api.AsyncProdex.find`
+        :type queries: list
+        :param concurrency: The maximum number of requests in flight,
+        defaults to 10
+        :type concurrency: int, optional
+        :return: The result of each query
+        :rtype: list
+        """
+        await self.connect()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def _find(query):
+            async with semaphore:
+                return await self.find(**query)
+
+        return await asyncio.gather(*[_find(query) for query in queries])
+
+    @model_check
+    async def create(self, model, data):
+        """Create a new object of the specified ``model``.
+        See :meth:`~prodex_api.Prodex.create`.
+
+        :param model: The model type
+        :type model: str
+        :param data: Dictionary of fields and corresponding values to set
+        on the new object.
+        :type data: dict
+        :return: The created object
+        :rtype: dict
+        """
+        await self.connect()
+        data = utils.data_conformation(data=data)
+        response = await self.caller.create(
+            endpoint=constants.TRANSLATION.get(model), data=data
+        )
+        return response
+
+    @model_check
+    async def update(self, model, model_id, data, m2m_modes=None):
+        """Update the specified model object with the supplied data.
+        See :meth:`~prodex_api.Prodex.update`.
+
+        :param model: The model type to update
+        :type model: str
+        :param model_id: The id of the model to update
+        :type model_id: id
+        :param data: The supplied data
+        :type data: dict
+        :param m2m_modes: Dictionnary indicating what update mode to use on
+        a field which is a many to many type, defaults to None
+        :type m2m_modes: dict, optional
+        :raises ValueError: If the m2m_modes is not a dict
+        :raises ValueError: If no objects have been found for the given id.
+        :return: The updated model object
+        :rtype: dict
+        """
+        await self.connect()
+        data = utils.data_conformation(data=data)
+        endpoint = constants.TRANSLATION.get(model)
+        thumbnail = data.pop("thumbnail", None)
+        files = None
+        if thumbnail:
+            files = utils.prepare_thumbnail_file(path=thumbnail)
+        if m2m_modes:
+            if not isinstance(m2m_modes, dict):
+                raise ValueError("m2m_modes attribut must be a dict.")
+
+            payload = utils.create_find_payload(
+                filters=[["id", "is", model_id]],
+                fields=list(m2m_modes.keys()) + ["id"],
+            )
+            response = await self.caller.retrieve(
+                endpoint=endpoint, payload=payload
+            )
+            # The envelope of a paginated response holds the rows in results
+            if isinstance(response, dict):
+                response = response.get("results", [])
+            initial_data = [
+                row for row in response if str(row.get("id")) == str(model_id)
+            ]
+            if not initial_data:
+                raise ValueError(
+                    "No object found for model {model} and id {model_id}".format(
+                        model=model, model_id=model_id
+                    )
+                )
+            initial_data[0].pop("id")
+            data = utils.build_m2m_update_data(
+                initial_data=initial_data[0], data=data, m2m_modes=m2m_modes
+            )
+        response = await self.caller.update(
+            endpoint=endpoint, model_id=model_id, data=data, files=files
+        )
+        return response
+
+    @model_check
+    async def delete(self, model, model_id):
+        """Delete the specified model.
+        See :meth:`~prodex_api.Prodex.delete`.
+
+        :param model: The model type
+        :type model: str
+        :param model_id: The id of the model to delete
+        :type model_id: int
+        :return: The deleted model
+        :rtype: dict
+        """
+        await self.connect()
+        response = await self.caller.delete(
+            endpoint=constants.TRANSLATION.get(model), model_id=model_id
+        )
+        return response
+
+    @model_check
+    async def restore(self, model, model_id):
+        """Restore a model that has previously been deleted.
+        See :meth:`~prodex_api.Prodex.restore`.
+
+        :param model: The model type
+        :type model: str
+        :param model_id: The id of the model to restore
+        :type model_id: str
+        :return: The restored project
+        :rtype: dict
+        """
+        await self.connect()
+        response = await self.caller.restore(
+            endpoint=constants.TRANSLATION.get(model), model_id=model_id
+        )
+        return response
+
+    @model_check
+    async def get_schema_fields(self, model):
+        """Return all available fields on the specified model with other
+        informations. See :meth:`~prodex_api.Prodex.get_schema_fields`.
+
+        :param model: The model to get fields.
+        :type model: str
+        :return: The schema of the model
+        :rtype: dict
+        """
+        await self.connect()
+        response = await self.caller.retrieve_schema_fields(
+            endpoint=constants.TRANSLATION.get(model)
+        )
+        return response
+
+    @model_check
+    async def get_fields(self, model):
+        """Return all available fields on the specified model.
+        See :meth:`~prodex_api.Prodex.get_fields`.
+
+        :param model: The model to get fields.
+        :type model: str
+        :return: list of all fields
+        :rtype: list
+        """
+        await self.connect()
+        response = await self.caller.retrieve_fields(
+            endpoint=constants.TRANSLATION.get(model)
+        )
+        return response
+
+    @model_check
+    async def upload_thumbnail(self, model, model_id, path):
+        """Upload a file from a local path and assign it as the thumbnail
+        for the specified model.
+        See :meth:`~prodex_api.Prodex.upload_thumbnail`.
+
+        :param model: Model to set the thumbnail for
+        :type model: str
+        :param model_id: Id of the model to set the thumbnail for.
+        :type model_id: int
+        :param path: Full path to the thumbnail file on disk.
+        :type path: str
+        :return: The model updated
+        :rtype: dict
+        """
+        await self.connect()
+        files = utils.prepare_thumbnail_file(path=path)
+        try:
+            response = await self.caller.update(
+                endpoint=constants.TRANSLATION.get(model),
+                model_id=model_id,
+                files=files,
+            )
+        finally:
+            for _file in files.values():
+                _file.close()
+        return response
+
+    def get_models(self):
+        """Return all available models for the API.
+
+        :return: List of models
+        :rtype: list
+        """
+        return list(constants.TRANSLATION.keys())
+
+    async def get_projects_user(self, user_id):
+        """Return all projects assigned to an user.
+        See :meth:`~prodex_api.Prodex.get_projects_user`.
+
+        :param user_id: Id of the user.
+        :type user_id: int
+        :return: list of projects
+        :rtype: list
+        """
+        await self.connect()
+        endpoint = "users/{user_id}/projects".format(user_id=user_id)
+        response = await self.caller.retrieve(endpoint=endpoint)
+        return response
+
+    async def get_task_status(self, task_id):
+        """Retrieve informations about a task such as its status.
+        See :meth:`~prodex_api.Prodex.get_task_status`.
+
+        :param task_id: The id of the task
+        :type task_id: int
+        :return: The information about the task
+        :rtype: dict
+        """
+        await self.connect()
+        endpoint = "task-status/{task_id}".format(task_id=task_id)
+        response = await self.caller.retrieve(endpoint=endpoint)
+        return response
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+#
+# - aggregation -
+#
+# Vectorized group by and aggregation of columns.
+#
+# Copyright (c) 2020 Prodex
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from ..utils import constants
+from .columnar import numpy, to_array
+
+AGGREGATES = ("count", "sum", "mean", "min", "max")
+
+_MINUTE = 60 * 10**6
+_HOUR = 60 * _MINUTE
+
+
+def _days(values):
+    return values.astype("datetime64[D]").astype(numpy.int64)
+
+
+def _year(values):
+    return values.astype("datetime64[Y]").astype(numpy.int64) + 1970
+
+
+def _month(values):
+    return values.astype("datetime64[M]").astype(numpy.int64) % 12 + 1
+
+
+def _day(values):
+    months = values.astype("datetime64[M]").astype("datetime64[D]")
+    return (values.astype("datetime64[D]") - months).astype(numpy.int64) + 1
+
+
+def _quarter(values):
+    return (_month(values) - 1) // 3 + 1
+
+
+def _week_day(values):
+    # 1 for Sunday to 7 for Saturday, the 1970-01-01 was a Thursday
+    return (_days(values) + 4) % 7 + 1
+
+
+def _iso_thursday(values):
+    # The Thursday of the ISO week, which gives the ISO year of the week
+    days = _days(values)
+    return days - (days + 3) % 7 + 3
+
+
+def _iso_year(values):
+    return _year(_iso_thursday(values).astype("datetime64[D]"))
+
+
+def _week(values):
+    thursdays = _iso_thursday(values)
+    years = thursdays.astype("datetime64[D]").astype("datetime64[Y]")
+    firsts = years.astype("datetime64[D]").astype(numpy.int64)
+    return (thursdays - firsts) // 7 + 1
+
+
+def _microseconds(values):
+    values = values.astype("datetime64[us]")
+    return (values - values.astype("datetime64[D]")).astype(numpy.int64)
+
+
+def _hour(values):
+    return _microseconds(values) // _HOUR
+
+
+def _minute(values):
+    return _microseconds(values) % _HOUR // _MINUTE
+
+
+def _second(values):
+    return _microseconds(values) % _MINUTE // 10**6
+
+
+# The date parts of the filter operators
+DATE_PARTS = {
+    "year": _year,
+    "iso_year": _iso_year,
+    "month": _month,
+    "day": _day,
+    "week": _week,
+    "week_day": _week_day,
+    "quarter": _quarter,
+    "hour": _hour,
+    "minute": _minute,
+    "second": _second,
+}
+_LOOKUPS = dict(
+    (constants.OPERATORS[part], part)
+    for part in DATE_PARTS
+    if part in constants.OPERATORS
+)
+
+
+def parse_group(group):
+    """Parses a group by expression: a field (``"project"``), a field with
+    the lookup of a date part (``"started_at__week"``) or a tuple of a field
+    and a date part (``("started_at", "week")``).
+
+    :param group: The expression
+    :type group: str or tuple
+    :raises ValueError: If the date part is unknown
+    :return: The field and the date part or None
+    :rtype: tuple
+    """
+    if isinstance(group, tuple):
+        field, part = group
+        if part not in DATE_PARTS:
+            raise ValueError(
+                "Unknown date part: {part}, expected one of {parts}".format(
+                    part=part, parts=", ".join(DATE_PARTS)
+                )
+            )
+        return field, part
+    field, separator, lookup = group.rpartition("__")
+    part = _LOOKUPS.get(separator + lookup)
+    if field and part:
+        return field, part
+    return group, None
+
+
+def parse_metrics(metrics):
+    """Parses the metrics, a dictionary of a field to an aggregate or a list
+    of aggregates, see :data:`AGGREGATES`.
+
+    :param metrics: The metrics
+    :type metrics: dict
+    :raises ValueError: If an aggregate is unknown
+    :return: The list of field, aggregate
+    :rtype: list
+    """
+    parsed = []
+    for field, aggregates in (metrics or {}).items():
+        if isinstance(aggregates, str):
+            aggregates = [aggregates]
+        for aggregate in aggregates:
+            if aggregate not in AGGREGATES:
+                raise ValueError(
+                    "Unknown aggregate: {aggregate}, "
+                    "expected one of {aggregates}".format(
+                        aggregate=aggregate, aggregates=", ".join(AGGREGATES)
+                    )
+                )
+            parsed.append((field, aggregate))
+    return parsed
+
+
+def factorize(values, missing=None):
+    """Returns the code of each value and the unique values, sorted. A
+    missing value (None, nan or NaT) has its own code, after the others,
+    and is None in the unique values.
+
+    :param values: The values
+    :type values: numpy.ndarray
+    :param missing: The mask of the missing values, by default they are
+    found from the values, defaults to None
+    :type missing: numpy.ndarray, optional
+    :return: The codes and the unique values
+    :rtype: tuple
+    """
+    if values.dtype == object:
+        uniques = {}
+        codes = numpy.fromiter(
+            (uniques.setdefault(value, len(uniques)) for value in values),
+            dtype=numpy.int64,
+            count=len(values),
+        )
+        try:
+            ordered = sorted(uniques, key=lambda value: (value is None, value))
+        except TypeError:
+            ordered = list(uniques)
+        remap = numpy.empty(len(ordered), dtype=numpy.int64)
+        remap[[uniques[value] for value in ordered]] = numpy.arange(
+            len(ordered)
+        )
+        return remap[codes], to_array(ordered)
+
+    if missing is None:
+        missing = _missing(values)
+    if not missing.any():
+        uniques, codes = numpy.unique(values, return_inverse=True)
+        return codes.reshape(-1), uniques
+    uniques, codes = numpy.unique(values[~missing], return_inverse=True)
+    all_codes = numpy.full(len(values), len(uniques), dtype=numpy.int64)
+    all_codes[~missing] = codes.reshape(-1)
+    with_missing = numpy.empty(len(uniques) + 1, dtype=object)
+    with_missing[:-1] = uniques.tolist()
+    return all_codes, with_missing
+
+
+def _missing(values):
+    if values.dtype.kind == "f":
+        return numpy.isnan(values)
+    if values.dtype.kind == "M":
+        return numpy.isnat(values)
+    if values.dtype == object:
+        return numpy.fromiter(
+            (value is None for value in values), dtype=bool, count=len(values)
+        )
+    return numpy.zeros(len(values), dtype=bool)
+
+
+def _numbers(values):
+    if values.dtype.kind == "M":
+        values = values.astype("datetime64[us]")
+        return numpy.where(
+            numpy.isnat(values), numpy.nan, values.astype(numpy.int64)
+        )
+    if values.dtype.kind in "iufb":
+        return values.astype(numpy.float64)
+    # Decimal fields are returned as strings by the API
+    return numpy.array(
+        [numpy.nan if value is None else float(value) for value in values],
+        dtype=numpy.float64,
+    )
+
+
+def _group_keys(columns, groups, size):
+    codes = []
+    uniques = []
+    for field, part in groups:
+        values = columns[field]
+        if part is not None:
+            if values.dtype.kind != "M":
+                raise ValueError(
+                    "Field {field} is not a date or a datetime".format(
+                        field=field
+                    )
+                )
+            missing = numpy.isnat(values)
+            values = DATE_PARTS[part](values)
+        else:
+            missing = None
+        field_codes, field_uniques = factorize(values, missing=missing)
+        codes.append(field_codes)
+        uniques.append(field_uniques)
+
+    if not codes:
+        return numpy.zeros(size, dtype=numpy.int64), []
+    if len(codes) == 1:
+        return codes[0], uniques
+    shape = tuple(len(field_uniques) for field_uniques in uniques)
+    try:
+        combined = numpy.ravel_multi_index(codes, shape)
+    except ValueError:
+        # Too many combinations for a single integer
+        stacked = numpy.stack(codes, axis=1)
+        keys, group_codes = numpy.unique(stacked, axis=0, return_inverse=True)
+        keys = keys.T
+    else:
+        combined, group_codes = numpy.unique(combined, return_inverse=True)
+        keys = numpy.unravel_index(combined, shape)
+    return group_codes.reshape(-1), [
+        field_uniques[keys[index]]
+        for index, field_uniques in enumerate(uniques)
+    ]
+
+
+def aggregate(columns, group_by=None, metrics=None):
+    """Groups the rows of columns and computes the metrics of each group,
+    with numpy. The result is columnar too: a column per group by
+    expression, with the same name, and a column per metric named
+    ``<field>__<aggregate>``. The groups are sorted by their keys, missing
+    keys last.
+
+        >>> aggregate(
+        ...     columns,
+        ...     group_by=["user", "started_at__week"],
+        ...     metrics={"duration": ["sum", "mean"], "id": "count"},
+        ... )
+        {'user': array([1, 1, 2]), 'started_at__week': array([1, 2, 1]),
+        'duration__sum': array([...]), 'duration__mean': array([...]),
+        'id__count': array([...])}
+
+    ``count`` counts the values that are not missing, ``sum``, ``mean``,
+    ``min`` and ``max`` ignore them.
+
+    :param columns: The columns, as returned by
+    :meth:`~prodex_api.Prodex.find_columns`
+    :type columns: dict
+    :param group_by: The group by expressions, see :func:`parse_group`,
+    without groups the rows are aggregated together, defaults to None
+    :type group_by: list, optional
+    :param metrics: The metrics, see :func:`parse_metrics`, defaults to None
+    :type metrics: dict, optional
+    :raises ImportError: If numpy is not installed
+    :raises ValueError: If an expression is invalid
+    :return: The aggregated columns
+    :rtype: dict
+    """
+    if numpy is None:
+        raise ImportError(
+            "numpy is required for aggregations. "
+            "Install it with: pip install prodex_api[numpy]"
+        )
+    group_by = list(group_by or [])
+    groups = [parse_group(group) for group in group_by]
+    metrics = parse_metrics(metrics)
+    size = len(next(iter(columns.values()))) if columns else 0
+
+    codes, keys = _group_keys(columns, groups, size)
+    count = int(codes.max()) + 1 if size else 0
+    result = dict(zip(group_by, keys))
+
+    order = boundaries = None
+    for field, name in metrics:
+        values = columns[field]
+        missing = _missing(values)
+        key = "{field}__{name}".format(field=field, name=name)
+        if name == "count":
+            result[key] = numpy.bincount(codes[~missing], minlength=count)
+            continue
+
+        numbers = _numbers(values)
+        if name in ("sum", "mean"):
+            numbers[missing] = 0
+            sums = numpy.bincount(codes, weights=numbers, minlength=count)
+            if name == "mean":
+                counts = numpy.bincount(codes[~missing], minlength=count)
+                with numpy.errstate(invalid="ignore", divide="ignore"):
+                    sums = sums / counts
+            elif values.dtype.kind in "iu":
+                sums = sums.astype(numpy.int64)
+            result[key] = sums
+            continue
+
+        if order is None:
+            order = numpy.argsort(codes, kind="stable")
+            boundaries = numpy.flatnonzero(
+                numpy.r_[True, numpy.diff(codes[order]) != 0]
+            )
+        reduce = numpy.fmin if name == "min" else numpy.fmax
+        numbers[missing] = numpy.nan
+        reduced = reduce.reduceat(numbers[order], boundaries) if size else []
+        reduced = numpy.asarray(reduced)
+        if values.dtype.kind in "iu":
+            reduced = reduced.astype(numpy.int64)
+        elif values.dtype.kind == "M":
+            missing = numpy.isnan(reduced)
+            reduced[missing] = 0
+            reduced = reduced.astype(numpy.int64).astype("datetime64[us]")
+            reduced[missing] = numpy.datetime64("NaT")
+        result[key] = reduced
+    return result
@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+#
+# - async_models -
+#
+# Asynchronous counterpart of the model, built on aiohttp.
+#
+# Copyright (c) 2020 Prodex
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import asyncio
+import json
+import os
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp is an optional dependency
+    aiohttp = None
+
+from .deadline import remaining
+from .models import (
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_TIMEOUT,
+    DeadlineExceeded,
+    NotAuthenticated,
+    check_status_code,
+)
+
+
+class AsyncResponse(object):
+    """Minimal response object exposing the same interface as
+    :class:`requests.Response` for :func:`check_status_code`."""
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", "replace")
+
+    def json(self):
+        return json.loads(self.content.decode("utf-8"))
+
+
+class AsyncModel(object):
+    def __init__(
+        self,
+        url,
+        pool_maxsize=100,
+        pool_maxsize_per_host=10,
+        keep_alive=True,
+        timeout=DEFAULT_TIMEOUT,
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+    ):
+        """Initializes the asynchronous caller. The aiohttp session and its
+        connection pool are created on the first request, inside the
+        running event loop.
+
+        :param url: The base url of the API
+        :type url: str
+        :param pool_maxsize: The maximum number of simultaneous connections,
+        defaults to 100
+        :type pool_maxsize: int, optional
+        :param pool_maxsize_per_host: The maximum number of simultaneous
+        connections per host, defaults to 10
+        :type pool_maxsize_per_host: int, optional
+        :param keep_alive: Keep connections open between requests,
+        defaults to True
+        :type keep_alive: bool, optional
+        :param timeout: The maximum time in milliseconds to wait for the
+        server to send data, None to wait forever, defaults to 120000
+        :type timeout: int, optional
+        :param connect_timeout: The maximum time in milliseconds to connect
+        to the server, None to wait forever, defaults to 10000
+        :type connect_timeout: int, optional
+        :raises ImportError: If aiohttp is not installed
+        """
+        if aiohttp is None:
+            raise ImportError(
+                "aiohttp is required for the asynchronous client. "
+                "Install it with: pip install prodex_api[async]"
+            )
+
+        self.headers = None
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.url = url
+
+        self.session = None
+        self._pool_maxsize = pool_maxsize
+        self._pool_maxsize_per_host = pool_maxsize_per_host
+        self._keep_alive = keep_alive
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def __get_session(self):
+        """Get the session of the caller, create it if needed.
+
+        :return: The session
+        :rtype: aiohttp.ClientSession
+        """
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self._pool_maxsize,
+                limit_per_host=self._pool_maxsize_per_host,
+                force_close=not self._keep_alive,
+            )
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+
+    def __generate_headers(self, token):
+        """Build the header for all request"""
+        self.headers = {"Authorization": "Token {token}".format(token=token)}
+
+    async def _request(
+        self, method, url, expected, params=None, data=None, files=None
+    ):
+        """Executes a request through the session of the caller and check
+        the status code of the response.
+
+        :param method: The HTTP method
+        :type method: str
+        :param url: The full url of the request
+        :type url: str
+        :param expected: The expected status code(s)
+        :type expected: int or list
+        :param params: The query string parameters, defaults to None
+        :type params: dict, optional
+        :param data: The form data, defaults to None
+        :type data: dict, optional
+        :param files: The files to upload, defaults to None
+        :type files: dict, optional
+        :return: The response of the request
+        :rtype: AsyncResponse
+        """
+        session = self.__get_session()
+        left = remaining()
+        if left is not None and left <= 0:
+            raise DeadlineExceeded("Deadline exceeded.")
+        timeout = aiohttp.ClientTimeout(
+            total=left,
+            sock_connect=_seconds(self.connect_timeout),
+            sock_read=_seconds(self.timeout),
+        )
+        try:
+            async with session.request(
+                method,
+                url,
+                headers=self.headers,
+                params=build_params(params),
+                data=build_form(data, files),
+                timeout=timeout,
+            ) as _response:
+                content = await _response.read()
+                response = AsyncResponse(
+                    status_code=_response.status,
+                    headers=_response.headers,
+                    content=content,
+                )
+        except asyncio.TimeoutError as error:
+            if left is not None and remaining() <= 0:
+                raise DeadlineExceeded(
+                    "Deadline exceeded during {method} {url}".format(
+                        method=method, url=url
+                    )
+                ) from error
+            raise
+        check_status_code(response=response, expected=expected)
+        return response
+
+    async def close(self):
+        """Close the session and all the connections of the pool"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def connection(self, login, password):
+        """Initialize the connection with the application thanks to the given
+        credentials. See :meth:`~prodex_api.libs.models.Model.connection`.
+
+        :param login: The login as credential
+        :type login: str
+        :param password: The password as credential
+        :type password: str
+        :raises NotAuthenticated: If the reponse doesn't contain the session
+        token
+        :return: The token and the authenticated user
+        :rtype: tuple
+        """
+        data = {"username": login, "password": password}
+        response = await self._request(
+            "POST",
+            "{url}/token-auth/".format(url=self.url),
+            expected=200,
+            data=data,
+        )
+        if not response.json().get("token", None):
+            raise NotAuthenticated(response.json())
+        token = response.json().get("token")
+        user_obj = response.json().get("user")
+        self.__generate_headers(token=token)
+        return token, user_obj
+
+    async def create(self, endpoint, data, files=None):
+        """Executes a request with the POST method in order to create
+        a new entity on the application
+
+        :param endpoint: The endpoint for the creation
+        :type endpoint: str
+        :param data: The data of the new entity
+        :type data: dict
+        :param files: The files to upload for the model, defaults to None
+        :type files: dict, optional
+        :return: The created entity if the request is a success
+        :rtype: dict
+        """
+        response = await self._request(
+            "POST",
+            "{url}/{endpoint}/".format(url=self.url, endpoint=endpoint),
+            expected=201,
+            data=data,
+            files=files,
+        )
+        return response.json()
+
+    async def retrieve(self, endpoint, payload=None):
+        """Executes a request with the GET method in order to retrieve the
+        desired ressource.
+
+        :param endpoint: The endpoint for retrieve
+        :type endpoint: str
+        :param payload: The payload, defaults to None
+        :type payload: dict, optional
+        :return: The result of the request
+        :rtype: list
+        """
+        response = await self._request(
+            "GET",
+            "{url}/{endpoint}/".format(url=self.url, endpoint=endpoint),
+            expected=200,
+            params=payload,
+        )
+        return response.json()
+
+    async def update(self, endpoint, model_id, data=None, files=None):
+        """Executes a request with the PATCH method in order to update the
+        desired ressource.
+
+        :param endpoint: The endpoint for the update
+        :type endpoint: str
+        :param model_id: The id of the model to update
+        :type model_id: int
+        :param data: The data for the model to update, defaults to None
+        :type data: dict, optional
+        :param files: The files to upload for the model, defaults to None
+        :type files: dict, optional
+        :return: The updated model
+        :rtype: data
+        """
+        response = await self._request(
+            "PATCH",
+            "{url}/{endpoint}/{model_id}/".format(
+                url=self.url, endpoint=endpoint, model_id=model_id
+            ),
+            expected=200,
+            data=data,
+            files=files,
+        )
+        return response.json()
+
+    async def delete(self, endpoint, model_id):
+        """Executes a request with the DELETE method in order to delete the
+        desired ressource.
+
+        :param endpoint: The endpoint for the deletion
+        :type endpoint: str
+        :param model_id: The id of the model to delete
+        :type model_id: int
+        :return: The deleted ressource, None if the server returns no content
+        :rtype: dict
+        """
+        response = await self._request(
+            "DELETE",
+            "{url}/{endpoint}/{model_id}/".format(
+                url=self.url, endpoint=endpoint, model_id=model_id
+            ),
+            expected=204,
+        )
+        if not response.content:
+            return None
+        return response.json()
+
+    async def restore(self, endpoint, model_id):
+        """Execute a request with the PATCH method in order to restore a
+        deleted ressource.
+
+        :param endpoint: The endpoint for the restore
+        :type endpoint: str
+        :param model_id: The id of the model to restore
+        :type model_id: int
+        :return: The restored ressource
+        :rtype: dict
+        """
+        response = await self._request(
+            "PATCH",
+            "{url}/{endpoint}/{model_id}/restore/".format(
+                url=self.url, endpoint=endpoint, model_id=model_id
+            ),
+            expected=200,
+        )
+        return response.json()
+
+    async def retrieve_fields(self, endpoint):
+        """Executes a request with the GET method in order to get all fields
+        of a model.
+
+        :param endpoint: The endpoint for the request
+        :type endpoint: str
+        :return: The list of all fields
+        :rtype: list
+        """
+        response = await self._request(
+            "GET",
+            "{url}/{endpoint}/fields/".format(url=self.url, endpoint=endpoint),
+            expected=200,
+        )
+        return response.json()
+
+    async def retrieve_schema_fields(self, endpoint):
+        """Executes a request with the OPTIONS method in order to get the
+        schema of a model.
+
+        :param endpoint: The endpoint for the request
+        :type endpoint: str
+        :return: The schema of the model
+        :rtype: dict
+        """
+        response = await self._request(
+            "OPTIONS",
+            "{url}/{endpoint}/".format(url=self.url, endpoint=endpoint),
+            expected=200,
+        )
+        return response.json()
+
+
+def build_params(payload):
+    """Converts a payload to query string parameters accepted by aiohttp,
+    which only allows strings and numbers. Values are encoded the same way
+    as requests does.
+
+    :param payload: The payload
+    :type payload: dict
+    :return: The parameters
+    :rtype: dict
+    """
+    if not payload:
+        return None
+    params = {}
+    for key, value in payload.items():
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            value = str(value)
+        params[key] = value
+    return params
+
+
+def build_form(data=None, files=None):
+    """Converts data and files to a form accepted by aiohttp. List values are
+    sent as repeated fields, the same way as requests does.
+
+    :param data: The form data, defaults to None
+    :type data: dict, optional
+    :param files: The files to upload, defaults to None
+    :type files: dict, optional
+    :return: The form
+    :rtype: aiohttp.FormData
+    """
+    if not data and not files:
+        return None
+    form = aiohttp.FormData()
+    for key, values in (data or {}).items():
+        if values is None:
+            continue
+        if not isinstance(values, (list, tuple)):
+            values = [values]
+        for value in values:
+            form.add_field(key, str(value))
+    for key, _file in (files or {}).items():
+        form.add_field(
+            key, _file, filename=os.path.basename(getattr(_file, "name", key))
+        )
+    return form
+
+
+def _seconds(milliseconds):
+    """Converts a timeout in milliseconds, or None, to seconds"""
+    return None if milliseconds is None else milliseconds / 1000.0
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+#
+# - bulk -
+#
+# Concurrent execution of many requests with per-item results.
+#
+# Copyright (c) 2020 Prodex
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import functools
+import itertools
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .deadline import remaining, submit
+from .models import DeadlineExceeded
+
+
+class BulkResult(object):
+    """The result of one item of a bulk operation. ``result`` is the
+    response of the server if the operation succeeded, otherwise ``error``
+    is the raised exception."""
+
+    __slots__ = ("index", "item", "result", "error")
+
+    def __init__(self, index, item, result=None, error=None):
+        self.index = index
+        self.item = item
+        self.result = result
+        self.error = error
+
+    def __repr__(self):
+        if self.success:
+            return "<BulkResult {index} success>".format(index=self.index)
+        return "<BulkResult {index} error: {error!r}>".format(
+            index=self.index, error=self.error
+        )
+
+    @property
+    def success(self):
+        return self.error is None
+
+
+def run_bulk(
+    func, items, concurrency=8, progress=None, weight=None, limiter=None
+):
+    """Calls ``func`` with each item in a thread pool, with at most
+    ``concurrency`` calls at the same time. An exception raised for an item
+    is stored in its result and doesn't stop the other items.
+
+    The calls run in the context of the caller, so they share its deadline
+    (see :func:`~prodex_api.libs.deadline.deadline`). Once it is exceeded,
+    the remaining items fail with
+    :class:`~prodex_api.libs.models.DeadlineExceeded` without being called.
+
+    :param func: The function to call with each item
+    :type func: callable
+    :param items: The items
+    :type items: iterable
+    :param concurrency: The maximum number of calls at the same time,
+    defaults to 8
+    :type concurrency: int, optional
+    :param progress: Callable called with the number of done items and the
+    total number of items each time an item is done, defaults to None
+    :type progress: callable, optional
+    :param weight: Callable giving the number of items represented by an
+    item for the progress, like the length of a chunk, defaults to None
+    :type weight: callable, optional
+    :param limiter: The adaptive limiter shared with the other operations,
+    it decides how many of the ``concurrency`` threads can send a request,
+    defaults to None
+    :type limiter: prodex_api.libs.concurrency.AdaptiveLimiter, optional
+    :return: The results in the same order as the items
+    :rtype: list
+    """
+    items = list(items)
+    results = [None] * len(items)
+    if not items:
+        return results
+
+    if limiter is not None:
+        func = functools.partial(limiter.call, func)
+
+    def _call(index):
+        left = remaining()
+        if left is not None and left <= 0:
+            error = DeadlineExceeded("Deadline exceeded.")
+            return BulkResult(index, items[index], error=error)
+        try:
+            return BulkResult(index, items[index], result=func(items[index]))
+        except Exception as error:
+            return BulkResult(index, items[index], error=error)
+
+    weight = weight or (lambda item: 1)
+    total = sum(weight(item) for item in items)
+    indexes = iter(range(len(items)))
+    done_count = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        pending = set(
+            submit(executor, _call, index)
+            for index in itertools.islice(indexes, concurrency)
+        )
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                results[result.index] = result
+                done_count += weight(result.item)
+                if progress is not None:
+                    progress(done_count, total)
+            for index in itertools.islice(indexes, len(done)):
+                pending.add(submit(executor, _call, index))
+    return results
+
+
+def chunks(items, size):
+    """Splits the items in lists of at most ``size`` items
+
+    :param items: The items
+    :type items: list
+    :param size: The size of the chunks
+    :type size: int
+    :return: The chunks
+    :rtype: list
+    """
+    return [
+        items[start : start + size] for start in range(0, len(items), size)
+    ]
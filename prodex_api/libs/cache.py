@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+#
+# - cache -
+#
+# Client side cache for the results of the API.
+#
+# Copyright (c) 2020 Prodex
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import collections
+import copy
+import threading
+import time
+
+from .models import make_params_key
+
+
+class ResultCache(object):
+    def __init__(self, maxsize=256, ttl=60, model_ttls=None):
+        """A thread safe cache for the results of
+        :meth:`~prodex_api.Prodex.find`. The least recently used results are
+        evicted when the cache is full, and the results expire after a time
+        to live which can be set per model.
+
+            >>> cache = ResultCache(maxsize=512, ttl=30, model_ttls={"Status": 3600})
+            >>> prodex = Prodex(url, login, password, cache=cache)
+
+        The results are copied when they are stored and when they are
+        returned, so modifying a result doesn't alter the cache.
+
+        :param maxsize: The maximum number of results, defaults to 256
+        :type maxsize: int, optional
+        :param ttl: The time to live of the results in seconds. None to
+        never expire, defaults to 60
+        :type ttl: float, optional
+        :param model_ttls: The time to live for specific models,
+        defaults to None
+        :type model_ttls: dict, optional
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.model_ttls = dict(model_ttls or {})
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._generations = collections.defaultdict(int)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def generation(self, model):
+        """Returns the generation of the model, which changes each time the
+        model is invalidated. It should be taken before a request and given
+        to :meth:`set`, so a result which was fetched before an invalidation
+        isn't stored.
+
+        :param model: The model
+        :type model: str
+        :return: The generation
+        :rtype: int
+        """
+        with self._lock:
+            return self._generations[model]
+
+    def get(self, model, payload):
+        """Returns the cached result for the request
+
+        :param model: The model of the request
+        :type model: str
+        :param payload: The payload of the request
+        :type payload: dict
+        :return: A tuple with True and the result if it is found, otherwise
+        a tuple with False and None
+        :rtype: tuple
+        """
+        key = make_key(model=model, payload=payload)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is not None:
+                if entry[0] < time.monotonic():
+                    del self._entries[key]
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            result = entry[1]
+        return True, copy.deepcopy(result)
+
+    def set(self, model, payload, result, generation=None):
+        """Stores the result of the request
+
+        :param model: The model of the request
+        :type model: str
+        :param payload: The payload of the request
+        :type payload: dict
+        :param result: The result of the request
+        :type result: object
+        :param generation: The generation of the model before the request,
+        defaults to None
+        :type generation: int, optional
+        """
+        key = make_key(model=model, payload=payload)
+        ttl = self.model_ttls.get(model, self.ttl)
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        result = copy.deepcopy(result)
+        with self._lock:
+            if generation is not None and (
+                generation != self._generations[model]
+            ):
+                return
+            self._entries[key] = (expires_at, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, model):
+        """Removes all the results of the given model
+
+        :param model: The model
+        :type model: str
+        """
+        with self._lock:
+            self._generations[model] += 1
+            for key in [key for key in self._entries if key[0] == model]:
+                del self._entries[key]
+
+    def clear(self):
+        """Removes all the results"""
+        with self._lock:
+            for model in list(self._generations):
+                self._generations[model] += 1
+            self._entries.clear()
+
+    def stats(self):
+        """Returns the statistics of the cache
+
+            >>> prodex.cache.stats()
+            {'hits': 12, 'misses': 3, 'size': 3, 'maxsize': 256}
+
+        :return: The number of hits, misses and results in the cache
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+
+def make_key(model, payload):
+    """Builds the canonical key of a request. The values are compared as
+    strings, as they are sent in the query string.
+
+    :param model: The model of the request
+    :type model: str
+    :param payload: The payload of the request
+    :type payload: dict
+    :return: The key
+    :rtype: tuple
+    """
+    return (model, make_params_key(payload=payload))
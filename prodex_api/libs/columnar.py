@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+#
+# - columnar -
+#
+# Build columns from the results of the API.
+#
+# Copyright (c) 2020 Prodex
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import datetime
+import re
+from collections.abc import Mapping
+
+try:
+    import numpy
+except ImportError:  # numpy is an optional dependency
+    numpy = None
+
+_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_DATETIME = re.compile(r"^\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}")
+
+
+class ColumnBuilder(object):
+    def __init__(self):
+        """Builds a list of values per field from rows added one at a time,
+        so the rows don't need to be kept. A missing value is None and a
+        reference to an entity (a dictionary with an ``id``) is replaced by
+        its id.
+
+            >>> builder = ColumnBuilder()
+            >>> builder.append({"id": 1, "project": {"id": 3, "model": "Project"}})
+            >>> builder.append({"id": 2, "duration": 3600})
+            >>> builder.columns
+            {'id': [1, 2], 'project': [3, None], 'duration': [None, 3600]}
+        """
+        self.columns = {}
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, row):
+        """Adds a row
+
+        :param row: The row
+        :type row: dict
+        """
+        for key, value in row.items():
+            column = self.columns.get(key)
+            if column is None:
+                column = self.columns[key] = [None] * self.count
+            if isinstance(value, Mapping):
+                value = value.get("id")
+            column.append(value)
+        self.count += 1
+        if len(row) != len(self.columns):
+            for column in self.columns.values():
+                if len(column) < self.count:
+                    column.append(None)
+
+    def extend(self, rows):
+        """Adds the rows
+
+        :param rows: The rows
+        :type rows: iterable
+        """
+        for row in rows:
+            self.append(row)
+
+    def build(self, as_numpy=True):
+        """Returns the columns
+
+        :param as_numpy: Convert the columns to numpy arrays, see
+        :func:`to_array`, defaults to True
+        :type as_numpy: bool, optional
+        :raises ImportError: If numpy is needed but not installed
+        :return: The columns by field
+        :rtype: dict
+        """
+        if not as_numpy:
+            return self.columns
+        if numpy is None:
+            raise ImportError(
+                "numpy is required for numpy columns. "
+                "Install it with: pip install prodex_api[numpy]"
+            )
+        return dict(
+            (field, to_array(values)) for field, values in self.columns.items()
+        )
+
+
+def to_array(values):
+    """Converts a list of values to a numpy array of the best type:
+
+    - ``int64`` for integers, ``float64`` for numbers with missing values
+      (the missing values are ``nan``) or with decimals
+    - ``datetime64[us]`` (UTC) for ISO 8601 datetimes and ``datetime64[D]``
+      for dates, the missing values are ``NaT``
+    - ``bool`` for booleans without missing values
+    - ``object`` for everything else
+
+    :param values: The values
+    :type values: list
+    :return: The array
+    :rtype: numpy.ndarray
+    """
+    types = set(type(value) for value in values)
+    has_none = type(None) in types
+    types.discard(type(None))
+
+    try:
+        if types == {bool} and not has_none:
+            return numpy.array(values, dtype=bool)
+        if types and types <= {int} and not has_none:
+            return numpy.array(values, dtype=numpy.int64)
+        if types and types <= {int, float}:
+            return numpy.array(
+                [numpy.nan if value is None else value for value in values],
+                dtype=numpy.float64,
+            )
+        if types == {str}:
+            sample = next(value for value in values if value is not None)
+            if _DATE.match(sample):
+                return numpy.array(values, dtype="datetime64[D]")
+            if _DATETIME.match(sample):
+                return numpy.array(
+                    [parse_datetime(value) for value in values],
+                    dtype="datetime64[us]",
+                )
+    except (ValueError, TypeError, OverflowError):
+        pass
+    array = numpy.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def parse_datetime(value):
+    """Parses an ISO 8601 datetime to a naive datetime in UTC
+
+    :param value: The datetime as a string, or None
+    :type value: str
+    :return: The datetime
+    :rtype: datetime.datetime
+    """
+    if value is None:
+        return None
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    parsed = datetime.datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+#
+# - concurrency -
+#
+# Adaptive limit of the concurrent requests.
+#
+# Copyright (c) 2020 Prodex
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import contextlib
+import threading
+import time
+
+import requests
+
+from .models import RequestTimeout, ServiceUnavailable, TooManyRequests
+
+# The errors telling that the server is overloaded
+OVERLOAD_ERRORS = (
+    TooManyRequests,
+    ServiceUnavailable,
+    RequestTimeout,
+    requests.Timeout,
+)
+
+
+class AdaptiveLimiter(object):
+    def __init__(
+        self,
+        initial=4,
+        minimum=1,
+        maximum=32,
+        backoff=0.5,
+        tolerance=2.0,
+        smoothing=0.05,
+    ):
+        """Limits the number of requests running at the same time, and adapts
+        the limit to the server with an AIMD algorithm (additive increase,
+        multiplicative decrease), like the congestion control of TCP:
+
+        - after ``limit`` successful requests with a stable latency, the
+          limit is increased by 1
+        - after a latency spike (more than ``tolerance`` times the usual
+          latency), a ``429 Too Many Requests``, a ``503 Service
+          Unavailable`` or a timeout, the limit is multiplied by
+          ``backoff``. The limit is decreased at most once for the requests
+          which were running at that time.
+
+        The usual latency follows every successful request, the spikes with
+        a lower weight, so a lasting change of latency becomes the new usual
+        latency instead of decreasing the limit forever.
+
+        One limit is shared by all the parallel operations of a client, but
+        the usual latency is kept by operation (see
+        :meth:`~prodex_api.libs.concurrency.AdaptiveLimiter.operation`), so
+        slow requests of an operation are not spikes of the others.
+
+            >>> limiter = AdaptiveLimiter()
+            >>> prodex = Prodex(url, login, password, limiter=limiter)
+            >>> results = prodex.delete_many("Project", ids)
+            >>> limiter.stats()
+            {'limit': 9, 'in_flight': 0, ...}
+
+        :param initial: The initial limit, defaults to 4
+        :type initial: int, optional
+        :param minimum: The minimum limit, defaults to 1
+        :type minimum: int, optional
+        :param maximum: The maximum limit, defaults to 32
+        :type maximum: int, optional
+        :param backoff: The factor applied to the limit when the server is
+        overloaded, defaults to 0.5
+        :type backoff: float, optional
+        :param tolerance: The ratio between the latency of a request and the
+        usual latency considered as a spike, defaults to 2.0
+        :type tolerance: float, optional
+        :param smoothing: The weight of a request in the usual latency, an
+        exponential moving average. A spike weighs ``tolerance`` times less,
+        defaults to 0.05
+        :type smoothing: float, optional
+        """
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+
+        self.limit = min(self.maximum, max(self.minimum, initial))
+        self.in_flight = 0
+        self.latency = None
+        self.latencies = {}
+        self.last_latency = None
+        self.completed = 0
+        self.increases = 0
+        self.decreases = 0
+        self.overloads = 0
+
+        self._successes = 0
+        # Number of running requests which started before the last decrease
+        self._recovering = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Waits until a request can start"""
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency, overloaded=False, operation=None):
+        """Records the end of a request and adapts the limit
+
+        :param latency: The duration of the request in seconds
+        :type latency: float
+        :param overloaded: The request failed because the server is
+        overloaded, defaults to False
+        :type overloaded: bool, optional
+        :param operation: The operation of the request, its latency is
+        compared to the usual latency of this operation, defaults to None
+        :type operation: object, optional
+        """
+        with self._condition:
+            self.in_flight -= 1
+            self.completed += 1
+            self.last_latency = latency
+            recovering = self._recovering > 0
+            if recovering:
+                self._recovering -= 1
+
+            usual = self.latencies.get(operation)
+            spike = usual is not None and latency > usual * self.tolerance
+            if overloaded:
+                self.overloads += 1
+            else:
+                # A spike moves the usual latency slower, but still moves it
+                weight = self.smoothing
+                if spike:
+                    weight /= self.tolerance
+                self.latencies[operation] = _average(usual, latency, weight)
+                self.latency = _average(self.latency, latency, weight)
+
+            if overloaded or spike:
+                self._successes = 0
+                if not recovering:
+                    self.__decrease()
+            else:
+                self._successes += 1
+                if self._successes >= self.limit:
+                    self._successes = 0
+                    if self.limit < self.maximum:
+                        self.limit += 1
+                        self.increases += 1
+            self._condition.notify_all()
+
+    def operation(self, name):
+        """Returns a view of the limiter for an operation: its requests share
+        the limit with all the others, but their latency is only compared to
+        the usual latency of the operation
+
+            >>> limiter.operation(("delete_many", "Project")).call(func)
+
+        :param name: The name of the operation
+        :type name: object
+        :return: The view
+        :rtype: LimiterOperation
+        """
+        return LimiterOperation(limiter=self, name=name)
+
+    def __decrease(self):
+        limit = max(self.minimum, int(self.limit * self.backoff))
+        if limit < self.limit:
+            self.limit = limit
+            self.decreases += 1
+        self._recovering = self.in_flight
+
+    @contextlib.contextmanager
+    def slot(self, operation=None):
+        """Context manager running a request within the limit, see
+        :meth:`~prodex_api.libs.concurrency.AdaptiveLimiter.call`
+
+        :param operation: The operation of the request, defaults to None
+        :type operation: object, optional
+        """
+        self.acquire()
+        start = time.perf_counter()
+        overloaded = False
+        try:
+            yield
+        except OVERLOAD_ERRORS:
+            overloaded = True
+            raise
+        finally:
+            self.release(
+                time.perf_counter() - start,
+                overloaded=overloaded,
+                operation=operation,
+            )
+
+    def call(self, func, *args, **kwargs):
+        """Calls the function when the limit allows it, and adapts the limit
+        with its duration and its errors
+
+        :param func: The function
+        :type func: callable
+        :return: The result of the function
+        :rtype: object
+        """
+        with self.slot():
+            return func(*args, **kwargs)
+
+    def stats(self):
+        """Returns the statistics of the limiter, the latencies are in
+        milliseconds
+
+            >>> limiter.stats()
+            {'limit': 9, 'in_flight': 3, 'minimum': 1, 'maximum': 32,
+            'latency_ms': 41.2, 'last_latency_ms': 39.8, 'completed': 1200,
+            'increases': 11, 'decreases': 2, 'overloads': 1,
+            'operations': {('delete_many', 'Project'): {'latency_ms': 38.5}}}
+
+        :return: The current limit, the number of running requests, the
+        usual latency of all the requests and of each operation, the last
+        latency and the counters of the limiter
+        :rtype: dict
+        """
+
+        def _ms(value):
+            return None if value is None else value * 1000.0
+
+        with self._condition:
+            return {
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "minimum": self.minimum,
+                "maximum": self.maximum,
+                "latency_ms": _ms(self.latency),
+                "last_latency_ms": _ms(self.last_latency),
+                "completed": self.completed,
+                "increases": self.increases,
+                "decreases": self.decreases,
+                "overloads": self.overloads,
+                "operations": dict(
+                    (operation, {"latency_ms": _ms(latency)})
+                    for operation, latency in self.latencies.items()
+                ),
+            }
+
+
+class LimiterOperation(object):
+    def __init__(self, limiter, name):
+        """The requests of an operation run with an adaptive limiter, see
+        :meth:`~prodex_api.libs.concurrency.AdaptiveLimiter.operation`
+
+        :param limiter: The shared limiter
+        :type limiter: AdaptiveLimiter
+        :param name: The name of the operation
+        :type name: object
+        """
+        self.limiter = limiter
+        self.name = name
+
+    def slot(self):
+        """Context manager running a request of the operation within the
+        limit
+
+        :return: The context manager
+        :rtype: contextlib.AbstractContextManager
+        """
+        return self.limiter.slot(operation=self.name)
+
+    def call(self, func, *args, **kwargs):
+        """Calls the function when the limit allows it, like
+        :meth:`~prodex_api.libs.concurrency.AdaptiveLimiter.call`
+
+        :param func: The function
+        :type func: callable
+        :return: The result of the function
+        :rtype: object
+        """
+        with self.slot():
+            return func(*args, **kwargs)
+
+
+def _average(average, value, weight):
+    """Returns the exponential moving average updated with a value
+
+    :param average: The average, None before the first value
+    :type average: float
+    :param value: The value
+    :type value: float
+    :param weight: The weight of the value
+    :type weight: float
+    :return: The new average
+    :rtype: float
+    """
+    if average is None:
+        return value
+    return average + weight * (value - average)
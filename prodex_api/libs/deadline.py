@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+#
+# - deadline -
+#
+# Deadlines of the operations.
+#
+# Copyright (c) 2020 Prodex
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import contextlib
+import contextvars
+import time
+
+_DEADLINE = contextvars.ContextVar("prodex_api_deadline", default=None)
+
+
+@contextlib.contextmanager
+def deadline(seconds):
+    """Context manager giving a time budget to all the requests sent inside
+    it, including the requests of compound operations (like the m2m
+    :meth:`~prodex_api.Prodex.update`, the pages of
+    :meth:`~prodex_api.Prodex.iter_find` or the bulk operations) and the
+    requests sent from their threads. The timeouts of the requests are
+    reduced to the remaining time, and once the budget is spent the next
+    requests raise :class:`~prodex_api.libs.models.DeadlineExceeded`
+    without being sent.
+
+        >>> with deadline(5):
+        ...     prodex.update("Project", 1, data, m2m_modes={"users_assign": "add"})
+
+    Nested deadlines can only reduce the budget.
+
+    :param seconds: The budget in seconds
+    :type seconds: float
+    """
+    expires = time.monotonic() + seconds
+    current = _DEADLINE.get()
+    if current is not None:
+        expires = min(expires, current)
+    token = _DEADLINE.set(expires)
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+def remaining():
+    """Returns the remaining time of the current deadline
+
+    :return: The remaining time in seconds, negative if the deadline is
+    exceeded, or None without deadline
+    :rtype: float
+    """
+    expires = _DEADLINE.get()
+    if expires is None:
+        return None
+    return expires - time.monotonic()
+
+
+def submit(executor, func, *args):
+    """Submits a function to an executor, running in a copy of the current
+    context so the deadline applies in the thread
+
+    :param executor: The executor
+    :type executor: concurrent.futures.Executor
+    :param func: The function
+    :type func: callable
+    :return: The future
+    :rtype: concurrent.futures.Future
+    """
+    return executor.submit(contextvars.copy_context().run, func, *args)
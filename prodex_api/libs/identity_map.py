@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+#
+# - identity_map -
+#
+# Keep a single instance of each entity returned by the API.
+#
+# Copyright (c) 2020 Prodex
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import threading
+import weakref
+from collections.abc import Mapping
+
+_MISSING = object()
+
+
+class Layout(object):
+    """The fields of the records of a model. A layout is shared by all the
+    records of a model, so a record only stores its values. Fields are only
+    appended, the index of a field never changes."""
+
+    __slots__ = ("model", "fields", "indexes")
+
+    def __init__(self, model):
+        self.model = model
+        self.fields = []
+        self.indexes = {}
+
+    def index(self, field):
+        """Returns the index of the field, adding it if needed
+
+        :param field: The field
+        :type field: str
+        :return: The index
+        :rtype: int
+        """
+        index = self.indexes.get(field)
+        if index is None:
+            index = self.indexes[field] = len(self.fields)
+            self.fields.append(field)
+        return index
+
+
+class Record(Mapping):
+    """A read-only entity returned by the API, which behaves like a
+    dictionary. Only one record exists for each entity in an
+    :class:`IdentityMap`, so a record must not be modified; use
+    :meth:`to_dict` to get a modifiable copy."""
+
+    __slots__ = ("_layout", "_values", "__weakref__")
+
+    def __init__(self, layout):
+        self._layout = layout
+        self._values = []
+
+    def __getitem__(self, key):
+        index = self._layout.indexes.get(key)
+        if index is None or index >= len(self._values):
+            raise KeyError(key)
+        value = self._values[index]
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        for index, value in enumerate(self._values):
+            if value is not _MISSING:
+                yield self._layout.fields[index]
+
+    def __len__(self):
+        return sum(1 for value in self._values if value is not _MISSING)
+
+    def __repr__(self):
+        return "<Record {model} {values!r}>".format(
+            model=self._layout.model, values=self.to_dict()
+        )
+
+    @property
+    def model(self):
+        return self._layout.model
+
+    def to_dict(self):
+        """Returns a copy of the record as a dictionary. Nested records are
+        converted too.
+
+        :return: The record as a dictionary
+        :rtype: dict
+        """
+        return dict((key, to_plain(value)) for key, value in self.items())
+
+    def _update(self, data, overwrite):
+        """Sets the values of the record
+
+        :param data: The new values
+        :type data: dict
+        :param overwrite: Overwrite the existing values, otherwise only the
+        missing values are set
+        :type overwrite: bool
+        """
+        for key, value in data.items():
+            index = self._layout.index(key)
+            if index >= len(self._values):
+                self._values.extend(
+                    [_MISSING] * (index + 1 - len(self._values))
+                )
+            if overwrite or self._values[index] is _MISSING:
+                self._values[index] = value
+
+
+class IdentityMap(object):
+    def __init__(self):
+        """Interns the entities returned by the API by ``(model, id)``, so
+        an entity which appears many times (like the users in
+        ``users_assign``) exists only once in memory, as a
+        :class:`Record`.
+
+        The map only holds weak references: a record is forgotten when it
+        is no longer used.
+
+        When an entity is received again, its record is refreshed with the
+        new values, unless both have an ``updated_at`` and the received one
+        is older. Fields which are missing from the record are always added.
+        """
+        self._lock = threading.RLock()
+        self._layouts = {}
+        self._records = weakref.WeakValueDictionary()
+
+    def __len__(self):
+        return len(self._records)
+
+    def get(self, model, model_id):
+        """Returns the record of the entity if it is in the map
+
+        :param model: The model of the entity
+        :type model: str
+        :param model_id: The id of the entity
+        :type model_id: int
+        :return: The record or None
+        :rtype: Record
+        """
+        return self._records.get((model, model_id))
+
+    def clear(self):
+        """Forgets all the records"""
+        with self._lock:
+            self._records.clear()
+
+    def intern(self, data, model=None):
+        """Replaces the entities of the data by their records. An entity is
+        a dictionary with an ``id``, its model is the given model or the
+        value of its ``model`` key. Nested entities are interned too, and
+        the ``results`` of a page of a paginated response are entities of
+        the given model.
+
+        :param data: The data returned by the API
+        :type data: object
+        :param model: The model of the entities at the top level,
+        defaults to None
+        :type model: str, optional
+        :return: The data with records instead of dictionaries
+        :rtype: object
+        """
+        with self._lock:
+            return self.__intern(data, model)
+
+    def __intern(self, data, model):
+        if isinstance(data, list):
+            return [self.__intern(value, model) for value in data]
+        if not isinstance(data, dict):
+            return data
+        if "id" not in data and isinstance(data.get("results"), list):
+            # A page of a paginated response, its rows are of the model
+            return dict(
+                (
+                    key,
+                    self.__intern(value, model if key == "results" else None),
+                )
+                for key, value in data.items()
+            )
+
+        values = dict(
+            (key, self.__intern(value, None)) for key, value in data.items()
+        )
+        model = data.get("model") or model
+        model_id = data.get("id")
+        if not isinstance(model, str) or model_id is None:
+            return values
+
+        key = (model, model_id)
+        record = self._records.get(key)
+        if record is None:
+            layout = self._layouts.get(model)
+            if layout is None:
+                layout = self._layouts[model] = Layout(model)
+            record = Record(layout)
+            record._update(values, overwrite=True)
+            self._records[key] = record
+            return record
+
+        current = record.get("updated_at")
+        received = values.get("updated_at")
+        overwrite = not (current and received and received < current)
+        record._update(values, overwrite=overwrite)
+        return record
+
+
+def to_plain(value):
+    """Converts the records in the value to dictionaries
+
+    :param value: The value
+    :type value: object
+    :return: The value without records
+    :rtype: object
+    """
+    if isinstance(value, Record):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [to_plain(item) for item in value]
+    return value
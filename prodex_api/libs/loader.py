@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+#
+# - loader -
+#
+# Batched loading of objects by id.
+#
+# Copyright (c) 2020 Prodex
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import collections
+import threading
+import time
+from concurrent.futures import Future
+
+from .bulk import run_bulk
+
+
+def id_chunks(ids, max_length):
+    """Splits the ids in chunks whose ``id__in`` filter fits in
+    ``max_length`` characters of the url (the commas are url encoded)
+
+    :param ids: The ids
+    :type ids: list
+    :param max_length: The maximum length of the ids in the url
+    :type max_length: int
+    :return: The chunks
+    :rtype: list
+    """
+    result = []
+    chunk = []
+    length = 0
+    for model_id in ids:
+        id_length = len(str(model_id)) + 3  # %2C
+        if chunk and length + id_length > max_length:
+            result.append(chunk)
+            chunk = []
+            length = 0
+        chunk.append(model_id)
+        length += id_length
+    if chunk:
+        result.append(chunk)
+    return result
+
+
+class Loader(object):
+    def __init__(
+        self, fetch, max_length=1500, window=0.0, concurrency=4, limiter=None
+    ):
+        """Collects the loads of objects by id and fetches them together,
+        with a request per model and chunk of ids instead of a request per
+        object.
+
+        :param fetch: Callable returning the objects of a model, called with
+        the model, the list of ids and the fields (or None)
+        :type fetch: callable
+        :param max_length: The maximum length of the ids in the url of a
+        request, defaults to 1500
+        :type max_length: int, optional
+        :param window: The time in seconds waited by
+        :meth:`~prodex_api.libs.loader.Loader.get_many` for the loads of other
+        threads before fetching, defaults to 0.0
+        :type window: float, optional
+        :param concurrency: The maximum number of requests at the same time,
+        defaults to 4
+        :type concurrency: int, optional
+        :param limiter: The adaptive limiter of the concurrent requests,
+        defaults to None
+        :type limiter: prodex_api.libs.concurrency.AdaptiveLimiter, optional
+        """
+        self.fetch = fetch
+        self.max_length = max_length
+        self.window = window
+        self.concurrency = concurrency
+        self.limiter = limiter
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def load(self, model, model_id, fields=None):
+        """Adds a load, fetched by the next
+        :meth:`~prodex_api.libs.loader.Loader.dispatch`
+
+        :param model: The model
+        :type model: str
+        :param model_id: The id of the object
+        :type model_id: int
+        :param fields: The fields to include, defaults to None
+        :type fields: list, optional
+        :return: The future object, None if it doesn't exist
+        :rtype: concurrent.futures.Future
+        """
+        return self.load_many(model, [model_id], fields=fields)[0]
+
+    def load_many(self, model, model_ids, fields=None):
+        """Adds the loads of many objects, see
+        :meth:`~prodex_api.libs.loader.Loader.load`
+
+        :return: The future objects, in the same order as the ids
+        :rtype: list
+        """
+        return self.__load_many(model, model_ids, fields=fields)[0]
+
+    def __load_many(self, model, model_ids, fields=None):
+        if fields:
+            fields = tuple(sorted(set(fields) | {"id"}))
+        key = (model, fields or None)
+        with self._lock:
+            first = not self._pending
+            loads = self._pending.setdefault(key, collections.OrderedDict())
+            futures = []
+            for model_id in model_ids:
+                future = loads.get(model_id)
+                if future is None:
+                    future = loads[model_id] = Future()
+                futures.append(future)
+        return futures, first
+
+    def get_many(self, model, model_ids, fields=None):
+        """Loads the objects and returns them, with the loads of other threads
+        made during the window
+
+        :param model: The model
+        :type model: str
+        :param model_ids: The ids of the objects
+        :type model_ids: list
+        :param fields: The fields to include, defaults to None
+        :type fields: list, optional
+        :return: The objects in the same order as the ids, None for the
+        objects that don't exist
+        :rtype: list
+        """
+        futures, first = self.__load_many(model, model_ids, fields=fields)
+        # The first thread of a window dispatches the loads of all threads
+        if first:
+            if self.window:
+                time.sleep(self.window)
+            self.dispatch()
+        return [future.result() for future in futures]
+
+    def dispatch(self):
+        """Fetches all the pending loads, a request per model, fields and
+        chunk of ids"""
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+        if not pending:
+            return
+
+        requests = []
+        for (model, fields), loads in pending.items():
+            for chunk in id_chunks(list(loads), self.max_length):
+                requests.append((model, fields, chunk, loads))
+
+        def _fetch(request):
+            model, fields, chunk, loads = request
+            try:
+                rows = self.fetch(
+                    model, chunk, list(fields) if fields else None
+                )
+            except Exception as error:
+                for model_id in chunk:
+                    loads[model_id].set_exception(error)
+                return
+            by_id = dict((row["id"], row) for row in rows)
+            for model_id in chunk:
+                loads[model_id].set_result(by_id.get(model_id))
+
+        if len(requests) == 1:
+            _fetch(requests[0])
+            return
+        for unit in run_bulk(
+            _fetch,
+            requests,
+            concurrency=self.concurrency,
+            limiter=self.limiter,
+        ):
+            # The request was not sent, after the deadline for example
+            if unit.error is not None:
+                _, _, chunk, loads = unit.item
+                for model_id in chunk:
+                    if not loads[model_id].done():
+                        loads[model_id].set_exception(unit.error)
+
+    def cancel(self):
+        """Cancels all the pending loads"""
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+        for loads in pending.values():
+            for future in loads.values():
+                future.cancel()
+
+
+class Batch(object):
+    """An explicit scope of loads: the objects requested in the scope are
+    fetched together when it exits.
+
+        >>> with prodex.batch() as batch:
+        ...     managers = [
+        ...         batch.get("User", project["production_manager"]["id"])
+        ...         for project in projects
+        ...     ]
+        >>> managers[0].result()
+        {'id': 3, 'username': 'jdoe', ...}
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.loader.dispatch()
+        else:
+            self.loader.cancel()
+
+    def get(self, model, model_id, fields=None):
+        """Adds the load of an object
+
+        :return: The future object, None if it doesn't exist
+        :rtype: concurrent.futures.Future
+        """
+        return self.loader.load(model, model_id, fields=fields)
+
+    def get_many(self, model, model_ids, fields=None):
+        """Adds the loads of objects
+
+        :return: The future objects, in the same order as the ids
+        :rtype: list
+        """
+        return self.loader.load_many(model, model_ids, fields=fields)
@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+#
+# - metrics -
+#
+# Instrumentation and metrics of the requests.
+#
+# Copyright (c) 2020 Prodex
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import bisect
+import threading
+
+from ..utils import constants
+
+# Upper bounds of the latency buckets, in seconds
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+_MODELS = dict(
+    (endpoint, model) for model, endpoint in constants.TRANSLATION.items()
+)
+
+
+class RequestEvent(object):
+    """Describes a request sent by the caller, given to the hooks
+    ``request_start`` and ``request_end`` (see
+    :meth:`~prodex_api.libs.models.Model.add_hook`). Each retry of a request
+    is a new event.
+
+    The timings are in seconds:
+
+    - ``ttfb``: from the sending of the request to the reception of the
+      headers of the response
+    - ``total``: from the sending of the request to the reception of the
+      whole body, or of the headers for a streamed response
+    - ``decode``: the decoding of the JSON body, None if it is not decoded
+      with the request (streamed, conditional or coalesced requests)
+
+    The DNS and connection times are not measured: the connection pool of
+    ``requests`` doesn't expose them.
+
+    The sizes are in bytes, without the headers. ``bytes_sent`` is None for
+    streamed bodies and ``bytes_received`` is None for a streamed response
+    without ``Content-Length``.
+    """
+
+    __slots__ = (
+        "method",
+        "url",
+        "endpoint",
+        "model",
+        "attempt",
+        "status",
+        "error",
+        "bytes_sent",
+        "bytes_received",
+        "ttfb",
+        "total",
+        "decode",
+    )
+
+    def __init__(self, method, url, endpoint, attempt=0):
+        self.method = method
+        self.url = url
+        self.endpoint = endpoint
+        self.model = _MODELS.get(endpoint)
+        self.attempt = attempt
+        self.status = None
+        self.error = None
+        self.bytes_sent = None
+        self.bytes_received = None
+        self.ttfb = None
+        self.total = None
+        self.decode = None
+
+    def __repr__(self):
+        return "<RequestEvent {method} {endpoint} {status} {total}>".format(
+            method=self.method,
+            endpoint=self.endpoint,
+            status=self.status if self.error is None else repr(self.error),
+            total=self.total,
+        )
+
+
+class Histogram(object):
+    """A cumulative histogram of durations, like the Prometheus
+    histograms"""
+
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Adds a value
+
+        :param value: The value
+        :type value: float
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """Returns the number of values lower or equal to each bucket,
+        the last one is ``+Inf``
+
+        :return: The pairs of upper bound and count
+        :rtype: list
+        """
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+        result.append((float("inf"), self.count))
+        return result
+
+
+class MetricsRegistry(object):
+    def __init__(self, buckets=DEFAULT_BUCKETS, prefix="prodex_client"):
+        """Collects the metrics of the requests of a client in memory: the
+        number of requests by status, the errors, the bytes, and
+        histograms of the latency and of the JSON decoding, by endpoint and
+        method.
+
+            >>> metrics = MetricsRegistry()
+            >>> prodex = Prodex(url, login, password, metrics=metrics)
+            >>> print(metrics.to_prometheus())
+            # HELP prodex_client_requests_total Requests sent, by status.
+            # TYPE prodex_client_requests_total counter
+            prodex_client_requests_total{endpoint="projects",method="GET",status="200"} 12
+            ...
+
+        :param buckets: The upper bounds of the latency buckets in seconds,
+        defaults to :data:`DEFAULT_BUCKETS`
+        :type buckets: tuple, optional
+        :param prefix: The prefix of the names of the metrics,
+        defaults to "prodex_client"
+        :type prefix: str, optional
+        """
+        self.buckets = tuple(sorted(buckets))
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forgets all the metrics"""
+        with self._lock:
+            self._requests = {}
+            self._errors = {}
+            self._bytes_sent = {}
+            self._bytes_received = {}
+            self._latency = {}
+            self._decode = {}
+
+    def record(self, event):
+        """Records a finished request, usable as a ``request_end`` hook
+
+        :param event: The event of the request
+        :type event: RequestEvent
+        """
+        key = (event.endpoint, event.method)
+        status = "error" if event.status is None else str(event.status)
+        with self._lock:
+            requests_key = key + (status,)
+            self._requests[requests_key] = (
+                self._requests.get(requests_key, 0) + 1
+            )
+            if event.error is not None:
+                error_key = key + (type(event.error).__name__,)
+                self._errors[error_key] = self._errors.get(error_key, 0) + 1
+            if event.bytes_sent:
+                self._bytes_sent[key] = (
+                    self._bytes_sent.get(key, 0) + event.bytes_sent
+                )
+            if event.bytes_received:
+                self._bytes_received[key] = (
+                    self._bytes_received.get(key, 0) + event.bytes_received
+                )
+            if event.total is not None:
+                self.__histogram(self._latency, key).observe(event.total)
+            if event.decode is not None:
+                self.__histogram(self._decode, key).observe(event.decode)
+
+    def __histogram(self, histograms, key):
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = Histogram(self.buckets)
+        return histogram
+
+    def snapshot(self):
+        """Returns the metrics by endpoint and method
+
+            >>> metrics.snapshot()["projects"]["GET"]
+            {'requests': {'200': 12}, 'errors': {}, 'bytes_sent': 0,
+            'bytes_received': 48213, 'latency': {'count': 12, 'sum': 0.31,
+            'buckets': [...]}, 'decode': {...}}
+
+        :return: The metrics
+        :rtype: dict
+        """
+        result = {}
+
+        def _entry(key):
+            endpoint, method = key
+            return result.setdefault(endpoint, {}).setdefault(
+                method,
+                {
+                    "requests": {},
+                    "errors": {},
+                    "bytes_sent": 0,
+                    "bytes_received": 0,
+                    "latency": None,
+                    "decode": None,
+                },
+            )
+
+        def _histogram(histogram):
+            return {
+                "count": histogram.count,
+                "sum": histogram.sum,
+                "buckets": histogram.cumulative(),
+            }
+
+        with self._lock:
+            for (endpoint, method, status), count in self._requests.items():
+                _entry((endpoint, method))["requests"][status] = count
+            for (endpoint, method, error), count in self._errors.items():
+                _entry((endpoint, method))["errors"][error] = count
+            for key, value in self._bytes_sent.items():
+                _entry(key)["bytes_sent"] = value
+            for key, value in self._bytes_received.items():
+                _entry(key)["bytes_received"] = value
+            for key, histogram in self._latency.items():
+                _entry(key)["latency"] = _histogram(histogram)
+            for key, histogram in self._decode.items():
+                _entry(key)["decode"] = _histogram(histogram)
+        return result
+
+    def to_prometheus(self):
+        """Exports the metrics in the text format of Prometheus
+
+        :return: The metrics
+        :rtype: str
+        """
+        lines = []
+
+        def _header(name, kind, description):
+            lines.append(
+                "# HELP {name} {description}".format(
+                    name=name, description=description
+                )
+            )
+            lines.append("# TYPE {name} {kind}".format(name=name, kind=kind))
+
+        def _counters(name, kind, description, values, label_names):
+            name = "{prefix}_{name}".format(prefix=self.prefix, name=name)
+            _header(name, kind, description)
+            for labels, value in sorted(values.items()):
+                lines.append(
+                    "{name}{{{labels}}} {value}".format(
+                        name=name,
+                        labels=_labels(zip(label_names, labels)),
+                        value=_number(value),
+                    )
+                )
+
+        def _histograms(name, description, histograms):
+            name = "{prefix}_{name}".format(prefix=self.prefix, name=name)
+            _header(name, "histogram", description)
+            for (endpoint, method), histogram in sorted(histograms.items()):
+                labels = [("endpoint", endpoint), ("method", method)]
+                for bound, count in histogram.cumulative():
+                    lines.append(
+                        "{name}_bucket{{{labels}}} {count}".format(
+                            name=name,
+                            labels=_labels(labels + [("le", _number(bound))]),
+                            count=count,
+                        )
+                    )
+                lines.append(
+                    "{name}_sum{{{labels}}} {value}".format(
+                        name=name,
+                        labels=_labels(labels),
+                        value=_number(histogram.sum),
+                    )
+                )
+                lines.append(
+                    "{name}_count{{{labels}}} {value}".format(
+                        name=name,
+                        labels=_labels(labels),
+                        value=histogram.count,
+                    )
+                )
+
+        with self._lock:
+            _counters(
+                "requests_total",
+                "counter",
+                "Requests sent, by status.",
+                self._requests,
+                ("endpoint", "method", "status"),
+            )
+            _counters(
+                "errors_total",
+                "counter",
+                "Failed requests, by error.",
+                self._errors,
+                ("endpoint", "method", "error"),
+            )
+            _counters(
+                "sent_bytes_total",
+                "counter",
+                "Bytes sent in the bodies of the requests.",
+                self._bytes_sent,
+                ("endpoint", "method"),
+            )
+            _counters(
+                "received_bytes_total",
+                "counter",
+                "Bytes received in the bodies of the responses.",
+                self._bytes_received,
+                ("endpoint", "method"),
+            )
+            _histograms(
+                "request_duration_seconds",
+                "Duration of the requests.",
+                self._latency,
+            )
+            _histograms(
+                "decode_duration_seconds",
+                "Duration of the decoding of the JSON responses.",
+                self._decode,
+            )
+        return "\n".join(lines) + "\n"
+
+
+def _labels(pairs):
+    """Formats the labels of a Prometheus sample"""
+    return ",".join(
+        '{name}="{value}"'.format(
+            name=name,
+            value=str(value)
+            .replace("\\", "\\\\")
+            .replace("\n", "\\n")
+            .replace('"', '\\"'),
+        )
+        for name, value in pairs
+    )
+
+
+def _number(value):
+    """Formats a number of a Prometheus sample"""
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
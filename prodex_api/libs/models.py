@@ -25,8 +25,23 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import collections
+import json
+import threading
+import time
+
 import requests
 
+from ..utils.streaming import JSONArrayStream
+from .deadline import remaining
+from .metrics import RequestEvent
+from .pagination import next_page_payload
+from .transports import create_transport
+
+# Timeouts of the requests in milliseconds
+DEFAULT_CONNECT_TIMEOUT = 10000
+DEFAULT_TIMEOUT = 120000
+
 
 class ApiError(Exception):
     """Raised when no other Exception exists for the code"""
@@ -64,6 +79,12 @@ class RequestTimeout(ApiError):
     pass
 
 
+class TooManyRequests(ApiError):
+    """Raised when status code is 429"""
+
+    pass
+
+
 class InternalServerError(ApiError):
     """Raised when status code is 500"""
 
@@ -76,21 +97,133 @@ class ServiceUnavailable(ApiError):
     pass
 
 
+class DeadlineExceeded(ApiError):
+    """Raised when the deadline of an operation is exceeded"""
+
+    pass
+
+
 class NotAuthenticated(ApiError):
     """Raised when the authentication process failed"""
 
     pass
 
 
+class _Flight(object):
+    """A request in progress, shared by the identical requests"""
+
+    __slots__ = ("done", "content", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.content = None
+        self.error = None
+
+
 class Model(object):
-    def __init__(self, url):
+    def __init__(
+        self,
+        url,
+        pool_connections=10,
+        pool_maxsize=10,
+        keep_alive=True,
+        conditional_requests=False,
+        conditional_cache_size=256,
+        coalesce_requests=False,
+        retry=None,
+        rate_limiter=None,
+        timeout=DEFAULT_TIMEOUT,
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+        transport="requests",
+    ):
+        """Initializes the caller with a persistent HTTP session. All requests
+        share the same connection pool, so the TCP and TLS handshakes are
+        only done once per connection instead of once per request.
+
+        :param url: The base url of the API
+        :type url: str
+        :param pool_connections: The number of connection pools to cache
+        (one pool per host), defaults to 10
+        :type pool_connections: int, optional
+        :param pool_maxsize: The maximum number of connections to keep alive
+        per host, defaults to 10
+        :type pool_maxsize: int, optional
+        :param keep_alive: Keep connections open between requests,
+        defaults to True
+        :type keep_alive: bool, optional
+        :param conditional_requests: Remember the validators (ETag,
+        Last-Modified) of the responses of
+        :meth:`~prodex_api.libs.models.Model.retrieve` and send them with the
+        next identical request. The body is not downloaded again if it has
+        not changed, defaults to False
+        :type conditional_requests: bool, optional
+        :param conditional_cache_size: The maximum number of responses kept
+        for the conditional requests, defaults to 256
+        :type conditional_cache_size: int, optional
+        :param coalesce_requests: Share the response of
+        :meth:`~prodex_api.libs.models.Model.retrieve` between identical
+        requests running at the same time in different threads: only the
+        first one is sent, the others wait for its response,
+        defaults to False
+        :type coalesce_requests: bool, optional
+        :param retry: The policy to send again the requests which failed
+        because of a connection error or a temporary error of the server,
+        by default the requests are not retried, defaults to None
+        :type retry: prodex_api.libs.retry.RetryPolicy, optional
+        :param rate_limiter: Limits the number of requests per second,
+        defaults to None
+        :type rate_limiter: prodex_api.libs.retry.RateLimiter, optional
+        :param timeout: The maximum time in milliseconds to wait for the
+        server to send data, None to wait forever, defaults to 120000
+        :type timeout: int, optional
+        :param connect_timeout: The maximum time in milliseconds to connect
+        to the server, None to wait forever, defaults to 10000
+        :type connect_timeout: int, optional
+        :param transport: Sends the requests: the name of a backend,
+        "requests" or "urllib3" (leaner, see
+        :class:`~prodex_api.libs.transports.Urllib3Transport`), or a
+        transport, for example to record the requests or to replay recorded
+        responses (see :mod:`~prodex_api.libs.transports`). The pool options
+        are ignored if a transport is given, defaults to "requests"
+        :type transport: str or prodex_api.libs.transports.Transport,
+        optional
+        """
 
         self.headers = None
-        self.timeout = None
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
         self.url = url
 
+        self.conditional_requests = conditional_requests
+        self.conditional_cache_size = conditional_cache_size
+        self._validators = collections.OrderedDict()
+        self._validators_lock = threading.Lock()
+
+        self.coalesce_requests = coalesce_requests
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+
+        self.retry = retry
+        self.rate_limiter = rate_limiter
+        self.hooks = {"request_start": [], "request_end": []}
+
+        if isinstance(transport, str) or transport is None:
+            transport = create_transport(
+                transport or "requests",
+                pool_connections=pool_connections,
+                pool_maxsize=pool_maxsize,
+                keep_alive=keep_alive,
+            )
+        self.transport = transport
+
         self.__ping_url()
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def __ping_url(self):
         """Test the connection between the client and the prodex API"""
         # try:
@@ -103,6 +236,220 @@ class Model(object):
         """Build the header for all request"""
         self.headers = {"Authorization": "Token {token}".format(token=token)}
 
+    def _request(self, method, url, expected, decode=False, **kwargs):
+        """Executes a request through the transport of the caller and check
+        the status code of the response.
+
+        The request waits for the rate limiter and is retried according to
+        the retry policy of the caller, if they are defined. The timeouts
+        are reduced to the remaining time of the current deadline, see
+        :func:`~prodex_api.libs.deadline.deadline`.
+
+        The hooks ``request_start`` and ``request_end`` are called for each
+        attempt, see :meth:`~prodex_api.libs.models.Model.add_hook`.
+
+        :param method: The HTTP method
+        :type method: str
+        :param url: The full url of the request
+        :type url: str
+        :param expected: The expected status code(s)
+        :type expected: int or list
+        :param decode: Return the decoded JSON body instead of the response,
+        None for an empty body, defaults to False
+        :type decode: bool, optional
+        :raises DeadlineExceeded: If the deadline is exceeded
+        :return: The response of the request
+        :rtype: requests.Response
+        """
+        if isinstance(expected, int):
+            expected = [expected]
+        stream = kwargs.get("stream", False)
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            timeout = self.__timeout()
+            event = self.__start_event(method, url, attempt)
+            start = time.perf_counter()
+            try:
+                response = self.transport.request(
+                    method, url, timeout=timeout, **kwargs
+                )
+            except (requests.ConnectionError, requests.Timeout) as error:
+                self.__end_event(event, start, error=error)
+                left = remaining()
+                if left is not None and left <= 0:
+                    raise DeadlineExceeded(
+                        "Deadline exceeded during {method} {url}".format(
+                            method=method, url=url
+                        )
+                    ) from error
+                if self.retry is None or not self.retry.is_retryable(
+                    method, attempt
+                ):
+                    raise
+                delay = self.retry.delay(attempt)
+            except Exception as error:
+                self.__end_event(event, start, error=error)
+                raise
+            else:
+                if (
+                    self.retry is None
+                    or response.status_code in expected
+                    or not self.retry.is_retryable(method, attempt, response)
+                ):
+                    try:
+                        check_status_code(response=response, expected=expected)
+                        result = response
+                        if decode:
+                            result = self.__decode(response, event)
+                    except Exception as error:
+                        self.__end_event(event, start, response, error, stream)
+                        raise
+                    self.__end_event(event, start, response, stream=stream)
+                    return result
+                self.__end_event(event, start, response, stream=stream)
+                delay = self.retry.delay(attempt, response)
+                response.close()
+            left = remaining()
+            if left is not None and delay >= left:
+                raise DeadlineExceeded(
+                    "No time left to retry {method} {url}".format(
+                        method=method, url=url
+                    )
+                )
+            rewind_files(kwargs.get("files"))
+            attempt += 1
+            time.sleep(delay)
+
+    def add_hook(self, name, func):
+        """Adds a function called with a
+        :class:`~prodex_api.libs.metrics.RequestEvent` at each request:
+        ``request_start`` before it is sent, ``request_end`` when it is
+        done or failed. The hooks are called in the thread of the request,
+        an exception raised by a hook is raised by the request.
+
+            >>> caller.add_hook("request_end", lambda event: print(event))
+
+        :param name: "request_start" or "request_end"
+        :type name: str
+        :param func: The function
+        :type func: callable
+        :raises ValueError: If the name is unknown
+        """
+        if name not in self.hooks:
+            raise ValueError(
+                "Unknown hook: {name}, expected one of {names}".format(
+                    name=name, names=", ".join(sorted(self.hooks))
+                )
+            )
+        self.hooks[name].append(func)
+
+    def remove_hook(self, name, func):
+        """Removes a function added with
+        :meth:`~prodex_api.libs.models.Model.add_hook`
+
+        :param name: "request_start" or "request_end"
+        :type name: str
+        :param func: The function
+        :type func: callable
+        """
+        if func in self.hooks.get(name, []):
+            self.hooks[name].remove(func)
+
+    def __start_event(self, method, url, attempt):
+        """Creates the event of a request and calls the ``request_start``
+        hooks, if there are hooks
+
+        :return: The event or None
+        :rtype: RequestEvent
+        """
+        if not self.hooks["request_start"] and not self.hooks["request_end"]:
+            return None
+        endpoint = url
+        if url.startswith(self.url):
+            endpoint = url[len(self.url) :].strip("/").split("/")[0]
+        event = RequestEvent(method, url, endpoint, attempt=attempt)
+        for hook in self.hooks["request_start"]:
+            hook(event)
+        return event
+
+    def __end_event(
+        self, event, start, response=None, error=None, stream=False
+    ):
+        """Completes the event of a request and calls the ``request_end``
+        hooks
+
+        :param event: The event, None without hooks
+        :type event: RequestEvent
+        :param start: The time when the request was sent
+        :type start: float
+        :param response: The response, defaults to None
+        :type response: requests.Response, optional
+        :param error: The error, defaults to None
+        :type error: Exception, optional
+        :param stream: The body of the response is not read yet,
+        defaults to False
+        :type stream: bool, optional
+        """
+        if event is None:
+            return
+        event.total = time.perf_counter() - start
+        event.error = error
+        if response is not None:
+            event.status = response.status_code
+            event.ttfb = response.elapsed.total_seconds()
+            body = response.request.body if response.request else None
+            if isinstance(body, (bytes, str)):
+                event.bytes_sent = len(body)
+            length = response.headers.get("Content-Length", "")
+            if length.isdigit():
+                event.bytes_received = int(length)
+            elif not stream:
+                event.bytes_received = len(response.content or b"")
+        for hook in self.hooks["request_end"]:
+            hook(event)
+
+    def __decode(self, response, event):
+        """Decodes the JSON body of a response, and measures the time of the
+        decoding for the event
+
+        :return: The decoded body, None if it is empty
+        :rtype: object
+        """
+        if not response.content:
+            return None
+        start = time.perf_counter()
+        data = response.json()
+        if event is not None:
+            event.decode = time.perf_counter() - start
+        return data
+
+    def __timeout(self):
+        """Returns the connect and read timeouts of a request in seconds,
+        reduced to the remaining time of the deadline
+
+        :raises DeadlineExceeded: If the deadline is exceeded
+        :return: The timeouts
+        :rtype: tuple
+        """
+        timeouts = [
+            None if value is None else value / 1000.0
+            for value in (self.connect_timeout, self.timeout)
+        ]
+        left = remaining()
+        if left is None:
+            return tuple(timeouts)
+        if left <= 0:
+            raise DeadlineExceeded("Deadline exceeded.")
+        return tuple(
+            left if value is None else min(value, left) for value in timeouts
+        )
+
+    def close(self):
+        """Close the transport and all the connections of the pool"""
+        self.transport.close()
+
     def connection(self, login, password):
         """Initialize the connection with the application thanks to the given
         credentials. If the credentials are corrects, the session token
@@ -118,14 +465,17 @@ class Model(object):
         :rtype: tuple
         """
         data = {"username": login, "password": password}
-        response = requests.post(
-            "{url}/token-auth/".format(url=self.url), data=data
+        content = self._request(
+            "POST",
+            "{url}/token-auth/".format(url=self.url),
+            expected=200,
+            data=data,
+            decode=True,
         )
-        check_status_code(response=response, expected=200)
-        if not response.json().get("token", None):
-            raise NotAuthenticated(response.json())
-        token = response.json().get("token")
-        user_obj = response.json().get("user")
+        if not content.get("token", None):
+            raise NotAuthenticated(content)
+        token = content.get("token")
+        user_obj = content.get("user")
         self.__generate_headers(token=token)
         return token, user_obj
 
@@ -142,14 +492,36 @@ class Model(object):
         :return: The created entity if the request is a success
         :rtype: dict
         """
-        response = requests.post(
+        return self._request(
+            "POST",
             "{url}/{endpoint}/".format(url=self.url, endpoint=endpoint),
+            expected=201,
             headers=self.headers,
             data=data,
             files=files,
+            decode=True,
+        )
+
+    def create_many(self, endpoint, data):
+        """Executes a request with the POST method in order to create many
+        entities at once. The server must accept a list of objects on the
+        endpoint.
+
+        :param endpoint: The endpoint for the creation
+        :type endpoint: str
+        :param data: The list of the data of the new entities
+        :type data: list
+        :return: The created entities if the request is a success
+        :rtype: list
+        """
+        return self._request(
+            "POST",
+            "{url}/{endpoint}/".format(url=self.url, endpoint=endpoint),
+            expected=201,
+            headers=self.headers,
+            json=data,
+            decode=True,
         )
-        check_status_code(response=response, expected=201)
-        return response.json()
 
     def retrieve(self, endpoint, payload=None):
         """Executes a request with the GET method in order to retrieve the
@@ -157,6 +529,14 @@ class Model(object):
         The payload is a dictionnary wich contains all filters, all desired
         fields, or all omits fields, and the desired order.
 
+        If the conditional requests are enabled, the validators of the
+        previous identical request are sent, and the previous body is used
+        if the server answers ``304 Not Modified``.
+
+        If the requests are coalesced, a request identical to one already
+        running in another thread waits for its response instead of being
+        sent again. Every caller receives its own copy of the result.
+
         :param endpoint: The endpoint for retrieve
         :type endpoint: str
         :param payload: The payload, defaults to None
@@ -164,14 +544,152 @@ class Model(object):
         :return: The result of the request
         :rtype: list
         """
-        response = requests.get(
-            "{url}/{endpoint}/".format(url=self.url, endpoint=endpoint),
-            headers=self.headers,
+        url = "{url}/{endpoint}/".format(url=self.url, endpoint=endpoint)
+        if not self.coalesce_requests and not self.conditional_requests:
+            return self._request(
+                "GET",
+                url,
+                expected=200,
+                headers=self.headers,
+                params=payload,
+                decode=True,
+            )
+        if not self.coalesce_requests:
+            content = self.__retrieve_content(url=url, payload=payload)
+            return json.loads(content.decode("utf-8"))
+
+        key = (url, make_params_key(payload))
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if leader:
+            try:
+                flight.content = self.__retrieve_content(
+                    url=url, payload=payload
+                )
+            except BaseException as error:
+                flight.error = error
+                raise
+            finally:
+                with self._flights_lock:
+                    del self._flights[key]
+                flight.done.set()
+        else:
+            # The follower waits for the leader within its own deadline
+            if not flight.done.wait(timeout=remaining()):
+                raise DeadlineExceeded(
+                    "Deadline exceeded while waiting for GET {url}".format(
+                        url=url
+                    )
+                )
+            if flight.error is not None:
+                raise flight.error
+        # Each caller decodes its own copy of the result
+        return json.loads(flight.content.decode("utf-8"))
+
+    def __retrieve_content(self, url, payload):
+        """Executes the GET request of
+        :meth:`~prodex_api.libs.models.Model.retrieve`
+
+        :param url: The url of the request
+        :type url: str
+        :param payload: The payload
+        :type payload: dict
+        :return: The body of the response
+        :rtype: bytes
+        """
+        if not self.conditional_requests:
+            response = self._request(
+                "GET",
+                url,
+                expected=200,
+                headers=self.headers,
+                params=payload,
+            )
+            return response.content
+
+        key = (url, make_params_key(payload))
+        with self._validators_lock:
+            validator = self._validators.get(key)
+        headers = dict(self.headers or {})
+        if validator is not None:
+            etag, last_modified, _ = validator
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        response = self._request(
+            "GET",
+            url,
+            expected=[200, 304],
+            headers=headers,
             params=payload,
         )
 
-        check_status_code(response=response, expected=200)
-        return response.json()
+        if response.status_code == 304:
+            if validator is None:
+                raise ApiError("Not modified response without validator.")
+            with self._validators_lock:
+                if key in self._validators:
+                    self._validators.move_to_end(key)
+            return validator[2]
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        with self._validators_lock:
+            if etag or last_modified:
+                self._validators[key] = (etag, last_modified, response.content)
+                self._validators.move_to_end(key)
+                while len(self._validators) > self.conditional_cache_size:
+                    self._validators.popitem(last=False)
+            else:
+                self._validators.pop(key, None)
+        return response.content
+
+    def retrieve_stream(self, endpoint, payload=None, chunk_size=65536):
+        """Executes a request with the GET method like
+        :meth:`~prodex_api.libs.models.Model.retrieve`, but the response is
+        read by chunks and the objects are decoded and yielded one at a time.
+        The whole body is never held in memory.
+
+        If the server paginates its responses, the ``next`` links are
+        followed and the objects of all the pages are yielded.
+
+        :param endpoint: The endpoint for retrieve
+        :type endpoint: str
+        :param payload: The payload, defaults to None
+        :type payload: dict, optional
+        :param chunk_size: The number of bytes read at a time,
+        defaults to 65536
+        :type chunk_size: int, optional
+        :return: Generator of objects
+        :rtype: generator
+        """
+        url = "{url}/{endpoint}/".format(url=self.url, endpoint=endpoint)
+        while True:
+            response = self._request(
+                "GET",
+                url,
+                expected=200,
+                headers=self.headers,
+                params=payload,
+                stream=True,
+            )
+            try:
+                stream = JSONArrayStream(
+                    response.iter_content(chunk_size=chunk_size),
+                    encoding=response.encoding or "utf-8",
+                )
+                for item in stream:
+                    yield item
+            finally:
+                response.close()
+            if not stream.members.get("next"):
+                return
+            payload = next_page_payload(url=stream.members["next"])
 
     def update(self, endpoint, model_id, data=None, files=None):
         """Executes a request with the PATCH method in order to update the
@@ -189,18 +707,18 @@ class Model(object):
         :return: The updated model
         :rtype: data
         """
-        response = requests.patch(
+        return self._request(
+            "PATCH",
             "{url}/{endpoint}/{model_id}/".format(
                 url=self.url, endpoint=endpoint, model_id=model_id
             ),
+            expected=200,
             headers=self.headers,
             data=data,
             files=files,
+            decode=True,
         )
 
-        check_status_code(response=response, expected=200)
-        return response.json()
-
     def delete(self, endpoint, model_id):
         """Executes a request with the DELETE method in order to delete the
         desired ressource.
@@ -209,19 +727,19 @@ class Model(object):
         :type endpoint: str
         :param model_id: The id of the model to delete
         :type model_id: int
-        :return: The deleted ressource
+        :return: The deleted ressource, None if the server returns no content
         :rtype: dict
         """
-        response = requests.delete(
+        return self._request(
+            "DELETE",
             "{url}/{endpoint}/{model_id}/".format(
                 url=self.url, endpoint=endpoint, model_id=model_id
             ),
+            expected=204,
             headers=self.headers,
+            decode=True,
         )
 
-        check_status_code(response=response, expected=204)
-        return response.json()
-
     def restore(self, endpoint, model_id):
         """Execute a request with the PATCH method in order to restore a
         deleted ressource.
@@ -233,16 +751,16 @@ class Model(object):
         :return: The restored ressource
         :rtype: dict
         """
-        response = requests.patch(
+        return self._request(
+            "PATCH",
             "{url}/{endpoint}/{model_id}/restore/".format(
                 url=self.url, endpoint=endpoint, model_id=model_id
             ),
+            expected=200,
             headers=self.headers,
+            decode=True,
         )
 
-        check_status_code(response=response, expected=200)
-        return response.json()
-
     def retrieve_fields(self, endpoint):
         """Executes a request with the GET method in order to get all fields
         of a model.
@@ -252,14 +770,14 @@ class Model(object):
         :return: The list of all fields
         :rtype: list
         """
-        response = requests.get(
+        return self._request(
+            "GET",
             "{url}/{endpoint}/fields/".format(url=self.url, endpoint=endpoint),
+            expected=200,
             headers=self.headers,
+            decode=True,
         )
 
-        check_status_code(response=response, expected=200)
-        return response.json()
-
     def retrieve_schema_fields(self, endpoint):
         """Executes a request with the OPTIONS method in order to get the
         schema of a model.
@@ -269,13 +787,27 @@ class Model(object):
         :return: The schema of the model
         :rtype: dict
         """
-        response = requests.options(
+        return self._request(
+            "OPTIONS",
             "{url}/{endpoint}/".format(url=self.url, endpoint=endpoint),
+            expected=200,
             headers=self.headers,
+            decode=True,
         )
 
-        check_status_code(response=response, expected=200)
-        return response.json()
+
+def rewind_files(files):
+    """Moves the files of a request back to their start, before it is sent
+    again
+
+    :param files: The files of the request
+    :type files: dict
+    """
+    for value in (files or {}).values():
+        if isinstance(value, (list, tuple)):
+            value = value[1] if len(value) > 1 else None
+        if hasattr(value, "seek"):
+            value.seek(0)
 
 
 def check_status_code(response, expected):
@@ -290,19 +822,55 @@ def check_status_code(response, expected):
         expected = [expected]
     status_code = response.status_code
     if status_code not in expected:
+        content = error_content(response=response)
         if status_code == 400:
-            raise BadRequest(response.json())
+            raise BadRequest(content)
         elif status_code == 401:
-            raise Unauthorized(response.json())
+            raise Unauthorized(content)
         elif status_code == 403:
-            raise Forbidden(response.json())
+            raise Forbidden(content)
         elif status_code == 404:
-            raise NotFound(response.json())
+            raise NotFound(content)
         elif status_code == 408:
-            raise RequestTimeout(response.json())
+            raise RequestTimeout(content)
+        elif status_code == 429:
+            raise TooManyRequests(content)
         elif status_code == 500:
-            raise InternalServerError(response.json())
+            raise InternalServerError(content)
         elif status_code == 503:
-            raise ServiceUnavailable(response.json())
+            raise ServiceUnavailable(content)
         else:
-            raise ApiError(response.json())
+            raise ApiError(content)
+
+
+def error_content(response):
+    """Get the content of an error response. Some responses, like
+    ``304 Not Modified`` or errors from a proxy, have no JSON body.
+
+    :param response: The response
+    :type response: requests.Response
+    :return: The decoded JSON body, or the status code and the text
+    :rtype: object
+    """
+    try:
+        return response.json()
+    except ValueError:
+        return {"status_code": response.status_code, "detail": response.text}
+
+
+def make_params_key(payload):
+    """Builds a canonical key for the parameters of a request. The values are
+    compared as strings, as they are sent in the query string.
+
+    :param payload: The parameters
+    :type payload: dict
+    :return: The key
+    :rtype: tuple
+    """
+    return tuple(
+        sorted(
+            (key, str(value))
+            for key, value in (payload or {}).items()
+            if value is not None
+        )
+    )
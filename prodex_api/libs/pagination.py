@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+#
+# - pagination -
+#
+# Iterate over the results of the API page by page.
+#
+# Copyright (c) 2020 Prodex
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import collections
+import functools
+import itertools
+import math
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlparse
+
+from ..utils import constants
+from .deadline import submit
+
+
+class Paginator(object):
+    def __init__(
+        self,
+        caller,
+        endpoint,
+        payload=None,
+        page_size=100,
+        parallel_pages=0,
+        limiter=None,
+    ):
+        """Walks through the results of a request page by page, so only one
+        page is held in memory at a time.
+
+        If the server paginates its responses (``{"count": ..., "next": ...,
+        "results": [...]}``), the ``next`` links are followed. Otherwise the
+        paginator falls back to a keyset pagination: the next page is
+        requested with ``id > last_id``, which requires the results to be
+        ordered by ``id``.
+
+        With ``parallel_pages``, the next pages are fetched in a thread pool
+        while the current one is consumed. The pages are still yielded in
+        order and at most ``parallel_pages`` pages are fetched ahead. The
+        read-ahead needs the server pagination with a ``count`` and ``page``
+        or ``offset`` links, other paginations are walked one page after
+        another.
+
+        :param caller: The caller used for the requests
+        :type caller: Model
+        :param endpoint: The endpoint of the request
+        :type endpoint: str
+        :param payload: The payload of the request, defaults to None
+        :type payload: dict, optional
+        :param page_size: The number of rows per page, defaults to 100
+        :type page_size: int, optional
+        :param parallel_pages: The number of pages to fetch ahead,
+        defaults to 0
+        :type parallel_pages: int, optional
+        :param limiter: The adaptive limiter of the pages fetched ahead,
+        defaults to None
+        :type limiter: prodex_api.libs.concurrency.AdaptiveLimiter, optional
+        """
+        self.caller = caller
+        self.endpoint = endpoint
+        self.payload = dict(payload or {})
+        self.page_size = page_size
+        self.parallel_pages = parallel_pages
+        self.limiter = limiter
+
+        # Number of rows given by the server, if it paginates its responses
+        self.count = None
+
+        self.payload.setdefault("ordering", "id")
+        self.payload["page_size"] = page_size
+        self.payload["limit"] = page_size
+
+    def __iter__(self):
+        for page in self.pages():
+            for row in page:
+                yield row
+
+    def pages(self):
+        """Yields the pages of the result one after another
+
+        :raises ValueError: If the keyset pagination is needed but the
+        results are not ordered by id
+        :return: Generator of pages
+        :rtype: generator
+        """
+        payload = dict(self.payload)
+        while True:
+            response = self.caller.retrieve(
+                endpoint=self.endpoint, payload=payload
+            )
+            if isinstance(response, dict) and "results" in response:
+                self.count = response.get("count", self.count)
+                yield response["results"]
+                if not response.get("next"):
+                    return
+                payload = next_page_payload(url=response["next"])
+                if self.parallel_pages and self.count is not None:
+                    payloads = self.__next_payloads(
+                        payload, first_page=response["results"]
+                    )
+                    if payloads is not None:
+                        for page in self.__prefetch(payloads):
+                            yield page
+                        return
+                continue
+
+            yield response
+            # Without pagination from the server, a response shorter or
+            # longer than the page size is the whole remaining result.
+            if len(response) != self.page_size:
+                return
+            payload = self.__keyset_payload(payload, last_row=response[-1])
+
+    def __next_payloads(self, payload, first_page):
+        """Builds the payloads of all the remaining pages from the payload of
+        the second page
+
+        :param payload: The payload of the second page
+        :type payload: dict
+        :param first_page: The results of the first page
+        :type first_page: list
+        :return: Generator of payloads, or None if the pagination of the
+        server can't be predicted
+        :rtype: generator
+        """
+        # The server can cap the size of a page
+        page_size = len(first_page) or self.page_size
+        if "page" in payload:
+            last_page = int(math.ceil(self.count / float(page_size)))
+            return (
+                dict(payload, page=page)
+                for page in range(int(payload["page"]), last_page + 1)
+            )
+        if "offset" in payload:
+            limit = int(payload.get("limit") or page_size)
+            return (
+                dict(payload, offset=offset)
+                for offset in range(int(payload["offset"]), self.count, limit)
+            )
+        return None
+
+    def __fetch_page(self, payload):
+        """Fetches a single page
+
+        :param payload: The payload of the page
+        :type payload: dict
+        :return: The rows of the page
+        :rtype: list
+        """
+        response = self.caller.retrieve(
+            endpoint=self.endpoint, payload=payload
+        )
+        if isinstance(response, dict):
+            return response.get("results", [])
+        return response
+
+    def __prefetch(self, payloads):
+        """Fetches the pages in a thread pool and yields them in order. At
+        most ``parallel_pages`` pages are pending at the same time.
+
+        :param payloads: The payloads of the pages
+        :type payloads: generator
+        :return: Generator of pages
+        :rtype: generator
+        """
+        fetch = self.__fetch_page
+        if self.limiter is not None:
+            fetch = functools.partial(self.limiter.call, fetch)
+        executor = ThreadPoolExecutor(max_workers=self.parallel_pages)
+        pending = collections.deque()
+        try:
+            for payload in itertools.islice(payloads, self.parallel_pages):
+                pending.append(submit(executor, fetch, payload))
+            while pending:
+                page = pending.popleft().result()
+                for payload in itertools.islice(payloads, 1):
+                    pending.append(submit(executor, fetch, payload))
+                yield page
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def __keyset_payload(self, payload, last_row):
+        """Builds the payload for the page after the given row
+
+        :param payload: The payload of the current page
+        :type payload: dict
+        :param last_row: The last row of the current page
+        :type last_row: dict
+        :raises ValueError: If the results are not ordered by id
+        :return: The payload of the next page
+        :rtype: dict
+        """
+        ordering = payload.get("ordering")
+        if ordering not in ("id", "-id"):
+            raise ValueError(
+                "The server doesn't paginate its responses, the results "
+                "must be ordered by id."
+            )
+        if "id" not in last_row:
+            raise ValueError(
+                "The server doesn't paginate its responses, the id field "
+                "is needed."
+            )
+        operator = constants.OPERATORS["<" if ordering == "-id" else ">"]
+        payload = dict(payload)
+        payload["id{operator}".format(operator=operator)] = last_row["id"]
+        return payload
+
+
+def next_page_payload(url):
+    """Extracts the payload from the ``next`` link given by the server
+
+    :param url: The url of the next page
+    :type url: str
+    :return: The payload
+    :rtype: dict
+    """
+    return dict(parse_qsl(urlparse(url).query, keep_blank_values=True))
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+#
+# - query -
+#
+# Compiled and reusable queries.
+#
+# Copyright (c) 2020 Prodex
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from ..utils import utils
+
+
+class Param(object):
+    """A named parameter in the value of a filter, bound when the query is
+    executed, see :meth:`Query.bind`."""
+
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return "Param({name!r})".format(name=self.name)
+
+    def __eq__(self, other):
+        return isinstance(other, Param) and other.name == self.name
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((Param, self.name))
+
+
+class Query(object):
+    """An immutable query on a model. Each method returns a new query, the
+    filters are validated and compiled when they are added, so executing the
+    same query again doesn't rebuild anything on the client.
+
+        >>> query = (
+        ...     prodex.query("Project")
+        ...     .where("id", "<=", 255)
+        ...     .only("id", "name")
+        ...     .order_by("-name")
+        ... )
+        >>> query.payload
+        {'id__lte': 255, 'fields': 'id,name', 'ordering': '-name'}
+        >>> projects = query.all()
+
+    Values can be parameters, bound when the query is executed:
+
+        >>> by_user = prodex.query("Timelog").where("user", "is", Param("user"))
+        >>> by_user.all(user=1)
+        >>> by_user.all(user=2)
+
+    Queries are hashable and equal when their payloads are equal.
+    """
+
+    __slots__ = (
+        "model",
+        "_prodex",
+        "_filters",
+        "_fields",
+        "_omit",
+        "_ordering",
+        "_compiled",
+        "_params",
+    )
+
+    def __init__(
+        self,
+        model,
+        prodex=None,
+        filters=(),
+        fields=(),
+        omit=(),
+        ordering=(),
+    ):
+        """Initializes the query
+
+        :param model: The model type looking for
+        :type model: str
+        :param prodex: The client executing the query, defaults to None
+        :type prodex: Prodex, optional
+        :param filters: The compiled filters, pairs of key and value,
+        defaults to ()
+        :type filters: tuple, optional
+        :param fields: The fields to include, defaults to ()
+        :type fields: tuple, optional
+        :param omit: The fields to omit, defaults to ()
+        :type omit: tuple, optional
+        :param ordering: The fields to order by, defaults to ()
+        :type ordering: tuple, optional
+        """
+        self.model = model
+        self._prodex = prodex
+        self._filters = tuple(filters)
+        self._fields = tuple(fields)
+        self._omit = tuple(omit)
+        self._ordering = tuple(ordering)
+
+        compiled = list(self._filters)
+        if self._fields:
+            compiled.append(("fields", ",".join(self._fields)))
+        if self._omit:
+            compiled.append(("omit", ",".join(self._omit)))
+        if self._ordering:
+            compiled.append(("ordering", ",".join(self._ordering)))
+        self._compiled = tuple(compiled)
+        self._params = frozenset(
+            value.name
+            for _, value in self._filters
+            if isinstance(value, Param)
+        )
+
+    def __repr__(self):
+        return "<Query {model} {payload}>".format(
+            model=self.model,
+            payload=" ".join(
+                "{key}={value!r}".format(key=key, value=value)
+                for key, value in self._compiled
+            ),
+        )
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, Query)
+            and other.model == self.model
+            and other._compiled == self._compiled
+        )
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.model, self._compiled))
+
+    def __iter__(self):
+        return self.iterate()
+
+    def _copy(self, **changes):
+        arguments = {
+            "model": self.model,
+            "prodex": self._prodex,
+            "filters": self._filters,
+            "fields": self._fields,
+            "omit": self._omit,
+            "ordering": self._ordering,
+        }
+        arguments.update(changes)
+        return Query(**arguments)
+
+    @property
+    def params(self):
+        """The names of the parameters not bound yet
+
+        :rtype: frozenset
+        """
+        return self._params
+
+    @property
+    def key(self):
+        """The compiled payload, as pairs of key and value
+
+        :rtype: tuple
+        """
+        return self._compiled
+
+    @property
+    def payload(self):
+        """The payload of the request
+
+        :raises ValueError: If parameters are not bound
+        :rtype: dict
+        """
+        if self._params:
+            raise ValueError(
+                "Parameters are not bound: {params}".format(
+                    params=", ".join(sorted(self._params))
+                )
+            )
+        return dict(self._compiled)
+
+    def where(self, field, operators, value):
+        """Returns the query with a new filter, like the filters of
+        :meth:`~prodex_api.Prodex.find`
+
+        :param field: The field to filter
+        :type field: str
+        :param operators: The operator or the list of operators
+        :type operators: str or list
+        :param value: The value, or a :class:`Param`
+        :type value: object
+        :raises ValueError: If an operator is not valid
+        :return: The new query
+        :rtype: Query
+        """
+        key = utils.create_filter_key(field=field, operators=operators)
+        if not isinstance(value, Param):
+            value = utils.create_filter_value(value=value)
+        filters = tuple(item for item in self._filters if item[0] != key)
+        return self._copy(filters=filters + ((key, value),))
+
+    def only(self, *fields):
+        """Returns the query including only the given fields
+
+        :return: The new query
+        :rtype: Query
+        """
+        return self._copy(fields=fields)
+
+    def omit(self, *fields):
+        """Returns the query omitting the given fields
+
+        :return: The new query
+        :rtype: Query
+        """
+        return self._copy(omit=fields)
+
+    def order_by(self, *fields):
+        """Returns the query ordered by the given fields, a field starting
+        with "-" is in descending order
+
+        :return: The new query
+        :rtype: Query
+        """
+        return self._copy(ordering=fields)
+
+    def bind(self, **params):
+        """Returns the query with the given parameters replaced by their
+        values
+
+        :raises ValueError: If a parameter is unknown
+        :return: The new query
+        :rtype: Query
+        """
+        unknown = set(params) - self._params
+        if unknown:
+            raise ValueError(
+                "Unknown parameters: {params}".format(
+                    params=", ".join(sorted(unknown))
+                )
+            )
+        filters = tuple(
+            (
+                (key, utils.create_filter_value(value=params[value.name]))
+                if isinstance(value, Param) and value.name in params
+                else (key, value)
+            )
+            for key, value in self._filters
+        )
+        return self._copy(filters=filters)
+
+    def all(self, **params):
+        """Executes the query, see :meth:`~prodex_api.Prodex.execute`
+
+        :return: The result of the request
+        :rtype: list
+        """
+        return self.__client().execute(self, **params)
+
+    def iterate(self, page_size=100, parallel_pages=0, **params):
+        """Executes the query page by page, see
+        :meth:`~prodex_api.Prodex.iterate`
+
+        :return: Generator of model objects
+        :rtype: generator
+        """
+        return self.__client().iterate(
+            self, page_size=page_size, parallel_pages=parallel_pages, **params
+        )
+
+    def __client(self):
+        if self._prodex is None:
+            raise ValueError(
+                "The query is not bound to a client, use Prodex.query."
+            )
+        return self._prodex
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+#
+# - relations -
+#
+# Expansion of the relations of results.
+#
+# Copyright (c) 2020 Prodex
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from collections.abc import Mapping
+
+from ..utils import constants
+
+_MODELS = dict(
+    (endpoint, model) for model, endpoint in constants.TRANSLATION.items()
+)
+
+
+def to_model(name):
+    """Returns the model of a model name or an endpoint
+
+    :param name: The name
+    :type name: str
+    :return: The model or None
+    :rtype: str
+    """
+    if not isinstance(name, str):
+        return None
+    if name in constants.TRANSLATION:
+        return name
+    return _MODELS.get(name)
+
+
+def schema_relation(info):
+    """Returns the related model of a field from its schema, if the schema
+    gives it (``related_model`` or ``model``, or in the ``child`` of a list)
+
+    :param info: The schema of the field
+    :type info: dict
+    :return: The model or None
+    :rtype: str
+    """
+    if not isinstance(info, Mapping):
+        return None
+    for key in ("related_model", "model"):
+        model = to_model(info.get(key))
+        if model:
+            return model
+    return schema_relation(info.get("child"))
+
+
+def reference_relation(rows, field):
+    """Returns the related model of a field from the ``model`` of the
+    references in the rows
+
+    :param rows: The rows
+    :type rows: list
+    :param field: The field
+    :type field: str
+    :return: The model or None
+    :rtype: str
+    """
+    for row in rows:
+        value = row.get(field)
+        for reference in value if isinstance(value, list) else [value]:
+            if isinstance(reference, Mapping):
+                model = to_model(reference.get("model"))
+                if model:
+                    return model
+    return None
+
+
+def reference_id(reference):
+    """Returns the id of a reference, an entity or an id
+
+    :param reference: The reference
+    :type reference: object
+    :return: The id
+    :rtype: int
+    """
+    if isinstance(reference, Mapping):
+        return reference.get("id")
+    return reference
+
+
+def collect_ids(rows, field):
+    """Returns the ids referenced by a field in the rows, without
+    duplicates
+
+    :param rows: The rows
+    :type rows: list
+    :param field: The field, a reference or a list of references
+    :type field: str
+    :return: The ids
+    :rtype: list
+    """
+    ids = {}
+    for row in rows:
+        value = row.get(field)
+        for reference in value if isinstance(value, list) else [value]:
+            model_id = reference_id(reference)
+            if model_id is not None:
+                ids[model_id] = None
+    return list(ids)
+
+
+def stitch(rows, objects):
+    """Returns copies of the rows where the references are replaced by the
+    objects. The references to objects that were not found are kept.
+
+    :param rows: The rows
+    :type rows: list
+    :param objects: The objects by id, by field
+    :type objects: dict
+    :return: The new rows
+    :rtype: list
+    """
+
+    def _replace(reference, by_id):
+        found = by_id.get(reference_id(reference))
+        return reference if found is None else found
+
+    result = []
+    for row in rows:
+        row = dict(row)
+        for field, by_id in objects.items():
+            value = row.get(field)
+            if isinstance(value, list):
+                row[field] = [_replace(item, by_id) for item in value]
+            elif value is not None:
+                row[field] = _replace(value, by_id)
+        result.append(row)
+    return result
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+#
+# - retry -
+#
+# Retry policy and rate limiting of the requests.
+#
+# Copyright (c) 2020 Prodex
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import email.utils
+import random
+import threading
+import time
+
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+RETRY_STATUS_CODES = frozenset([408, 429, 502, 503, 504])
+
+
+class RetryPolicy(object):
+    def __init__(
+        self,
+        total=3,
+        backoff_factor=0.5,
+        max_backoff=30.0,
+        jitter=True,
+        status_codes=RETRY_STATUS_CODES,
+        methods=IDEMPOTENT_METHODS,
+        respect_retry_after=True,
+        max_retry_after=120.0,
+    ):
+        """Describes when and how a failed request is sent again. The
+        requests are retried after a connection error, a timeout or a
+        response with one of the given status codes.
+
+        The delay before the retry ``n`` (from 0) is
+        ``backoff_factor * 2 ** n``, at most ``max_backoff``. With jitter,
+        the delay is a random duration between 0 and this value, so the
+        clients failing at the same time don't retry at the same time.
+        If the response has a ``Retry-After`` header, its delay is used
+        instead.
+
+            >>> prodex = Prodex(url, login, password, retry=RetryPolicy(total=5))
+
+        :param total: The maximum number of retries of a request,
+        defaults to 3
+        :type total: int, optional
+        :param backoff_factor: The delay in seconds of the first retry,
+        defaults to 0.5
+        :type backoff_factor: float, optional
+        :param max_backoff: The maximum delay in seconds, defaults to 30.0
+        :type max_backoff: float, optional
+        :param jitter: Randomize the delays, defaults to True
+        :type jitter: bool, optional
+        :param status_codes: The status codes to retry,
+        defaults to 408, 429, 502, 503 and 504
+        :type status_codes: iterable, optional
+        :param methods: The HTTP methods to retry, None for all of them.
+        By default only the idempotent methods are retried: GET, HEAD,
+        OPTIONS, PUT and DELETE
+        :type methods: iterable, optional
+        :param respect_retry_after: Wait for the delay of the
+        ``Retry-After`` header, defaults to True
+        :type respect_retry_after: bool, optional
+        :param max_retry_after: The maximum delay in seconds accepted from
+        a ``Retry-After`` header, a longer one is not retried,
+        defaults to 120.0
+        :type max_retry_after: float, optional
+        """
+        self.total = total
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.status_codes = frozenset(status_codes)
+        self.methods = None if methods is None else frozenset(methods)
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+
+    def is_retryable(self, method, attempt, response=None):
+        """Returns if a request can be sent again
+
+        :param method: The HTTP method
+        :type method: str
+        :param attempt: The number of retries already done
+        :type attempt: int
+        :param response: The response, None after a connection error,
+        defaults to None
+        :type response: requests.Response, optional
+        :rtype: bool
+        """
+        if attempt >= self.total:
+            return False
+        if self.methods is not None and method.upper() not in self.methods:
+            return False
+        if response is None:
+            return True
+        if response.status_code not in self.status_codes:
+            return False
+        retry_after = self.retry_after(response)
+        return retry_after is None or retry_after <= self.max_retry_after
+
+    def delay(self, attempt, response=None):
+        """Returns the delay in seconds before the next retry
+
+        :param attempt: The number of retries already done
+        :type attempt: int
+        :param response: The response, defaults to None
+        :type response: requests.Response, optional
+        :rtype: float
+        """
+        if response is not None:
+            retry_after = self.retry_after(response)
+            if retry_after is not None:
+                return retry_after
+        backoff = min(self.max_backoff, self.backoff_factor * 2**attempt)
+        if self.jitter:
+            return random.uniform(0, backoff)
+        return backoff
+
+    def retry_after(self, response):
+        """Returns the delay of the ``Retry-After`` header of the response,
+        in seconds or as a date
+
+        :param response: The response
+        :type response: requests.Response
+        :return: The delay in seconds or None
+        :rtype: float
+        """
+        if not self.respect_retry_after:
+            return None
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            date = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, date.timestamp() - time.time())
+
+
+class RateLimiter(object):
+    def __init__(self, rate, burst=None):
+        """A token bucket limiting the number of requests per second. It
+        can be shared by the threads of a client, or by many clients.
+
+            >>> prodex = Prodex(url, login, password, rate_limiter=RateLimiter(20))
+
+        :param rate: The number of requests per second
+        :type rate: float
+        :param burst: The number of requests which can be sent at once after
+        a pause, defaults to the rate (at least 1)
+        :type burst: float, optional
+        """
+        if rate <= 0:
+            raise ValueError("The rate must be greater than 0.")
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Takes a token, waiting until one is available. The tokens are
+        reserved in the order of the calls.
+
+        :return: The time waited in seconds
+        :rtype: float
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+#
+# - schema_cache -
+#
+# Persistent cache for the fields and the schemas of the models.
+#
+# Copyright (c) 2020 Prodex
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import copy
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+SCHEMA_CACHE_VERSION = 2
+
+
+class SchemaCache(object):
+    def __init__(self, directory=None, max_age=86400, background=True):
+        """Caches the fields and the schemas of the models in memory and on
+        disk, in one directory per server url and one file per entry. A new
+        client reads them from the disk instead of requesting the server,
+        and storing an entry only writes its own file.
+
+            >>> prodex = Prodex(url, login, password, schema_cache=SchemaCache())
+
+        An entry older than ``max_age`` is revalidated: in a background
+        thread while the stale entry is returned if ``background`` is True,
+        otherwise before returning.
+
+        :param directory: The directory of the cache files, defaults to
+        ``$PRODEX_API_CACHE_DIR`` or ``~/.cache/prodex_api``
+        :type directory: str, optional
+        :param max_age: The age in seconds after which an entry is
+        revalidated. None to never revalidate, defaults to 86400
+        :type max_age: float, optional
+        :param background: Revalidate the entries in background,
+        defaults to True
+        :type background: bool, optional
+        """
+        self.directory = directory or default_directory()
+        self.max_age = max_age
+        self.background = background
+
+        self._lock = threading.RLock()
+        self._entries = {}  # {url: {key: {"fetched_at": .., "value": ..}}}
+        self._refreshing = set()
+
+    def path(self, url):
+        """Returns the path of the cache directory of the given server
+
+        :param url: The url of the server
+        :type url: str
+        :return: The path of the directory
+        :rtype: str
+        """
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(
+            self.directory, "schemas-{digest}".format(digest=digest)
+        )
+
+    def entry_path(self, url, kind, model):
+        """Returns the path of the cache file of an entry
+
+        :param url: The url of the server
+        :type url: str
+        :param kind: The kind of value, "fields" or "schema"
+        :type kind: str
+        :param model: The model
+        :type model: str
+        :return: The path of the file
+        :rtype: str
+        """
+        return os.path.join(
+            self.path(url),
+            "{kind}-{model}.json".format(kind=kind, model=model),
+        )
+
+    def get(self, url, kind, model, fetch):
+        """Returns the cached value, fetched with ``fetch`` if it is missing.
+
+        :param url: The url of the server
+        :type url: str
+        :param kind: The kind of value, "fields" or "schema"
+        :type kind: str
+        :param model: The model
+        :type model: str
+        :param fetch: Callable which requests the value to the server
+        :type fetch: callable
+        :return: The value
+        :rtype: object
+        """
+        key = "{kind}:{model}".format(kind=kind, model=model)
+        with self._lock:
+            entries = self._entries.setdefault(url, {})
+            if key not in entries:
+                entries[key] = self.__load(url, kind, model)
+            entry = entries[key]
+        if entry is None:
+            return copy.deepcopy(self.set(url, kind, model, fetch()))
+
+        age = time.time() - entry["fetched_at"]
+        if self.max_age is not None and age > self.max_age:
+            if not self.background:
+                return copy.deepcopy(self.set(url, kind, model, fetch()))
+            self.__refresh(url, kind, model, fetch)
+        return copy.deepcopy(entry["value"])
+
+    def set(self, url, kind, model, value):
+        """Stores the value in memory and on disk
+
+        :param url: The url of the server
+        :type url: str
+        :param kind: The kind of value, "fields" or "schema"
+        :type kind: str
+        :param model: The model
+        :type model: str
+        :param value: The value
+        :type value: object
+        :return: The value
+        :rtype: object
+        """
+        key = "{kind}:{model}".format(kind=kind, model=model)
+        entry = {"fetched_at": time.time(), "value": value}
+        with self._lock:
+            self._entries.setdefault(url, {})[key] = entry
+            self.__save(url, kind, model, entry)
+        return value
+
+    def clear(self, url):
+        """Removes all entries of the given server, in memory and on disk
+
+        :param url: The url of the server
+        :type url: str
+        """
+        with self._lock:
+            self._entries[url] = {}
+            directory = self.path(url)
+            try:
+                for name in os.listdir(directory):
+                    os.remove(os.path.join(directory, name))
+                os.rmdir(directory)
+            except OSError:
+                pass
+
+    def __refresh(self, url, kind, model, fetch):
+        """Fetches the value again in a background thread
+
+        :param url: The url of the server
+        :type url: str
+        :param kind: The kind of value, "fields" or "schema"
+        :type kind: str
+        :param model: The model
+        :type model: str
+        :param fetch: Callable which requests the value to the server
+        :type fetch: callable
+        """
+        key = (url, kind, model)
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def _refresh():
+            try:
+                self.set(url, kind, model, fetch())
+            except Exception:
+                # The stale value is kept, it will be revalidated next time
+                pass
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        thread = threading.Thread(target=_refresh)
+        thread.daemon = True
+        thread.start()
+
+    def __load(self, url, kind, model):
+        """Reads an entry from the disk. A file with another version is
+        ignored.
+
+        :param url: The url of the server
+        :type url: str
+        :param kind: The kind of value, "fields" or "schema"
+        :type kind: str
+        :param model: The model
+        :type model: str
+        :return: The entry, None if it is not on the disk
+        :rtype: dict
+        """
+        try:
+            with open(self.entry_path(url, kind, model), "r") as f:
+                content = json.load(f)
+            if (
+                content.get("version") == SCHEMA_CACHE_VERSION
+                and content.get("url") == url
+            ):
+                return {
+                    "fetched_at": content["fetched_at"],
+                    "value": content["value"],
+                }
+        except (IOError, OSError, ValueError, AttributeError, KeyError):
+            pass
+        return None
+
+    def __save(self, url, kind, model, entry):
+        """Writes an entry on the disk. The file is replaced atomically, so
+        a concurrent process never reads a partial file.
+
+        :param url: The url of the server
+        :type url: str
+        :param kind: The kind of value, "fields" or "schema"
+        :type kind: str
+        :param model: The model
+        :type model: str
+        :param entry: The entry
+        :type entry: dict
+        """
+        content = {
+            "version": SCHEMA_CACHE_VERSION,
+            "url": url,
+            "fetched_at": entry["fetched_at"],
+            "value": entry["value"],
+        }
+        directory = self.path(url)
+        tmp_path = None
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(content, f)
+            os.replace(tmp_path, self.entry_path(url, kind, model))
+        except (IOError, OSError):
+            # The cache still works in memory
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def default_directory():
+    """Returns the default directory of the cache files
+
+    :return: The directory
+    :rtype: str
+    """
+    directory = os.environ.get("PRODEX_API_CACHE_DIR")
+    if directory:
+        return directory
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, "prodex_api")
@@ -0,0 +1,663 @@
+# -*- coding: utf-8 -*-
+#
+# - transports -
+#
+# The HTTP transports of the caller, with recording and replay.
+#
+# Copyright (c) 2020 Prodex
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import abc
+import base64
+import collections
+import contextlib
+import datetime
+import gzip
+import json
+import os
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3 import exceptions as urllib3_exceptions
+
+CASSETTE_VERSION = 1
+SECRET_FIELDS = frozenset(["password", "token"])
+SECRET_HEADERS = frozenset(["authorization", "cookie", "set-cookie"])
+# The body is stored decoded, so these headers don't describe it anymore
+STALE_HEADERS = frozenset(["content-encoding", "transfer-encoding"])
+REDACTED = "redacted"
+
+
+class ReplayError(LookupError):
+    """Raised when a request has no recorded response in the cassette"""
+
+    pass
+
+
+class Transport(abc.ABC):
+    """Sends the requests of a :class:`~prodex_api.libs.models.Model`.
+
+    A transport receives the arguments of :func:`requests.request` used by
+    the caller (``params``, ``data``, ``json``, ``files``, ``headers`` and
+    ``stream``) and returns an object with the interface of
+    :class:`requests.Response` used by the caller: ``status_code``,
+    ``reason``, ``headers``, ``url``, ``elapsed``, ``encoding``,
+    ``request.body``, ``content``, ``text``, ``json()``,
+    ``iter_content()`` and ``close()``.
+
+    Connection errors and timeouts are raised as
+    :class:`requests.ConnectionError` and :class:`requests.Timeout`, so the
+    caller can retry them.
+    """
+
+    @abc.abstractmethod
+    def request(self, method, url, timeout=None, **kwargs):
+        """Sends a request
+
+        :param method: The HTTP method
+        :type method: str
+        :param url: The full url of the request
+        :type url: str
+        :param timeout: The connect and read timeouts in seconds,
+        defaults to None
+        :type timeout: tuple, optional
+        :return: The response
+        :rtype: requests.Response
+        """
+
+    def close(self):
+        """Releases the resources of the transport"""
+        pass
+
+
+class RequestsTransport(Transport):
+    def __init__(self, pool_connections=10, pool_maxsize=10, keep_alive=True):
+        """Sends the requests through a persistent :class:`requests.Session`.
+        All requests share the same connection pool, so the TCP and TLS
+        handshakes are only done once per connection.
+
+        :param pool_connections: The number of connection pools to cache
+        (one pool per host), defaults to 10
+        :type pool_connections: int, optional
+        :param pool_maxsize: The maximum number of connections to keep alive
+        per host, defaults to 10
+        :type pool_maxsize: int, optional
+        :param keep_alive: Keep connections open between requests,
+        defaults to True
+        :type keep_alive: bool, optional
+        """
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
+
+    def request(self, method, url, timeout=None, **kwargs):
+        return self.session.request(method, url, timeout=timeout, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class Urllib3Response(object):
+    """The response of an :class:`Urllib3Transport`, with the part of the
+    interface of :class:`requests.Response` used by the caller"""
+
+    __slots__ = (
+        "status_code",
+        "reason",
+        "headers",
+        "url",
+        "elapsed",
+        "request",
+        "_raw",
+        "_content",
+    )
+
+    def __init__(self, raw, url, elapsed, request, content=None):
+        self.status_code = raw.status
+        self.reason = raw.reason
+        self.headers = raw.headers
+        self.url = url
+        self.elapsed = elapsed
+        self.request = request
+        self._raw = raw
+        self._content = content
+
+    def __repr__(self):
+        return "<Urllib3Response [{status}]>".format(status=self.status_code)
+
+    @property
+    def encoding(self):
+        return get_encoding_from_headers(self.headers)
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = b"".join(self.iter_content(65536))
+        return self._content
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or "utf-8", "replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size=1):
+        """Yields the body by chunks, read from the connection if the
+        response is streamed
+
+        :param chunk_size: The number of bytes of a chunk, defaults to 1
+        :type chunk_size: int, optional
+        :return: Generator of bytes
+        :rtype: generator
+        """
+        if self._content is not None:
+            for start in range(0, len(self._content), chunk_size):
+                yield self._content[start : start + chunk_size]
+            return
+        chunks = []
+        with translate_errors():
+            for chunk in self._raw.stream(chunk_size, decode_content=True):
+                chunks.append(chunk)
+                yield chunk
+        self._content = b"".join(chunks)
+
+    def close(self):
+        if self._content is None:
+            self._raw.close()
+        self._raw.release_conn()
+
+
+class SentRequest(object):
+    """The request of an :class:`Urllib3Response`"""
+
+    __slots__ = ("method", "url", "body")
+
+    def __init__(self, method, url, body):
+        self.method = method
+        self.url = url
+        self.body = body
+
+
+class Urllib3Transport(Transport):
+    def __init__(self, pool_connections=10, pool_maxsize=10, keep_alive=True):
+        """Sends the requests directly through a :class:`urllib3.PoolManager`.
+        It skips the work of a :class:`requests.Session` which the caller
+        doesn't need (hooks, cookies, environment settings, redirections,
+        prepared requests), so each request costs less CPU.
+
+        The redirections are not followed, and the responses are
+        :class:`Urllib3Response` objects. Connection errors and timeouts are
+        raised as the exceptions of ``requests``, like with a
+        :class:`RequestsTransport`.
+
+        :param pool_connections: The number of connection pools to cache
+        (one pool per host), defaults to 10
+        :type pool_connections: int, optional
+        :param pool_maxsize: The maximum number of connections to keep alive
+        per host, defaults to 10
+        :type pool_maxsize: int, optional
+        :param keep_alive: Keep connections open between requests,
+        defaults to True
+        :type keep_alive: bool, optional
+        """
+        self.pool = urllib3.PoolManager(
+            num_pools=pool_connections, maxsize=pool_maxsize, retries=False
+        )
+        self.headers = {
+            "User-Agent": "prodex-api",
+            "Accept": "*/*",
+            "Accept-Encoding": "gzip, deflate",
+        }
+        if not keep_alive:
+            self.headers["Connection"] = "close"
+
+    def request(
+        self,
+        method,
+        url,
+        timeout=None,
+        params=None,
+        data=None,
+        json=None,
+        files=None,
+        headers=None,
+        stream=False,
+    ):
+        if params:
+            query = urlencode(form_items(params))
+            if query:
+                url = "{url}{separator}{query}".format(
+                    url=url, separator="&" if "?" in url else "?", query=query
+                )
+        request_headers = dict(self.headers)
+        if headers:
+            request_headers.update(headers)
+        body, content_type = encode_request_body(data, json, files)
+        if content_type:
+            request_headers["Content-Type"] = content_type
+        if timeout is not None:
+            timeout = urllib3.Timeout(connect=timeout[0], read=timeout[1])
+
+        start = time.perf_counter()
+        with translate_errors():
+            raw = self.pool.urlopen(
+                method,
+                url,
+                body=body,
+                headers=request_headers,
+                timeout=timeout,
+                redirect=False,
+                preload_content=False,
+            )
+            elapsed = datetime.timedelta(seconds=time.perf_counter() - start)
+            content = None if stream else raw.data
+        return Urllib3Response(
+            raw,
+            url,
+            elapsed,
+            SentRequest(method, url, body),
+            content=content,
+        )
+
+    def close(self):
+        self.pool.clear()
+
+
+class RecordingTransport(Transport):
+    def __init__(self, path, transport=None):
+        """Sends the requests through another transport and writes each
+        request and its response to a cassette: a gzipped file with one JSON
+        object per line. The cassette can be served back by a
+        :class:`ReplayTransport`.
+
+            >>> transport = RecordingTransport("workload.jsonl.gz")
+            >>> with Prodex(url, login, password, transport=transport) as p:
+            ...     p.find("Project")
+
+        The passwords, the tokens, the ``Authorization`` and the cookie
+        headers are not written. Requests failing without a response, like
+        connection errors, are not recorded.
+
+        :param path: The path of the cassette, overwritten if it exists
+        :type path: str
+        :param transport: The transport sending the requests, defaults to a
+        :class:`RequestsTransport`
+        :type transport: Transport, optional
+        """
+        self.path = path
+        self.transport = transport or RequestsTransport()
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+        self.__write({"version": CASSETTE_VERSION})
+
+    def request(self, method, url, timeout=None, **kwargs):
+        start = time.perf_counter()
+        response = self.transport.request(
+            method, url, timeout=timeout, **kwargs
+        )
+        # Streamed bodies are read now, iter_content() then reuses them
+        content = response.content
+        duration = time.perf_counter() - start
+        content = redact_content(content)
+        body, encoding = encode_body(content)
+        headers = dict(
+            (key, value)
+            for key, value in response.headers.items()
+            if key.lower() not in SECRET_HEADERS | STALE_HEADERS
+        )
+        headers["Content-Length"] = str(len(content))
+        self.__write(
+            {
+                "method": method,
+                "url": url,
+                "params": params_items(url, kwargs.get("params")),
+                "request": request_body(kwargs),
+                "status": response.status_code,
+                "reason": response.reason,
+                "headers": headers,
+                "body": body,
+                "encoding": encoding,
+                "elapsed": response.elapsed.total_seconds(),
+                "duration": duration,
+            }
+        )
+        return response
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+        self.transport.close()
+
+    def __write(self, entry):
+        line = json.dumps(entry, separators=(",", ":"), sort_keys=True)
+        with self._lock:
+            self._file.write(line)
+            self._file.write("\n")
+
+
+class ReplayTransport(Transport):
+    def __init__(self, path, latency=0.0, loop=False):
+        """Answers the requests with the responses of a cassette written by
+        a :class:`RecordingTransport`, without network. A request is matched
+        by its method, the path of its url and its parameters; identical
+        requests get the recorded responses in the recorded order.
+
+            >>> transport = ReplayTransport("workload.jsonl.gz", latency=1.0)
+            >>> with Prodex(url, login, password, transport=transport) as p:
+            ...     p.find("Project")
+
+        :param path: The path of the cassette
+        :type path: str
+        :param latency: The factor applied to the recorded latencies: 0 to
+        answer at once, 1.0 to wait as long as the server did,
+        defaults to 0.0
+        :type latency: float, optional
+        :param loop: Start again from the first response of a request when
+        all its responses have been used, otherwise a :class:`ReplayError`
+        is raised, defaults to False
+        :type loop: bool, optional
+        """
+        self.path = path
+        self.latency = latency
+        self.loop = loop
+        self._lock = threading.Lock()
+        self._entries = collections.defaultdict(list)
+        self._positions = collections.Counter()
+        with gzip.open(path, "rt", encoding="utf-8") as cassette:
+            header = json.loads(cassette.readline() or "{}")
+            if header.get("version") != CASSETTE_VERSION:
+                raise ValueError(
+                    "Unsupported cassette version: {version}".format(
+                        version=header.get("version")
+                    )
+                )
+            for line in cassette:
+                entry = json.loads(line)
+                key = request_key(
+                    entry["method"], entry["url"], entry["params"]
+                )
+                self._entries[key].append(entry)
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._entries.values())
+
+    def request(self, method, url, timeout=None, **kwargs):
+        key = request_key(method, url, params_items(url, kwargs.get("params")))
+        with self._lock:
+            entries = self._entries.get(key)
+            position = self._positions[key]
+            if entries and position >= len(entries) and self.loop:
+                position = 0
+            if not entries or position >= len(entries):
+                raise ReplayError(
+                    "No recorded response for {method} {url}".format(
+                        method=method, url=url
+                    )
+                )
+            self._positions[key] = position + 1
+        entry = entries[position]
+        if self.latency:
+            time.sleep(entry["elapsed"] * self.latency)
+        return build_response(entry, url)
+
+    def rewind(self):
+        """Serves the responses again from the start of the cassette"""
+        with self._lock:
+            self._positions.clear()
+
+
+def params_items(url, params):
+    """Returns the parameters of a request, from its url and its
+    ``params``, as a sorted list of (key, value) strings
+
+    :param url: The url of the request
+    :type url: str
+    :param params: The parameters of the request
+    :type params: dict
+    :return: The parameters
+    :rtype: list
+    """
+    items = parse_qsl(urlsplit(url).query, keep_blank_values=True)
+    for key, value in (params or {}).items():
+        if value is None:
+            continue
+        values = value if isinstance(value, (list, tuple)) else [value]
+        items.extend((key, str(item)) for item in values)
+    return sorted([key, value] for key, value in items)
+
+
+def request_key(method, url, params):
+    """Builds the key matching a request to its recorded responses. The host
+    is ignored, so a cassette can be replayed against any url.
+
+    :param method: The HTTP method
+    :type method: str
+    :param url: The url of the request
+    :type url: str
+    :param params: The parameters, see :func:`params_items`
+    :type params: list
+    :return: The key
+    :rtype: tuple
+    """
+    return (
+        method.upper(),
+        urlsplit(url).path,
+        tuple(tuple(item) for item in params),
+    )
+
+
+def request_body(kwargs):
+    """Describes the body of a request for the cassette, without the
+    secrets and the content of the files
+
+    :param kwargs: The arguments of the request
+    :type kwargs: dict
+    :return: The body
+    :rtype: dict
+    """
+    body = {}
+    for name in ("data", "json"):
+        value = kwargs.get(name)
+        if isinstance(value, dict):
+            value = redact(value)
+        if value is not None:
+            body[name] = value
+    if kwargs.get("files"):
+        body["files"] = sorted(kwargs["files"])
+    return body
+
+
+def redact(data):
+    """Replaces the values of the secret fields of a dictionary
+
+    :param data: The data
+    :type data: dict
+    :return: A copy of the data without secrets
+    :rtype: dict
+    """
+    return dict(
+        (key, REDACTED if key in SECRET_FIELDS else value)
+        for key, value in data.items()
+    )
+
+
+def redact_content(content):
+    """Replaces the secret fields of a JSON object body, like the token of
+    the authentication
+
+    :param content: The body
+    :type content: bytes
+    :return: The body without secrets
+    :rtype: bytes
+    """
+    if not content.startswith(b"{") or not any(
+        '"{name}"'.format(name=name).encode("ascii") in content
+        for name in SECRET_FIELDS
+    ):
+        return content
+    try:
+        data = json.loads(content.decode("utf-8"))
+    except ValueError:
+        return content
+    return json.dumps(redact(data)).encode("utf-8")
+
+
+def encode_body(content):
+    """Encodes a body for the cassette, as text if possible
+
+    :param content: The body
+    :type content: bytes
+    :return: The encoded body and its encoding, "utf-8" or "base64"
+    :rtype: tuple
+    """
+    try:
+        return content.decode("utf-8"), "utf-8"
+    except UnicodeDecodeError:
+        return base64.b64encode(content).decode("ascii"), "base64"
+
+
+def build_response(entry, url):
+    """Builds the response of a recorded request
+
+    :param entry: The recorded request
+    :type entry: dict
+    :param url: The url of the request
+    :type url: str
+    :return: The response
+    :rtype: requests.Response
+    """
+    if entry["encoding"] == "base64":
+        content = base64.b64decode(entry["body"])
+    else:
+        content = entry["body"].encode("utf-8")
+    response = requests.Response()
+    response.status_code = entry["status"]
+    response.reason = entry.get("reason")
+    response.headers = CaseInsensitiveDict(entry["headers"])
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.url = url
+    response.elapsed = datetime.timedelta(seconds=entry["elapsed"])
+    response._content = content
+    response._content_consumed = True
+    return response
+
+
+@contextlib.contextmanager
+def translate_errors():
+    """Raises the errors of urllib3 as the exceptions of requests, which
+    are handled by the caller"""
+    try:
+        yield
+    except urllib3_exceptions.NewConnectionError as error:
+        raise requests.ConnectionError(error)
+    except urllib3_exceptions.ConnectTimeoutError as error:
+        raise requests.ConnectTimeout(error)
+    except urllib3_exceptions.ReadTimeoutError as error:
+        raise requests.ReadTimeout(error)
+    except urllib3_exceptions.SSLError as error:
+        raise requests.exceptions.SSLError(error)
+    except urllib3_exceptions.HTTPError as error:
+        raise requests.ConnectionError(error)
+
+
+def form_items(data):
+    """Returns the (key, value) pairs of form data or of query parameters,
+    like requests does: a list gives one pair per value and the None values
+    are skipped
+
+    :param data: The data
+    :type data: dict
+    :return: The pairs
+    :rtype: list
+    """
+    items = []
+    for key, value in data.items():
+        if isinstance(value, (str, bytes)) or not hasattr(value, "__iter__"):
+            value = [value]
+        items.extend((key, item) for item in value if item is not None)
+    return items
+
+
+def encode_request_body(data=None, json_data=None, files=None):
+    """Encodes the body of a request like requests does: multipart if there
+    are files, form data for a dictionary, or JSON
+
+    :param data: The fields of the form, defaults to None
+    :type data: dict, optional
+    :param json_data: The JSON body, defaults to None
+    :type json_data: object, optional
+    :param files: The files by field, defaults to None
+    :type files: dict, optional
+    :return: The body and its content type
+    :rtype: tuple
+    """
+    if files:
+        fields = [(key, str(value)) for key, value in form_items(data or {})]
+        for key, value in files.items():
+            if isinstance(value, (list, tuple)):
+                filename, value = value[0], value[1]
+            else:
+                filename = os.path.basename(getattr(value, "name", key))
+            if hasattr(value, "read"):
+                value = value.read()
+            fields.append((key, (filename, value)))
+        return urllib3.encode_multipart_formdata(fields)
+    if data:
+        if isinstance(data, (str, bytes)):
+            return data, None
+        return urlencode(form_items(data)), "application/x-www-form-urlencoded"
+    if json_data is not None:
+        body = json.dumps(json_data, allow_nan=False).encode("utf-8")
+        return body, "application/json"
+    return None, None
+
+
+TRANSPORTS = {"requests": RequestsTransport, "urllib3": Urllib3Transport}
+
+
+def create_transport(name, **options):
+    """Creates a transport from its name, see :data:`TRANSPORTS`
+
+    :param name: "requests" or "urllib3"
+    :type name: str
+    :raises ValueError: If the name is unknown
+    :return: The transport
+    :rtype: Transport
+    """
+    if name not in TRANSPORTS:
+        raise ValueError(
+            "Unknown transport: {name}, expected one of {names}".format(
+                name=name, names=", ".join(sorted(TRANSPORTS))
+            )
+        )
+    return TRANSPORTS[name](**options)
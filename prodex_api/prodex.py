@@ -24,34 +24,196 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import copy
 import os
 
 from .utils import constants, utils
 from .utils.decorators import model_check
-from .libs.models import Model
+from .libs import aggregation, relations
+from .libs.bulk import BulkResult, chunks, run_bulk
+from .libs.columnar import ColumnBuilder
+from .libs.identity_map import IdentityMap, to_plain
+from .libs.deadline import deadline
+from .libs.models import (
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_TIMEOUT,
+    BadRequest,
+    Model,
+)
+from .libs.loader import Batch, Loader
+from .libs.pagination import Paginator
+from .libs.query import Query
+
+# The error of a server which doesn't accept a list of objects
+LIST_REFUSED = "Expected a dictionary, but got list"
 
 
 class Prodex(object):
-    def __init__(self, url, login, password, datetime_convert=False):
+    def __init__(
+        self,
+        url,
+        login,
+        password,
+        datetime_convert=False,
+        pool_connections=10,
+        pool_maxsize=10,
+        keep_alive=True,
+        conditional_requests=False,
+        cache=None,
+        schema_cache=None,
+        identity_map=False,
+        coalesce_requests=False,
+        loader_window=0.0,
+        retry=None,
+        rate_limiter=None,
+        limiter=None,
+        timeout=DEFAULT_TIMEOUT,
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+        metrics=None,
+        transport="requests",
+    ):
         """Initializes a new instance of the Prodexp client.
 
+        The client keeps a pool of persistent connections to the server.
+        Call :meth:`~prodex_api.Prodex.close` when the client is no longer
+        needed or use it as a context manager.
+
+            >>> with Prodex(url=url, login=login, password=password) as prodex:
+            ...     projects = prodex.find("Project")
+
         :param url: The URL for the the api of prodexp
         :type url: str
         :param login: The login to initialize the connection, defaults to None
         :type login: str, optional
         :param password: The password to initialize the connection, defaults to None
         :type password: str, optional
+        :param pool_connections: The number of connection pools to cache,
+        defaults to 10
+        :type pool_connections: int, optional
+        :param pool_maxsize: The maximum number of connections kept alive per
+        host, defaults to 10
+        :type pool_maxsize: int, optional
+        :param keep_alive: Reuse connections between requests, defaults to True
+        :type keep_alive: bool, optional
+        :param conditional_requests: Send the ETag and Last-Modified of the
+        previous identical request, so an unchanged result is not downloaded
+        again, defaults to False
+        :type conditional_requests: bool, optional
+        :param cache: Cache for the results of
+        :meth:`~prodex_api.Prodex.find`. The results of a model are
+        invalidated when an object of this model is modified through the
+        client, defaults to None
+        :type cache: prodex_api.ResultCache, optional
+        :param schema_cache: Cache for the results of
+        :meth:`~prodex_api.Prodex.get_fields` and
+        :meth:`~prodex_api.Prodex.get_schema_fields`, defaults to None
+        :type schema_cache: prodex_api.SchemaCache, optional
+        :param identity_map: Return each entity as a single read-only
+        :class:`~prodex_api.libs.identity_map.Record`, shared by all the
+        results where it appears. A record holds all the known fields of
+        the entity, which can be more than the requested fields,
+        defaults to False
+        :type identity_map: bool, optional
+        :param coalesce_requests: Send only once the identical reads running
+        at the same time in different threads, the others share its
+        response. With a cache, a burst of reads on an expired result is a
+        single request, defaults to False
+        :type coalesce_requests: bool, optional
+        :param loader_window: The time in seconds that
+        :meth:`~prodex_api.Prodex.get` waits for the calls of other threads,
+        to fetch them in the same request, defaults to 0.0
+        :type loader_window: float, optional
+        :param retry: The policy to send again the requests failing because
+        of a connection error or a temporary error of the server, like a
+        ``503 Service Unavailable``. By default only the idempotent methods
+        are retried, defaults to None
+        :type retry: prodex_api.RetryPolicy, optional
+        :param rate_limiter: Limits the number of requests per second of the
+        client, whatever the number of threads, defaults to None
+        :type rate_limiter: prodex_api.RateLimiter, optional
+        :param limiter: Adapts the number of concurrent requests of the
+        parallel operations (bulk operations, pages fetched ahead, batched
+        loads and thumbnail uploads) to the load of the server. Their
+        ``concurrency`` is then the maximum number of threads of each
+        operation. The limit is shared by all the operations, the usual
+        latency is kept by operation and model, defaults to None
+        :type limiter: prodex_api.AdaptiveLimiter, optional
+        :param timeout: The maximum time in milliseconds to wait for the
+        server to send data, None to wait forever, defaults to 120000
+        :type timeout: int, optional
+        :param connect_timeout: The maximum time in milliseconds to connect
+        to the server, None to wait forever, defaults to 10000
+        :type connect_timeout: int, optional
+        :param metrics: Registry recording the metrics of all the requests of
+        the client, see :meth:`~prodex_api.Prodex.add_hook` for other
+        instrumentations, defaults to None
+        :type metrics: prodex_api.MetricsRegistry, optional
+        :param transport: Sends the requests: "requests" for a
+        ``requests`` session, "urllib3" for a leaner backend built directly
+        on a urllib3 connection pool, or a transport, for example a
+        :class:`~prodex_api.RecordingTransport` capturing the traffic or a
+        :class:`~prodex_api.ReplayTransport` serving it back without network,
+        defaults to "requests"
+        :type transport: str or prodex_api.libs.transports.Transport,
+        optional
         """
         self.token = None
         self.authenticated_user = None
         self.headers = None
+        self.cache = cache
+        self.schema_cache = schema_cache
+        self.identity_map = IdentityMap() if identity_map else None
+        self._bulk_support = {}
+        self.limiter = limiter
+        self._schema_infos = {}
+        self.metrics = metrics
+        self.loader = Loader(
+            fetch=self.__fetch_ids,
+            window=loader_window,
+            limiter=self.__limiter("load"),
+        )
 
         self._datetime_convert = datetime_convert
 
         self.url = utils.build_url_base(url=url)
-        self.caller = Model(url=self.url)
+        self.caller = Model(
+            url=self.url,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            keep_alive=keep_alive,
+            conditional_requests=conditional_requests,
+            coalesce_requests=coalesce_requests,
+            retry=retry,
+            rate_limiter=rate_limiter,
+            timeout=timeout,
+            connect_timeout=connect_timeout,
+            transport=transport,
+        )
+        if metrics is not None:
+            self.caller.add_hook("request_end", metrics.record)
         self.__connect(login, password)
 
+    def __limiter(self, operation, model=None):
+        """Returns the adaptive limiter of the client for an operation on a
+        model, which shares the limit with the other operations
+
+        :param operation: The name of the operation
+        :type operation: str
+        :param model: The model, defaults to None
+        :type model: str, optional
+        :return: The limiter, None without limiter
+        :rtype: prodex_api.libs.concurrency.LimiterOperation
+        """
+        if self.limiter is None:
+            return None
+        return self.limiter.operation((operation, model))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def __connect(self, login, password):
         """Try to connect to prodex with the given credentials.
         If the connection is done, the token's user
@@ -69,15 +231,104 @@ class Prodex(object):
         if not self.token:
             raise ValueError("Token doesn't exists !")
 
+    def __invalidate(self, model):
+        """Invalidates the cached results of the given model
+
+        :param model: The modified model
+        :type model: str
+        """
+        if self.cache is not None:
+            self.cache.invalidate(model=model)
+
+    def __intern(self, model, data):
+        """Replaces the entities of the data by their record in the identity
+        map of the client, if it has one.
+
+        :param model: The model of the data
+        :type model: str
+        :param data: The data returned by the API
+        :type data: object
+        :return: The data
+        :rtype: object
+        """
+        if self.identity_map is None:
+            return data
+        return self.identity_map.intern(data, model=model)
+
+    def __intern_rows(self, model, rows):
+        """Interns the rows one at a time, see :meth:`__intern`
+
+        :param model: The model of the rows
+        :type model: str
+        :param rows: The rows
+        :type rows: iterable
+        :return: Generator of rows
+        :rtype: generator
+        """
+        for row in rows:
+            yield self.__intern(model=model, data=row)
+
+    def close(self):
+        """Close all the connections opened by the client.
+
+        >>> prodex.close()
+        """
+        self.caller.close()
+
     def set_timeout(self, timeout):
-        """Sets the timeout for all request. By default the timeout is set to
-        None.
+        """Sets the timeout for all request: the maximum time to wait for the
+        server to send data. By default the timeout is set to 120000.
+        See :meth:`~prodex_api.Prodex.deadline` to limit the total time of
+        an operation.
 
-        :param timeout: The timeout in milliseconds
+        :param timeout: The timeout in milliseconds, None to wait forever
         :type timeout: int
         """
         self.caller.timeout = timeout
 
+    def add_hook(self, name, func):
+        """Adds a function called at each request: ``request_start`` before
+        it is sent and ``request_end`` when it is done or failed. The function
+        receives a :class:`~prodex_api.libs.metrics.RequestEvent` with the
+        endpoint, the method, the status, the sizes and the timings.
+
+            >>> def log_slow(event):
+            ...     if event.total > 1:
+            ...         logger.warning("Slow request: %s %s", event.method, event.url)
+            >>> prodex.add_hook("request_end", log_slow)
+
+        :param name: "request_start" or "request_end"
+        :type name: str
+        :param func: The function
+        :type func: callable
+        :raises ValueError: If the name is unknown
+        """
+        self.caller.add_hook(name, func)
+
+    def remove_hook(self, name, func):
+        """Removes a function added with :meth:`~prodex_api.Prodex.add_hook`
+
+        :param name: "request_start" or "request_end"
+        :type name: str
+        :param func: The function
+        :type func: callable
+        """
+        self.caller.remove_hook(name, func)
+
+    def deadline(self, seconds):
+        """Returns a context manager giving a time budget to all the requests
+        sent inside it, see :func:`~prodex_api.libs.deadline.deadline`.
+
+            >>> with prodex.deadline(5):
+            ...     results = prodex.delete_many("Project", ids)
+
+        :param seconds: The budget in seconds
+        :type seconds: float
+        :return: The context manager
+        :rtype: contextlib.AbstractContextManager
+        """
+        return deadline(seconds)
+
     def get_session_token(self):
         """Gets the session token associated with the current session.
 
@@ -103,7 +354,15 @@ class Prodex(object):
         return self.authenticated_user
 
     @model_check
-    def find(self, model, filters=None, fields=None, omit=None, order=None):
+    def find(
+        self,
+        model,
+        filters=None,
+        fields=None,
+        omit=None,
+        order=None,
+        expand=None,
+    ):
         """Find models objects matching to the given filters.
 
             >>> # Find projects assigned to an user
@@ -152,6 +411,21 @@ class Prodex(object):
             >>> projects = prodex.find(model="Project", filters=filters, fields=fields)
             [{'id': 252, 'name': 'Treeflex'}]
 
+        The references to other objects can be replaced by the objects with
+        ``expand``. The objects of each related model are fetched with a
+        single request by chunk of ids, and the related models are fetched
+        at the same time. The schema giving the related models is requested
+        once per model (see :meth:`~prodex_api.Prodex.refresh_schemas`).
+
+            >>> projects = prodex.find("Project", expand=["customer", "users_assign"])
+            >>> projects[0]["customer"]
+            {'id': 4, 'name': 'Prodex', ...}
+
+        .. note::
+            If the client has a cache, the result is read from the cache
+            when possible. To fetch the pages of a paginated result in
+            parallel, see :meth:`~prodex_api.Prodex.iter_find`.
+
         :param model: The model type looking for
         :type model: str
         :param filters: Filters for the request. Should be a list of list,
@@ -164,21 +438,498 @@ class Prodex(object):
         :type omit: list, optional
         :param order: Order for the result, defaults to None
         :type order: dict, optional
+        :param expand: The fields of references to replace by the
+        referenced objects, defaults to None
+        :type expand: list, optional
+        :raises ValueError: If the model of an expanded field is unknown
         :return: The result of the request
         :rtype: list
         """
-        payload = {}
-        payload.update(utils.create_filters_payload(filters=filters))
-        payload.update(
-            utils.create_fields_payload(action="fields", fields=fields)
+        payload = utils.create_find_payload(
+            filters=filters, fields=fields, omit=omit, order=order
         )
-        payload.update(utils.create_fields_payload(action="omit", fields=omit))
-        payload.update(utils.create_ordering_payload(order=order))
+        return self.__find(model=model, payload=payload, expand=expand)
 
-        response = self.caller.retrieve(
-            endpoint=constants.TRANSLATION.get(model), payload=payload
+    def __find(self, model, payload, expand=None):
+        if self.cache is None:
+            response = self.caller.retrieve(
+                endpoint=constants.TRANSLATION.get(model), payload=payload
+            )
+        else:
+            found, response = self.cache.get(model=model, payload=payload)
+            if not found:
+                generation = self.cache.generation(model=model)
+                response = self.caller.retrieve(
+                    endpoint=constants.TRANSLATION.get(model), payload=payload
+                )
+                self.cache.set(
+                    model=model,
+                    payload=payload,
+                    result=response,
+                    generation=generation,
+                )
+        if expand:
+            response = self.__expand(model=model, data=response, fields=expand)
+        return self.__intern(model=model, data=response)
+
+    def __expand(self, model, data, fields):
+        """Replaces the references of the given fields by the referenced
+        objects, see :meth:`~prodex_api.Prodex.find`
+
+        :param model: The model of the data
+        :type model: str
+        :param data: The result of a find
+        :type data: list or dict
+        :param fields: The fields to expand
+        :type fields: list
+        :raises ValueError: If the model of a field is unknown
+        :return: The data with the objects
+        :rtype: list or dict
+        """
+        paginated = isinstance(data, dict)
+        rows = data.get("results", []) if paginated else data
+        if not rows:
+            return data
+
+        infos = self._schema_infos.get(model)
+        if infos is None:
+            # The schema is requested once per model and client
+            schema = self.get_schema_fields(model) or {}
+            actions = schema.get("actions") or {}
+            infos = actions.get("POST") or actions.get("PUT") or {}
+            self._schema_infos[model] = infos
+        with self.batch() as batch:
+            futures = {}
+            for field in fields:
+                related = relations.schema_relation(infos.get(field))
+                related = related or relations.reference_relation(rows, field)
+                if related is None:
+                    raise ValueError(
+                        "The model of {field} is unknown.".format(field=field)
+                    )
+                ids = relations.collect_ids(rows, field)
+                futures[field] = (ids, batch.get_many(related, ids))
+        objects = {}
+        for field, (ids, field_futures) in futures.items():
+            objects[field] = dict(
+                (model_id, future.result())
+                for model_id, future in zip(ids, field_futures)
+            )
+        rows = relations.stitch(rows, objects)
+        if paginated:
+            return dict(data, results=rows)
+        return rows
+
+    def __fetch_ids(self, model, model_ids, fields):
+        # One more than the ids, so a server without pagination is not asked
+        # for a next page
+        return list(
+            self.iter_find(
+                model,
+                filters=[["id", "in", model_ids]],
+                fields=fields,
+                page_size=len(model_ids) + 1,
+            )
+        )
+
+    @model_check
+    def get(self, model, model_id, fields=None):
+        """Returns an object by id. The calls made at the same time from
+        other threads are fetched with the same request, using the
+        ``in`` operator (see ``loader_window``).
+
+            >>> prodex.get("User", 3)
+            {'id': 3, 'username': 'jdoe', ...}
+
+        :param model: The model type looking for
+        :type model: str
+        :param model_id: The id of the object
+        :type model_id: int
+        :param fields: List of fields to include, defaults to None
+        :type fields: list, optional
+        :return: The object, None if it doesn't exist
+        :rtype: dict
+        """
+        return self.loader.get_many(model, [model_id], fields=fields)[0]
+
+    @model_check
+    def get_many(self, model, model_ids, fields=None):
+        """Returns objects by id, with a request per chunk of ids small
+        enough for the url instead of a request per object.
+
+            >>> prodex.get_many("User", [3, 5, 3])
+            [{'id': 3, ...}, {'id': 5, ...}, {'id': 3, ...}]
+
+        :param model: The model type looking for
+        :type model: str
+        :param model_ids: The ids of the objects
+        :type model_ids: list
+        :param fields: List of fields to include, defaults to None
+        :type fields: list, optional
+        :return: The objects in the same order as the ids, None for the
+        objects that don't exist
+        :rtype: list
+        """
+        return self.loader.get_many(model, model_ids, fields=fields)
+
+    def batch(self):
+        """Returns a scope collecting the objects to get by id. They are
+        fetched together when the scope exits, a request per model and
+        chunk of ids.
+
+            >>> with prodex.batch() as batch:
+            ...     manager = batch.get("User", project["production_manager"])
+            ...     customer = batch.get("Customer", project["customer"])
+            >>> manager.result(), customer.result()
+
+        :return: The batch
+        :rtype: prodex_api.libs.loader.Batch
+        """
+        return Batch(
+            Loader(
+                fetch=self.__fetch_ids,
+                max_length=self.loader.max_length,
+                concurrency=self.loader.concurrency,
+                limiter=self.__limiter("load"),
+            )
+        )
+
+    @model_check
+    def query(self, model):
+        """Creates a query on the model, compiled once and executable many
+        times, see :class:`~prodex_api.libs.query.Query`.
+
+            >>> query = (
+            ...     prodex.query("Project")
+            ...     .where("id", "<=", 255)
+            ...     .only("id", "name")
+            ...     .order_by("-name")
+            ... )
+            >>> projects = query.all()
+
+        :param model: The model type looking for
+        :type model: str
+        :return: The query
+        :rtype: Query
+        """
+        return Query(model=model, prodex=self)
+
+    def execute(self, query, **params):
+        """Executes a query, like :meth:`~prodex_api.Prodex.find`. To fetch
+        the pages of a paginated result in parallel, see
+        :meth:`~prodex_api.Prodex.iterate`.
+
+        :param query: The query
+        :type query: Query
+        :param params: The values of the parameters of the query
+        :raises ValueError: If parameters are not bound
+        :return: The result of the request
+        :rtype: list
+        """
+        if params:
+            query = query.bind(**params)
+        return self.__find(model=query.model, payload=query.payload)
+
+    def iterate(self, query, page_size=100, parallel_pages=0, **params):
+        """Executes a query page by page, like
+        :meth:`~prodex_api.Prodex.iter_find`
+
+        :param query: The query
+        :type query: Query
+        :param page_size: The number of objects per request, defaults to 100
+        :type page_size: int, optional
+        :param parallel_pages: The number of pages to fetch ahead,
+        defaults to 0
+        :type parallel_pages: int, optional
+        :param params: The values of the parameters of the query
+        :raises ValueError: If parameters are not bound
+        :return: Generator of model objects
+        :rtype: generator
+        """
+        if params:
+            query = query.bind(**params)
+        payload = query.payload
+        fields = payload.get("fields")
+        if fields and "id" not in fields.split(","):
+            payload["fields"] = fields + ",id"
+        paginator = Paginator(
+            caller=self.caller,
+            endpoint=constants.TRANSLATION.get(query.model),
+            payload=payload,
+            page_size=page_size,
+            parallel_pages=parallel_pages,
+            limiter=self.__limiter("pages", query.model),
+        )
+        return self.__intern_rows(model=query.model, rows=paginator)
+
+    @model_check
+    def iter_find(
+        self,
+        model,
+        filters=None,
+        fields=None,
+        omit=None,
+        order=None,
+        page_size=100,
+        parallel_pages=0,
+    ):
+        """Find models objects matching to the given filters, like
+        :meth:`~prodex_api.Prodex.find`, but the objects are fetched page by
+        page and yielded as they arrive. Only one page is kept in memory,
+        whatever the number of objects.
+
+            >>> for timelog in prodex.iter_find("Timelog", page_size=500):
+            ...     process(timelog)
+
+        .. note::
+            If the server doesn't paginate its responses, the pages are
+            requested with a filter on ``id`` greater than the last received
+            id. In this case, the order must be on the ``id`` field (the
+            default) and the ``id`` field is always returned.
+
+        With ``parallel_pages``, the next pages are fetched in parallel while
+        the current page is consumed. The objects are still yielded in order
+        and at most ``parallel_pages`` pages are buffered. The connection
+        pool of the client should be at least as large (``pool_maxsize``).
+
+            >>> for project in prodex.iter_find("Project", parallel_pages=4):
+            ...     process(project)
+
+        :param model: The model type looking for
+        :type model: str
+        :param filters: Filters for the request. Should be a list of list,
+        defaults to None
+        :type filters: list, optional
+        :param fields: List of fields to include in each model object returned,
+        by default all fields are returned, defaults to None
+        :type fields: list, optional
+        :param omit: List of fields to omit, defaults to None
+        :type omit: list, optional
+        :param order: Order for the result, defaults to None
+        :type order: dict, optional
+        :param page_size: The number of objects per request, defaults to 100
+        :type page_size: int, optional
+        :param parallel_pages: The number of pages to fetch ahead,
+        defaults to 0
+        :type parallel_pages: int, optional
+        :return: Generator of model objects
+        :rtype: generator
+        """
+        if fields and "id" not in fields:
+            fields = list(fields) + ["id"]
+        payload = utils.create_find_payload(
+            filters=filters, fields=fields, omit=omit, order=order
+        )
+        paginator = Paginator(
+            caller=self.caller,
+            endpoint=constants.TRANSLATION.get(model),
+            payload=payload,
+            page_size=page_size,
+            parallel_pages=parallel_pages,
+            limiter=self.__limiter("pages", model),
+        )
+        return self.__intern_rows(model=model, rows=paginator)
+
+    @model_check
+    def stream_find(
+        self,
+        model,
+        filters=None,
+        fields=None,
+        omit=None,
+        order=None,
+        chunk_size=65536,
+    ):
+        """Find models objects matching to the given filters, like
+        :meth:`~prodex_api.Prodex.find`, but the response is decoded while
+        it is downloaded and the objects are yielded one at a time.
+        The peak memory doesn't depend on the size of the response, which is
+        useful for large exports in a single request. If the server
+        paginates its responses, the pages are read one after another.
+
+            >>> for entry in prodex.stream_find("EventLogEntry"):
+            ...     export(entry)
+
+        :param model: The model type looking for
+        :type model: str
+        :param filters: Filters for the request. Should be a list of list,
+        defaults to None
+        :type filters: list, optional
+        :param fields: List of fields to include in each model object returned,
+        by default all fields are returned, defaults to None
+        :type fields: list, optional
+        :param omit: List of fields to omit, defaults to None
+        :type omit: list, optional
+        :param order: Order for the result, defaults to None
+        :type order: dict, optional
+        :param chunk_size: The number of bytes read at a time,
+        defaults to 65536
+        :type chunk_size: int, optional
+        :return: Generator of model objects
+        :rtype: generator
+        """
+        payload = utils.create_find_payload(
+            filters=filters, fields=fields, omit=omit, order=order
+        )
+        rows = self.caller.retrieve_stream(
+            endpoint=constants.TRANSLATION.get(model),
+            payload=payload,
+            chunk_size=chunk_size,
+        )
+        return self.__intern_rows(model=model, rows=rows)
+
+    @model_check
+    def find_columns(
+        self,
+        model,
+        filters=None,
+        fields=None,
+        omit=None,
+        order=None,
+        as_numpy=True,
+        page_size=None,
+        parallel_pages=0,
+    ):
+        """Find models objects matching to the given filters, like
+        :meth:`~prodex_api.Prodex.find`, but the result is returned as
+        columns: a dictionary with an array of values per field. The columns
+        are built while the response is decoded, without keeping a
+        dictionary per object.
+
+            >>> columns = prodex.find_columns(
+            ...     "Timelog", fields=["user", "duration", "started_at"]
+            ... )
+            >>> columns["duration"].sum()
+            1245600
+            >>> columns["started_at"].dtype
+            dtype('<M8[us]')
+
+        Numbers, booleans, dates and datetimes become numpy arrays of the
+        matching type, references to other entities are replaced by their
+        id (see :func:`~prodex_api.libs.columnar.to_array`).
+
+        .. note::
+            The result is never read from the cache or interned in the
+            identity map of the client.
+
+        :param model: The model type looking for
+        :type model: str
+        :param filters: Filters for the request. Should be a list of list,
+        defaults to None
+        :type filters: list, optional
+        :param fields: List of fields to include, by default all fields are
+        returned, defaults to None
+        :type fields: list, optional
+        :param omit: List of fields to omit, defaults to None
+        :type omit: list, optional
+        :param order: Order for the result, defaults to None
+        :type order: dict, optional
+        :param as_numpy: Return numpy arrays, otherwise lists,
+        defaults to True
+        :type as_numpy: bool, optional
+        :param page_size: If given, the result is fetched page by page,
+        see :meth:`~prodex_api.Prodex.iter_find`, otherwise it is streamed
+        like :meth:`~prodex_api.Prodex.stream_find`, following the pages of
+        the server if it paginates, defaults to None
+        :type page_size: int, optional
+        :param parallel_pages: The number of pages to fetch ahead,
+        defaults to 0
+        :type parallel_pages: int, optional
+        :raises ImportError: If as_numpy is True and numpy is not installed
+        :return: The columns by field
+        :rtype: dict
+        """
+        payload = utils.create_find_payload(
+            filters=filters, fields=fields, omit=omit, order=order
+        )
+        endpoint = constants.TRANSLATION.get(model)
+        if page_size:
+            rows = Paginator(
+                caller=self.caller,
+                endpoint=endpoint,
+                payload=payload,
+                page_size=page_size,
+                parallel_pages=parallel_pages,
+                limiter=self.__limiter("pages", model),
+            )
+        else:
+            rows = self.caller.retrieve_stream(
+                endpoint=endpoint, payload=payload
+            )
+        builder = ColumnBuilder()
+        builder.extend(rows)
+        return builder.build(as_numpy=as_numpy)
+
+    @model_check
+    def aggregate(
+        self,
+        model,
+        filters=None,
+        group_by=None,
+        metrics=None,
+        page_size=None,
+        parallel_pages=0,
+    ):
+        """Aggregates the models objects matching to the given filters on
+        the client, with numpy. Only the fields used by the groups and the
+        metrics are requested, see :meth:`~prodex_api.Prodex.find_columns`.
+
+            >>> prodex.aggregate(
+            ...     "Timelog",
+            ...     filters=[["started_at", "year", 2024]],
+            ...     group_by=["project", "started_at__week"],
+            ...     metrics={"duration": "sum"},
+            ... )
+            {'project': array([1, 1, 2]), 'started_at__week': array([1, 2, 1]),
+            'duration__sum': array([28800, 14400, 7200])}
+
+        A group is a field or a field with the lookup of a date part, like
+        in filters: ``__year``, ``__iso_year``, ``__quarter``, ``__month``,
+        ``__week``, ``__week_day``, ``__day``, ``__hour``, ``__minute`` or
+        ``__second``. The datetimes are bucketed in UTC. The metrics are
+        ``count``, ``sum``, ``mean``, ``min`` and ``max``, see
+        :func:`~prodex_api.libs.aggregation.aggregate`.
+
+        :param model: The model type looking for
+        :type model: str
+        :param filters: Filters for the request. Should be a list of list,
+        defaults to None
+        :type filters: list, optional
+        :param group_by: The group by expressions, defaults to None
+        :type group_by: list, optional
+        :param metrics: The aggregates by field, for example
+        ``{"duration": ["sum", "mean"]}``, defaults to None
+        :type metrics: dict, optional
+        :param page_size: If given, the objects are fetched page by page,
+        otherwise the result is streamed, following the pages of the server
+        if it paginates, defaults to None
+        :type page_size: int, optional
+        :param parallel_pages: The number of pages to fetch ahead,
+        defaults to 0
+        :type parallel_pages: int, optional
+        :raises ImportError: If numpy is not installed
+        :raises ValueError: If a group or a metric is invalid
+        :return: The columns of the groups and the metrics
+        :rtype: dict
+        """
+        groups = [aggregation.parse_group(group) for group in group_by or []]
+        fields = []
+        for field in [field for field, _ in groups] + list(metrics or {}):
+            if field not in fields:
+                fields.append(field)
+        columns = self.find_columns(
+            model,
+            filters=filters,
+            fields=fields,
+            page_size=page_size,
+            parallel_pages=parallel_pages,
+        )
+        # An empty result has no columns
+        for field in fields:
+            columns.setdefault(field, aggregation.to_array([]))
+        return aggregation.aggregate(
+            columns, group_by=group_by, metrics=metrics
         )
-        return response
 
     @model_check
     def create(self, model, data):
@@ -205,15 +956,193 @@ class Prodex(object):
         :rtype: dict
         """
         data = utils.data_conformation(data=data)
-        response = self.caller.create(
-            endpoint=constants.TRANSLATION.get(model), data=data
-        )
-        return response
+        try:
+            response = self.caller.create(
+                endpoint=constants.TRANSLATION.get(model), data=data
+            )
+        finally:
+            self.__invalidate(model=model)
+        return self.__intern(model=model, data=response)
+
+    @model_check
+    def create_many(
+        self,
+        model,
+        items,
+        concurrency=8,
+        chunk_size=100,
+        bulk=None,
+        progress=None,
+    ):
+        """Create many objects of the specified ``model``. The requests are
+        sent in parallel, with at most ``concurrency`` requests at the same
+        time. A failure doesn't stop the other creations: a result is
+        returned for each item, in the same order as the items.
+
+            >>> items = [{"project": 12, "user": 4, "duration": 3600}, ...]
+            >>> results = prodex.create_many("Timelog", items, concurrency=16)
+            >>> created = [r.result for r in results if r.success]
+            >>> errors = [(r.index, r.error) for r in results if not r.success]
+
+        If the server accepts a list of objects on the endpoint of the model,
+        the items are sent by chunks of ``chunk_size`` objects. By default,
+        the first chunk is used to detect it, and each item is sent alone if
+        the server refuses the list (``400 Bad Request``). This is remembered
+        for the next calls only if the error says that a list is not
+        expected, like ``Expected a dictionary, but got list``. The items of a
+        refused chunk are sent again one by one, so each of them gets its own
+        result. After any other error (connection error, timeout, ``5xx``),
+        the server may have created the chunk, so its items are not sent
+        again but fail with the error.
+
+        .. note::
+            The connection pool of the client should be at least as large as
+            the concurrency (``pool_maxsize``).
+
+        :param model: The model type
+        :type model: str
+        :param items: List of dictionaries of fields and corresponding values
+        to set on the new objects
+        :type items: list
+        :param concurrency: The maximum number of requests at the same time,
+        defaults to 8
+        :type concurrency: int, optional
+        :param chunk_size: The number of objects per request when the server
+        accepts lists, defaults to 100
+        :type chunk_size: int, optional
+        :param bulk: True to send lists of objects, False to send the objects
+        one by one, defaults to None to detect it
+        :type bulk: bool, optional
+        :param progress: Callable called with the number of processed items
+        and the total number of items, defaults to None
+        :type progress: callable, optional
+        :return: The result of each item
+        :rtype: list of :class:`~prodex_api.libs.bulk.BulkResult`
+        """
+        endpoint = constants.TRANSLATION.get(model)
+        results = [None] * len(items)
+        pending = []
+        for index, data in enumerate(items):
+            try:
+                pending.append((index, utils.data_conformation(data=data)))
+            except ValueError as error:
+                results[index] = BulkResult(index, data, error=error)
+
+        def _create_one(item):
+            index, data = item
+            try:
+                created = self.caller.create(endpoint=endpoint, data=data)
+            except Exception as error:
+                return [BulkResult(index, data, error=error)]
+            return [BulkResult(index, data, result=created)]
+
+        def _failed(chunk, error):
+            return [
+                BulkResult(index, data, error=error) for index, data in chunk
+            ]
+
+        def _create_chunk(chunk):
+            try:
+                created = self.caller.create_many(
+                    endpoint=endpoint, data=[data for _, data in chunk]
+                )
+            except BadRequest:
+                # Nothing was created: send the items one by one to get the
+                # error of each item
+                return [
+                    result for item in chunk for result in _create_one(item)
+                ]
+            except Exception as error:
+                # The list may have been created, sending the items again
+                # could duplicate them
+                return _failed(chunk, error)
+            return [
+                BulkResult(index, data, result=result)
+                for (index, data), result in zip(chunk, created)
+            ]
+
+        try:
+            if bulk is None:
+                bulk = self._bulk_support.get(model)
+            if bulk is None and pending:
+                # Detect if the server accepts lists with the first chunk
+                probe = pending[:chunk_size]
+                try:
+                    created = self.caller.create_many(
+                        endpoint=endpoint, data=[data for _, data in probe]
+                    )
+                except BadRequest as error:
+                    # The items are sent one by one. Only a refused list
+                    # tells that the server never accepts them, another
+                    # error may come from the items of the probe
+                    bulk = False
+                    if _refuses_lists(error):
+                        self._bulk_support[model] = False
+                except Exception as error:
+                    # A temporary error says nothing about the support of
+                    # lists: the items of the probe fail, the next chunks
+                    # fall back to single items if the server refuses lists
+                    bulk = True
+                    pending = pending[chunk_size:]
+                    for result in _failed(probe, error):
+                        results[result.index] = result
+                else:
+                    bulk = self._bulk_support[model] = True
+                    pending = pending[chunk_size:]
+                    for (index, data), result in zip(probe, created):
+                        results[index] = BulkResult(index, data, result=result)
+
+            done = len(items) - len(pending)
+            if progress is not None and done:
+                progress(done, len(items))
+
+            if bulk:
+                func, units, weight = (
+                    _create_chunk,
+                    chunks(pending, chunk_size),
+                    len,
+                )
+            else:
+                func, units, weight = _create_one, pending, None
+            for unit in run_bulk(
+                func=func,
+                items=units,
+                concurrency=concurrency,
+                progress=(
+                    None
+                    if progress is None
+                    else lambda count, _: progress(done + count, len(items))
+                ),
+                weight=weight,
+                limiter=self.__limiter("create_many", model),
+            ):
+                if unit.error is not None:
+                    # The unit was not sent, after the deadline for example
+                    unit.result = _failed(
+                        unit.item if bulk else [unit.item], unit.error
+                    )
+                for result in unit.result:
+                    results[result.index] = result
+        finally:
+            self.__invalidate(model=model)
+        if self.identity_map is not None:
+            for result in results:
+                if result.success:
+                    result.result = self.__intern(
+                        model=model, data=result.result
+                    )
+        return results
 
     @model_check
-    def update(self, model, model_id, data, m2m_modes=None):
+    def update(self, model, model_id, data, m2m_modes=None, current_data=None):
         """Update the specified model object with the supplied data.
 
+        With ``m2m_modes``, the current values of the many to many fields
+        are needed to build the new values. They are requested to the server,
+        unless they are given with ``current_data`` or the client has a
+        cache which contains them (the cache is filled with the result of
+        each m2m update).
+
         :param model: The model type to update
         :type model: str
         :param model_id: The id of the model to update
@@ -236,8 +1165,13 @@ class Prodex(object):
             the new one.
 
         :type m2m_modes: list, optional
+        :param current_data: The current values of the many to many fields of
+        ``m2m_modes``, for example an object returned by
+        :meth:`~prodex_api.Prodex.find`, defaults to None
+        :type current_data: dict, optional
         :raises ValueError: If the m2m_modes is not a dict
         :raises ValueError: If no objects have been found for the given id.
+        :raises ValueError: If a m2m field is missing from current_data.
         :return: The updated model object
         :rtype: dict
         """
@@ -247,52 +1181,283 @@ class Prodex(object):
         files = None
         if thumbnail:
             files = utils.prepare_thumbnail_file(path=thumbnail)
-        if not m2m_modes:
+        if m2m_modes:
+            # need to retrieve all informations because we need to make a put
+            # request for updating m2m fields.
+            if not isinstance(m2m_modes, dict):
+                raise ValueError("m2m_modes attribut must be a dict.")
+
+            fields = list(m2m_modes.keys())
+            if current_data is None:
+                current_data = self.__current_values(
+                    model=model, model_id=model_id, fields=fields
+                )
+                if current_data is None:
+                    raise ValueError(
+                        "No object found for model {model} and id {model_id}".format(
+                            model=model, model_id=model_id
+                        )
+                    )
+            missing = [f for f in fields if f not in current_data]
+            if missing:
+                raise ValueError(
+                    "current_data doesn't contain {fields}.".format(
+                        fields=", ".join(missing)
+                    )
+                )
+            # copy the values, they are modified to build the new values
+            current_data = dict(
+                (field, to_plain(current_data[field])) for field in fields
+            )
+            data = utils.build_m2m_update_data(
+                initial_data=current_data, data=data, m2m_modes=m2m_modes
+            )
+
+        try:
             response = self.caller.update(
                 endpoint=endpoint,
                 model_id=model_id,
                 data=data,
                 files=files,
             )
-        else:
-            # need to retrieve all informations because we need to make a put
-            # request for updating m2m fields.
-            if not isinstance(m2m_modes, dict):
-                raise ValueError("m2m_modes attribut must be a dict.")
+        finally:
+            self.__invalidate(model=model)
+
+        if m2m_modes and self.cache is not None and isinstance(response, dict):
+            # The next m2m update of this object doesn't need to request
+            # the current values.
+            if all(field in response for field in fields):
+                self.cache.set(
+                    model=model,
+                    payload=_m2m_payload(model_id=model_id, fields=fields),
+                    result=dict((f, response[f]) for f in fields),
+                )
+        return self.__intern(model=model, data=response)
 
-            fields = list(m2m_modes.keys())
-            payload = {"id": model_id}
-            payload.update(
-                utils.create_fields_payload(action="fields", fields=fields)
+    def __current_values(self, model, model_id, fields):
+        """Returns the current values of the fields of an object for an m2m
+        update. They are read from the cache when possible: the values
+        stored after the last m2m update of the object, or the result of a
+        find of the object with the same fields.
+
+        :param model: The model of the object
+        :type model: str
+        :param model_id: The id of the object
+        :type model_id: int
+        :param fields: The fields
+        :type fields: list
+        :return: The values, None if the object doesn't exist
+        :rtype: dict
+        """
+        if self.cache is not None:
+            found, values = self.cache.get(
+                model=model,
+                payload=_m2m_payload(model_id=model_id, fields=fields),
             )
-            initial_data = self.caller.retrieve(
-                endpoint=endpoint, payload=payload
+            if found:
+                return values
+            found, response = self.cache.get(
+                model=model,
+                payload=utils.create_find_payload(
+                    filters=[["id", "is", model_id]], fields=fields
+                ),
             )
-            if not initial_data:
+            if found:
+                # The envelope of a paginated response holds the rows in
+                # results
+                if isinstance(response, dict):
+                    response = response.get("results", [])
+                return response[0] if response else None
+        return self.get(model, model_id, fields=fields)
+
+    @model_check
+    def update_m2m_many(
+        self,
+        model,
+        model_ids,
+        data,
+        m2m_modes,
+        concurrency=8,
+        progress=None,
+        chunk_size=200,
+    ):
+        """Apply the same many to many update to many objects, for example
+        add an user to the ``users_assign`` of many projects.
+        The current values of all objects are requested with one request per
+        ``chunk_size`` ids, then the updates are sent in parallel with at
+        most ``concurrency`` requests at the same time.
+
+            >>> data = {"users_assign": [{"id": 4}]}
+            >>> results = prodex.update_m2m_many(
+            ...     "Project", [12, 13, 14], data, {"users_assign": "add"}
+            ... )
+
+        :param model: The model type to update
+        :type model: str
+        :param model_ids: The ids of the objects to update
+        :type model_ids: list
+        :param data: The supplied data, applied to all objects
+        :type data: dict
+        :param m2m_modes: The many to many modes, see
+        :meth:`~prodex_api.Prodex.update`
+        :type m2m_modes: dict
+        :param concurrency: The maximum number of requests at the same time,
+        defaults to 8
+        :type concurrency: int, optional
+        :param progress: Callable called with the number of processed ids
+        and the total number of ids, defaults to None
+        :type progress: callable, optional
+        :param chunk_size: The number of ids per request for the current
+        values, defaults to 200
+        :type chunk_size: int, optional
+        :raises ValueError: If the m2m_modes is not a dict
+        :return: The result of each id
+        :rtype: list of :class:`~prodex_api.libs.bulk.BulkResult`
+        """
+        if not isinstance(m2m_modes, dict) or not m2m_modes:
+            raise ValueError("m2m_modes attribut must be a dict.")
+        data = utils.data_conformation(data=data)
+        fields = list(m2m_modes.keys())
+
+        current = {}
+        for chunk in chunks(list(model_ids), chunk_size):
+            # iter_find reads the rows of all the pages of a paginated
+            # response
+            for obj in self.iter_find(
+                model,
+                filters=[["id", "in", chunk]],
+                fields=fields + ["id"],
+                page_size=len(chunk) + 1,
+            ):
+                current[obj["id"]] = obj
+
+        def _update(model_id):
+            if model_id not in current:
                 raise ValueError(
                     "No object found for model {model} and id {model_id}".format(
                         model=model, model_id=model_id
                     )
                 )
-            initial_data = utils.data_conformation(data=initial_data[0])
-            modified_data = utils.many_to_many_data_constructor(
-                initial_data=initial_data,
-                data=data,
+            return self.update(
+                model,
+                model_id,
+                copy.deepcopy(data),
                 m2m_modes=m2m_modes,
+                current_data=current[model_id],
             )
-            # update data dict in order to get the full data to update
-            m2m_fields = list(m2m_modes.keys())
-            for m2m_field in m2m_fields:
-                data.pop(m2m_field, None)
-            modified_data.update(data)
 
-            response = self.caller.update(
-                endpoint=endpoint,
-                model_id=model_id,
-                data=modified_data,
-                files=files,
-            )
-        return response
+        return run_bulk(
+            func=_update,
+            items=model_ids,
+            concurrency=concurrency,
+            progress=progress,
+            limiter=self.__limiter("update_m2m_many", model),
+        )
+
+    @model_check
+    def update_many(
+        self, model, items, m2m_modes=None, concurrency=8, progress=None
+    ):
+        """Update many objects of the specified ``model``, see
+        :meth:`~prodex_api.Prodex.update`. The requests are sent in parallel,
+        with at most ``concurrency`` requests at the same time. A failure
+        doesn't stop the other updates: a result is returned for each item,
+        in the same order as the items.
+
+            >>> items = [(1, {"name": "First"}), (2, {"name": "Second"})]
+            >>> results = prodex.update_many("Project", items)
+            >>> [r.item[0] for r in results if not r.success]
+            []
+
+        :param model: The model type to update
+        :type model: str
+        :param items: List of (id, data) pairs, or dictionary of data by id
+        :type items: list or dict
+        :param m2m_modes: The many to many modes used for all items,
+        defaults to None
+        :type m2m_modes: dict, optional
+        :param concurrency: The maximum number of requests at the same time,
+        defaults to 8
+        :type concurrency: int, optional
+        :param progress: Callable called with the number of processed items
+        and the total number of items, defaults to None
+        :type progress: callable, optional
+        :return: The result of each item
+        :rtype: list of :class:`~prodex_api.libs.bulk.BulkResult`
+        """
+        if isinstance(items, dict):
+            items = list(items.items())
+        return run_bulk(
+            func=lambda item: self.update(
+                model, item[0], item[1], m2m_modes=m2m_modes
+            ),
+            items=items,
+            concurrency=concurrency,
+            progress=progress,
+            limiter=self.__limiter("update_many", model),
+        )
+
+    @model_check
+    def delete_many(self, model, model_ids, concurrency=8, progress=None):
+        """Delete many objects of the specified ``model``, see
+        :meth:`~prodex_api.Prodex.delete`. The requests are sent in parallel,
+        with at most ``concurrency`` requests at the same time. A failure
+        doesn't stop the other deletions: a result is returned for each id,
+        in the same order as the ids.
+
+            >>> results = prodex.delete_many("PlanningItem", [12, 13, 14])
+
+        :param model: The model type
+        :type model: str
+        :param model_ids: The ids of the objects to delete
+        :type model_ids: list
+        :param concurrency: The maximum number of requests at the same time,
+        defaults to 8
+        :type concurrency: int, optional
+        :param progress: Callable called with the number of processed ids
+        and the total number of ids, defaults to None
+        :type progress: callable, optional
+        :return: The result of each id
+        :rtype: list of :class:`~prodex_api.libs.bulk.BulkResult`
+        """
+        return run_bulk(
+            func=lambda model_id: self.delete(model, model_id),
+            items=model_ids,
+            concurrency=concurrency,
+            progress=progress,
+            limiter=self.__limiter("delete_many", model),
+        )
+
+    @model_check
+    def restore_many(self, model, model_ids, concurrency=8, progress=None):
+        """Restore many objects of the specified ``model``, see
+        :meth:`~prodex_api.Prodex.restore`. The requests are sent in
+        parallel, with at most ``concurrency`` requests at the same time.
+        A failure doesn't stop the other restorations: a result is returned
+        for each id, in the same order as the ids.
+
+            >>> results = prodex.restore_many("PlanningItem", [12, 13, 14])
+
+        :param model: The model type
+        :type model: str
+        :param model_ids: The ids of the objects to restore
+        :type model_ids: list
+        :param concurrency: The maximum number of requests at the same time,
+        defaults to 8
+        :type concurrency: int, optional
+        :param progress: Callable called with the number of processed ids
+        and the total number of ids, defaults to None
+        :type progress: callable, optional
+        :return: The result of each id
+        :rtype: list of :class:`~prodex_api.libs.bulk.BulkResult`
+        """
+        return run_bulk(
+            func=lambda model_id: self.restore(model, model_id),
+            items=model_ids,
+            concurrency=concurrency,
+            progress=progress,
+            limiter=self.__limiter("restore_many", model),
+        )
 
     @model_check
     def delete(self, model, model_id):
@@ -322,10 +1487,13 @@ class Prodex(object):
         :return: The deleted model
         :rtype: dict
         """
-        response = self.caller.delete(
-            endpoint=constants.TRANSLATION.get(model),
-            model_id=model_id,
-        )
+        try:
+            response = self.caller.delete(
+                endpoint=constants.TRANSLATION.get(model),
+                model_id=model_id,
+            )
+        finally:
+            self.__invalidate(model=model)
         return response
 
     @model_check
@@ -347,11 +1515,14 @@ class Prodex(object):
         :return: The restored project
         :rtype: dict
         """
-        response = self.caller.restore(
-            endpoint=constants.TRANSLATION.get(model),
-            model_id=model_id,
-        )
-        return response
+        try:
+            response = self.caller.restore(
+                endpoint=constants.TRANSLATION.get(model),
+                model_id=model_id,
+            )
+        finally:
+            self.__invalidate(model=model)
+        return self.__intern(model=model, data=response)
 
     @model_check
     def get_schema_fields(self, model):
@@ -374,15 +1545,26 @@ class Prodex(object):
             ...     }
             ... }
 
+        .. note::
+            If the client has a schema cache, the schema is read from the
+            cache when possible.
+
         :param model: The model to get fields.
         :type model: str
         :return: list of all fields
         :rtype: list
         """
-        response = self.caller.retrieve_schema_fields(
-            endpoint=constants.TRANSLATION.get(model)
+        endpoint = constants.TRANSLATION.get(model)
+        if self.schema_cache is None:
+            return self.caller.retrieve_schema_fields(endpoint=endpoint)
+        return self.schema_cache.get(
+            url=self.url,
+            kind="schema",
+            model=model,
+            fetch=lambda: self.caller.retrieve_schema_fields(
+                endpoint=endpoint
+            ),
         )
-        return response
 
     @model_check
     def get_fields(self, model):
@@ -394,15 +1576,56 @@ class Prodex(object):
             'metadata', 'created_at', 'updated_at', 'created_by', 'updated_by',
             'trashed_at', 'archived_at', 'production_manager', 'users_assign']
 
+        .. note::
+            If the client has a schema cache, the fields are read from the
+            cache when possible.
+
         :param model: The model to get fields.
         :type model: str
         :return: list of all fields
         :rtype: list
         """
-        response = self.caller.retrieve_fields(
-            endpoint=constants.TRANSLATION.get(model)
+        endpoint = constants.TRANSLATION.get(model)
+        if self.schema_cache is None:
+            return self.caller.retrieve_fields(endpoint=endpoint)
+        return self.schema_cache.get(
+            url=self.url,
+            kind="fields",
+            model=model,
+            fetch=lambda: self.caller.retrieve_fields(endpoint=endpoint),
         )
-        return response
+
+    def refresh_schemas(self, models=None):
+        """Requests again the fields and the schemas of the given models and
+        updates the schema cache of the client.
+
+            >>> prodex.refresh_schemas(models=["Project", "User"])
+
+        :param models: The models to refresh, all models by default
+        :type models: list, optional
+        :raises ValueError: If the client has no schema cache
+        """
+        if self.schema_cache is None:
+            raise ValueError("The client has no schema cache.")
+        for model in models or self.get_models():
+            self._schema_infos.pop(model, None)
+            endpoint = constants.TRANSLATION.get(model)
+            if not endpoint:
+                raise ValueError(
+                    "'{model}' doesn't exists.".format(model=model)
+                )
+            self.schema_cache.set(
+                url=self.url,
+                kind="fields",
+                model=model,
+                value=self.caller.retrieve_fields(endpoint=endpoint),
+            )
+            self.schema_cache.set(
+                url=self.url,
+                kind="schema",
+                model=model,
+                value=self.caller.retrieve_schema_fields(endpoint=endpoint),
+            )
 
     @model_check
     def upload_thumbnail(self, model, model_id, path):
@@ -435,12 +1658,50 @@ class Prodex(object):
         :rtype: dict
         """
         files = utils.prepare_thumbnail_file(path=path)
-        response = self.caller.update(
-            endpoint=constants.TRANSLATION.get(model),
-            model_id=model_id,
-            files=files,
+        try:
+            response = self.caller.update(
+                endpoint=constants.TRANSLATION.get(model),
+                model_id=model_id,
+                files=files,
+            )
+        finally:
+            files["thumbnail"].close()
+            self.__invalidate(model=model)
+        return self.__intern(model=model, data=response)
+
+    @model_check
+    def upload_thumbnails(self, model, items, concurrency=8, progress=None):
+        """Upload many thumbnails, see
+        :meth:`~prodex_api.Prodex.upload_thumbnail`. The files are sent in
+        parallel, with at most ``concurrency`` uploads at the same time.
+        A failure doesn't stop the other uploads: a result is returned for
+        each item, in the same order as the items.
+
+            >>> items = [(1, "/tmp/a.png"), (2, "/tmp/b.png")]
+            >>> results = prodex.upload_thumbnails("Project", items)
+
+        :param model: Model to set the thumbnails for
+        :type model: str
+        :param items: List of (id, path) pairs, or dictionary of paths by id
+        :type items: list or dict
+        :param concurrency: The maximum number of uploads at the same time,
+        defaults to 8
+        :type concurrency: int, optional
+        :param progress: Callable called with the number of processed items
+        and the total number of items, defaults to None
+        :type progress: callable, optional
+        :return: The result of each item
+        :rtype: list of :class:`~prodex_api.libs.bulk.BulkResult`
+        """
+        if isinstance(items, dict):
+            items = list(items.items())
+        return run_bulk(
+            func=lambda item: self.upload_thumbnail(model, item[0], item[1]),
+            items=items,
+            concurrency=concurrency,
+            progress=progress,
+            limiter=self.__limiter("upload_thumbnails", model),
         )
-        return response
 
     def get_models(self):
         """Return all available models for the API.
@@ -511,3 +1772,32 @@ class Prodex(object):
         endpoint = "task-status/{task_id}".format(task_id=task_id)
         response = self.caller.retrieve(endpoint=endpoint)
         return response
+
+
+def _m2m_payload(model_id, fields):
+    """Builds the key of the current values of an object stored in the
+    result cache after an m2m update. No request has this payload, so the
+    values never replace the result of a find.
+
+    :param model_id: The id of the object
+    :type model_id: int
+    :param fields: The m2m fields
+    :type fields: list
+    :return: The payload
+    :rtype: dict
+    """
+    return {"m2m": model_id, "fields": ",".join(sorted(fields))}
+
+
+def _refuses_lists(error):
+    """Tells if a ``400 Bad Request`` refuses a list of objects, like the
+    ``Expected a dictionary, but got list`` error of Django REST framework,
+    instead of the data of the objects
+
+    :param error: The error
+    :type error: prodex_api.libs.models.BadRequest
+    :return: True if the list is refused
+    :rtype: bool
+    """
+    content = error.args[0] if error.args else None
+    return LIST_REFUSED in str(content)
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+#
+# - streaming -
+#
+# Incremental decoding of JSON arrays received in chunks.
+#
+# Copyright (c) 2020 Prodex
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import codecs
+import json
+
+_WHITESPACES = " \t\n\r"
+_DELIMITERS = _WHITESPACES + ",:]}"
+
+
+class JSONArrayStream(object):
+    def __init__(self, chunks, encoding="utf-8", key="results"):
+        """Decodes the elements of a JSON array one at a time from an
+        iterable of chunks of bytes. Only one element and the current chunk
+        are held in memory.
+
+        The array can be the document itself, or the value of ``key`` if the
+        document is an object (like a paginated response). The other members
+        of the object are kept in ``members``, they are all known once the
+        iteration is done (like the ``next`` link of a paginated response).
+
+            >>> stream = JSONArrayStream([b'[{"id": 1}, {"i', b'd": 2}]'])
+            >>> list(stream)
+            [{'id': 1}, {'id': 2}]
+
+        :param chunks: Iterable of chunks of bytes
+        :type chunks: iterable
+        :param encoding: The encoding of the document, defaults to "utf-8"
+        :type encoding: str, optional
+        :param key: The key of the array if the document is an object,
+        defaults to "results"
+        :type key: str, optional
+        """
+        self.chunks = iter(chunks)
+        self.key = key
+        self.members = {}
+
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder(encoding)()
+        self._buffer = ""
+        self._position = 0
+        self._eof = False
+
+    def __iter__(self):
+        char = self.__next_char()
+        if char == "[":
+            for item in self.__iter_array():
+                yield item
+        elif char == "{":
+            if self.__seek_key():
+                for item in self.__iter_array():
+                    yield item
+                # Reads the members after the array
+                self.__seek_key()
+        elif char is not None:
+            raise ValueError(
+                "Expecting a JSON array or object, got {char!r}".format(
+                    char=char
+                )
+            )
+
+    def __read(self):
+        """Reads the next chunk in the buffer
+
+        :return: False if there is nothing more to read
+        :rtype: bool
+        """
+        if self._eof:
+            return False
+        # Drop what is already decoded
+        self._buffer = self._buffer[self._position :]
+        self._position = 0
+        for chunk in self.chunks:
+            if chunk:
+                self._buffer += self._text_decoder.decode(chunk)
+                return True
+        self._buffer += self._text_decoder.decode(b"", final=True)
+        self._eof = True
+        return False
+
+    def __next_char(self):
+        """Consumes the whitespaces and the next character
+
+        :return: The next character, None at the end of the document
+        :rtype: str
+        """
+        while True:
+            while (
+                self._position < len(self._buffer)
+                and self._buffer[self._position] in _WHITESPACES
+            ):
+                self._position += 1
+            if self._position < len(self._buffer):
+                char = self._buffer[self._position]
+                self._position += 1
+                return char
+            if not self.__read():
+                return None
+
+    def __decode_value(self):
+        """Decodes the next value, reading more chunks if it is incomplete
+
+        :raises ValueError: If the document is invalid
+        :return: The decoded value
+        :rtype: object
+        """
+        while True:
+            while (
+                self._position < len(self._buffer)
+                and self._buffer[self._position] in _WHITESPACES
+            ):
+                self._position += 1
+            try:
+                value, end = self._decoder.raw_decode(
+                    self._buffer, self._position
+                )
+            except ValueError:
+                if not self.__read():
+                    raise
+                continue
+            # A value must be followed by a delimiter, otherwise it may be a
+            # number which continues in the next chunk.
+            if (
+                end == len(self._buffer)
+                or self._buffer[end] not in _DELIMITERS
+            ) and self.__read():
+                continue
+            self._position = end
+            return value
+
+    def __iter_array(self):
+        """Yields the elements of the array which has just been opened"""
+        char = self.__next_char()
+        if char == "]":
+            return
+        self._position -= 1
+        while True:
+            yield self.__decode_value()
+            char = self.__next_char()
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError(
+                    "Expecting ',' delimiter, got {char!r}".format(char=char)
+                )
+
+    def __seek_key(self):
+        """Consumes the members of the opened object until the value of the
+        wanted key, and keeps the others in ``members``
+
+        :return: True if the value is an array which has just been opened
+        :rtype: bool
+        """
+        char = self.__next_char()
+        if char == ",":
+            char = self.__next_char()
+        while char not in ("}", None):
+            self._position -= 1
+            key = self.__decode_value()
+            if self.__next_char() != ":":
+                raise ValueError("Expecting ':' delimiter")
+            if key == self.key:
+                if self.__next_char() == "[":
+                    return True
+                raise ValueError("{key} is not an array.".format(key=self.key))
+            self.members[key] = self.__decode_value()
+            char = self.__next_char()
+            if char == ",":
+                char = self.__next_char()
+        return False
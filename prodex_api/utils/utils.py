@@ -25,6 +25,7 @@
 # SOFTWARE.
 
 import os
+from collections.abc import Mapping
 
 from . import constants
 
@@ -54,6 +55,62 @@ def build_url_base(url):
     return final_url
 
 
+def create_filter_key(field, operators):
+    """Creates the key of a filter in the payload, for the given operator or
+    chain of operators
+
+    :param field: The field to filter
+    :type field: str
+    :param operators: The operator or the list of operators
+    :type operators: str or list
+    :raises ValueError: If an operator is not valid
+    :return: The key of the filter
+    :rtype: str
+    """
+    if isinstance(operators, (list, tuple)):
+        chain_operators = []
+        for operator in operators:
+            _operator = constants.OPERATORS.get(operator, None)
+            if not _operator:
+                raise ValueError(
+                    "{operator} is not a valid operator.".format(
+                        operator=operator
+                    )
+                )
+            chain_operators.append(_operator)
+        return "{field}{chain}".format(
+            field=field, chain="".join(chain_operators)
+        )
+    operator = operators
+    _operator = constants.OPERATORS.get(operator, None)
+    if not _operator:
+        raise ValueError(
+            "{operator} is not a valid operator.".format(operator=operator)
+        )
+    if operator not in ["is", "="]:
+        field = "{field}{operator}".format(field=field, operator=_operator)
+    return field
+
+
+def create_filter_value(value):
+    """Creates the value of a filter in the payload: the ids of entities and
+    the items of lists are sent as they are in the url
+
+    :param value: The value of the filter
+    :type value: object
+    :raises ValueError: If an entity has no id
+    :return: The value for the payload
+    :rtype: object
+    """
+    if isinstance(value, (list, tuple)):
+        value = ",".join(str(v) for v in value)
+    if isinstance(value, Mapping):
+        if not value.get("id", None):
+            raise ValueError("Value object need to have an id.")
+        value = value["id"]
+    return value
+
+
 def create_filters_payload(filters=None):
     """Create the paylod for the request with the given filters
 
@@ -66,43 +123,8 @@ def create_filters_payload(filters=None):
     if not filters:
         return payload
     for _filter in filters:
-        field = _filter[0]
-        operators = _filter[1]
-        value = _filter[2]
-        if isinstance(value, (list, tuple)):
-            value = ",".join(str(v) for v in value)
-        if isinstance(value, dict):
-            if not value.get("id", None):
-                raise ValueError("Value object need to have an id.")
-            value = value["id"]
-        if isinstance(operators, (list, tuple)):
-            chain_operators = []
-            for operator in operators:
-                _operator = constants.OPERATORS.get(operator, None)
-                if not _operator:
-                    raise ValueError(
-                        "{operator} is not a valid operator.".format(
-                            operator=operator
-                        )
-                    )
-                chain_operators.append(_operator)
-            field = "{field}{chain}".format(
-                field=field, chain="".join(chain_operators)
-            )
-        else:
-            operator = operators
-            _operator = constants.OPERATORS.get(operator, None)
-            if not _operator:
-                raise ValueError(
-                    "{operator} is not a valid operator.".format(
-                        operator=operator
-                    )
-                )
-            if operator not in ["is", "="]:
-                field = "{field}{operator}".format(
-                    field=field, operator=_operator
-                )
-        payload[field] = value
+        field = create_filter_key(field=_filter[0], operators=_filter[1])
+        payload[field] = create_filter_value(value=_filter[2])
     return payload
 
 
@@ -148,6 +170,28 @@ def create_ordering_payload(order=None):
     return payload
 
 
+def create_find_payload(filters=None, fields=None, omit=None, order=None):
+    """Creates the full payload of a find request
+
+    :param filters: The list of filters, defaults to None
+    :type filters: list, optional
+    :param fields: The fields to include, defaults to None
+    :type fields: list, optional
+    :param omit: The fields to omit, defaults to None
+    :type omit: list, optional
+    :param order: The order, defaults to None
+    :type order: dict, optional
+    :return: The created payload
+    :rtype: dict
+    """
+    payload = {}
+    payload.update(create_filters_payload(filters=filters))
+    payload.update(create_fields_payload(action="fields", fields=fields))
+    payload.update(create_fields_payload(action="omit", fields=omit))
+    payload.update(create_ordering_payload(order=order))
+    return payload
+
+
 def data_conformation(data):
     """Conform the data before the API call in order to transform
     all dictionnary, which represent entity like an id.
@@ -156,7 +200,7 @@ def data_conformation(data):
     :type data: dict
     """
     for key, values in data.items():
-        if isinstance(values, dict):
+        if isinstance(values, Mapping):
             _id = values.get("id", None)
             if not _id:
                 raise ValueError("You need to give an id for this.")
@@ -164,7 +208,7 @@ def data_conformation(data):
         elif isinstance(values, list):
             new_values = []
             for value in values:
-                if isinstance(value, dict):
+                if isinstance(value, Mapping):
                     _id = value.get("id", None)
                     if not _id:
                         raise ValueError("You need to give an id for this.")
@@ -216,15 +260,18 @@ def many_to_many_data_constructor(initial_data, data, m2m_modes):
             )
 
         if m2m_mode == "add":
+            existing = set(initial_data[field])
             for value in _data:
-                if value in initial_data[field]:
+                if value in existing:
                     continue
+                existing.add(value)
                 initial_data[field].append(value)
 
         elif m2m_mode == "remove":
-            for value in _data:
-                if value in initial_data[field]:
-                    initial_data[field].pop(initial_data[field].index(value))
+            removed = set(_data)
+            initial_data[field] = [
+                value for value in initial_data[field] if value not in removed
+            ]
 
         else:  # set mode by default
             initial_data[field] = _data
@@ -232,6 +279,33 @@ def many_to_many_data_constructor(initial_data, data, m2m_modes):
     return initial_data
 
 
+def build_m2m_update_data(initial_data, data, m2m_modes):
+    """Builds the full data of an update using m2m modes: the m2m fields of
+    the initial data are merged with the new data, and the other fields of
+    the new data are added as they are.
+
+    :param initial_data: The current m2m fields of the object
+    :type initial_data: dict
+    :param data: The new data to update
+    :type data: dict
+    :param m2m_modes: The many to many modes
+    :type m2m_modes: dict
+    :return: The data for the update
+    :rtype: dict
+    """
+    initial_data = data_conformation(data=initial_data)
+    modified_data = many_to_many_data_constructor(
+        initial_data=initial_data,
+        data=data,
+        m2m_modes=m2m_modes,
+    )
+    # update data dict in order to get the full data to update
+    for m2m_field in m2m_modes.keys():
+        data.pop(m2m_field, None)
+    modified_data.update(data)
+    return modified_data
+
+
 def prepare_thumbnail_file(path):
     """Prepares the given file for an upload as thumbnail
 
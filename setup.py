@@ -43,7 +43,8 @@ setup(
     url='https://github.com/AlexLaur/prodex-api',
     license=license,
     install_requires=["requests"],
-    packages=find_packages(exclude=('tests',)),
+    extras_require={"async": ["aiohttp"], "numpy": ["numpy"]},
+    packages=find_packages(exclude=('tests', 'benchmarks', 'benchmarks.*')),
     include_package_data=True,
     zip_safe=False,
 )
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+#
+# - test_loader -
+#
+# Tests of the batched loads by id.
+#
+# Copyright (c) 2020 Prodex
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import time
+import unittest
+
+from prodex_api.libs.deadline import deadline
+from prodex_api.libs.loader import Batch, Loader
+from prodex_api.libs.models import DeadlineExceeded
+
+
+class LoaderTest(unittest.TestCase):
+    def test_expired_deadline_resolves_futures(self):
+        calls = []
+
+        def fetch(model, model_ids, fields):
+            calls.append(model)
+            return [{"id": model_id} for model_id in model_ids]
+
+        with deadline(0.05):
+            with Batch(Loader(fetch)) as batch:
+                project = batch.get("Project", 1)
+                user = batch.get("User", 1)
+                time.sleep(0.1)
+
+        # The requests are skipped, their futures must fail instead of
+        # blocking forever
+        self.assertEqual(calls, [])
+        for future in (project, user):
+            with self.assertRaises(DeadlineExceeded):
+                future.result(timeout=1)
+
+    def test_fetch_many_models(self):
+        def fetch(model, model_ids, fields):
+            return [{"id": model_id, "model": model} for model_id in model_ids]
+
+        with Batch(Loader(fetch)) as batch:
+            project = batch.get("Project", 1)
+            user = batch.get("User", 2)
+        self.assertEqual(project.result(timeout=1)["model"], "Project")
+        self.assertEqual(user.result(timeout=1)["id"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()